@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import os
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveStore:
+    """Immutable gzip-compressed segments of archived applications.
+
+    ``index.json`` lists the segments with the teams they contain and keeps
+    aggregates (applications and applicant ids per team) so statistics stay
+    correct without opening any segment.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index_file = os.path.join(directory, "index.json")
+        self.index = {'segments': [], 'team_counts': {}, 'team_user_ids': {}}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as file:
+                    self.index = json.load(file)
+            except Exception as e:
+                logger.error(f"Failed to load {self.index_file}: {e}")
+        self._team_user_ids = {
+            team_id: set(user_ids) for team_id, user_ids in self.index['team_user_ids'].items()
+        }
+
+    def _write_atomic(self, filename: str, data: bytes) -> None:
+        temp_filename = f"{filename}.tmp"
+        with open(temp_filename, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filename, filename)
+
+    def add_segment(self, applications: List[Dict[str, Any]], label: str = '') -> Dict[str, Any]:
+        """Write applications into a new segment and update the index."""
+        os.makedirs(self.directory, exist_ok=True)
+        # Segments can be removed again, so numbers come from a counter
+        number = self.index.get('next_segment', len(self.index['segments']) + 1)
+        self.index['next_segment'] = number + 1
+        filename = f"segment_{number:05d}.json.gz"
+        payload = json.dumps(applications, ensure_ascii=False).encode('utf-8')
+        self._write_atomic(os.path.join(self.directory, filename), gzip.compress(payload))
+
+        team_counts: Dict[str, int] = {}
+        for application in applications:
+            team_id = application['selected_team']
+            team_counts[team_id] = team_counts.get(team_id, 0) + 1
+            self._team_user_ids.setdefault(team_id, set()).add(application['user_info']['user_id'])
+        for team_id, count in team_counts.items():
+            self.index['team_counts'][team_id] = self.index['team_counts'].get(team_id, 0) + count
+
+        segment = {
+            'file': filename,
+            'label': label,
+            'count': len(applications),
+            'teams': team_counts,
+            'created': datetime.now().isoformat()
+        }
+        self.index['segments'].append(segment)
+        self.index['team_user_ids'] = {
+            team_id: sorted(user_ids) for team_id, user_ids in self._team_user_ids.items()
+        }
+        self._write_atomic(
+            self.index_file,
+            json.dumps(self.index, ensure_ascii=False, indent=2).encode('utf-8')
+        )
+        return segment
+
+    def iter_applications(self, team_ids: Optional[List[str]] = None,
+                          label: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate over archived applications, opening only segments that can match."""
+        for segment in self.index['segments']:
+            if label is not None and segment['label'] != label:
+                continue
+            if team_ids is not None and not any(team_id in segment['teams'] for team_id in team_ids):
+                continue
+            try:
+                with gzip.open(os.path.join(self.directory, segment['file']), 'rb') as file:
+                    applications = json.loads(file.read().decode('utf-8'))
+            except Exception as e:
+                logger.error(f"Failed to read archive segment {segment['file']}: {e}")
+                continue
+            for application in applications:
+                if team_ids is None or application['selected_team'] in team_ids:
+                    yield application
+
+    def remove_segments(self, label: str) -> List[Dict[str, Any]]:
+        """Take the segments with a label out of the archive and return their applications."""
+        removed = [segment for segment in self.index['segments'] if segment['label'] == label]
+        if not removed:
+            return []
+        applications = list(self.iter_applications(label=label))
+        
+        self.index['segments'] = [segment for segment in self.index['segments'] if segment['label'] != label]
+        affected_teams = set()
+        for segment in removed:
+            for team_id, count in segment['teams'].items():
+                self.index['team_counts'][team_id] -= count
+                affected_teams.add(team_id)
+        
+        # Applicant ids can be shared between segments, so rebuild the affected teams
+        for team_id in affected_teams:
+            self._team_user_ids[team_id] = {
+                application['user_info']['user_id']
+                for application in self.iter_applications([team_id])
+            }
+        self.index['team_user_ids'] = {
+            team_id: sorted(user_ids) for team_id, user_ids in self._team_user_ids.items()
+        }
+        self._write_atomic(
+            self.index_file,
+            json.dumps(self.index, ensure_ascii=False, indent=2).encode('utf-8')
+        )
+        
+        for segment in removed:
+            try:
+                os.remove(os.path.join(self.directory, segment['file']))
+            except OSError as e:
+                logger.error(f"Failed to remove archive segment {segment['file']}: {e}")
+        return applications
+    
+    def team_counts(self) -> Dict[str, int]:
+        return dict(self.index['team_counts'])
+
+    def user_ids(self, team_ids: Optional[List[str]] = None) -> set:
+        """Get ids of users with archived applications to the given teams."""
+        user_ids = set()
+        for team_id, team_user_ids in self._team_user_ids.items():
+            if team_ids is None or team_id in team_ids:
+                user_ids.update(team_user_ids)
+        return user_ids
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measure send_message throughput for different connection pool settings.
+
+Usage: python benchmark_requests.py [--messages N] [--latency SECONDS] [--pools 1,8,64]
+                                    [--concurrency N]
+
+Messages go to a local stand-in of the Bot API that answers every call after
+a fixed delay, simulating the round trip to Telegram. Like the delivery
+workers, at most --concurrency sends are in flight (the pool size by default);
+queueing far more requests than connections makes httpcore's pool spend its
+time matching requests to connections.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from telegram import Bot
+from http_pools import build_request
+
+BENCHMARK_TOKEN = "123456:benchmark"
+
+
+async def serve_bot_api(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, latency: float) -> None:
+    """Answer keep-alive HTTP/1.1 requests with a successful sendMessage result."""
+    message_id = 0
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            await asyncio.sleep(latency)
+
+            message_id += 1
+            body = json.dumps({'ok': True, 'result': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': 1, 'type': 'private'},
+                'text': 'ok'
+            }}).encode('utf-8')
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def measure(port: int, messages: int, pool_size: int, keepalive: float, concurrency: int) -> float:
+    """Send messages concurrently and return messages per second."""
+    semaphore = asyncio.Semaphore(concurrency)
+    request = build_request(pool_size=pool_size, keepalive=keepalive, pool_timeout=60)
+    bot = Bot(BENCHMARK_TOKEN, base_url=f"http://127.0.0.1:{port}/bot", request=request)
+
+    async def send() -> None:
+        async with semaphore:
+            await bot.send_message(chat_id=1, text="benchmark")
+
+    # Only the pool being measured is opened, and closed again afterwards
+    async with request:
+        started = time.perf_counter()
+        await asyncio.gather(*(send() for _ in range(messages)))
+        return messages / (time.perf_counter() - started)
+
+
+async def run(messages: int, latency: float, pool_sizes: list, keepalive: float, concurrency: int) -> None:
+    server = await asyncio.start_server(
+        lambda reader, writer: serve_bot_api(reader, writer, latency), "127.0.0.1", 0
+    )
+    port = server.sockets[0].getsockname()[1]
+    print(f"{messages} messages, {latency * 1000:.0f} ms simulated round trip")
+    async with server:
+        for pool_size in pool_sizes:
+            in_flight = concurrency or pool_size
+            throughput = await measure(port, messages, pool_size, keepalive, in_flight)
+            print(f"  pool {pool_size:>4}, {in_flight:>4} in flight: {throughput:8.1f} messages/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.05, help="simulated round trip in seconds")
+    parser.add_argument('--pools', default="1,8,64", help="comma separated pool sizes")
+    parser.add_argument('--keepalive', type=float, default=30.0)
+    parser.add_argument('--concurrency', type=int, default=0, help="sends in flight, 0 for the pool size")
+    args = parser.parse_args()
+    asyncio.run(run(
+        args.messages,
+        args.latency,
+        [int(size) for size in args.pools.split(",")],
+        args.keepalive,
+        args.concurrency
+    ))
+
+
+if __name__ == "__main__":
+    main()
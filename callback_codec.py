@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import logging
+from collections import OrderedDict
+from typing import Optional, Tuple
+from config import CALLBACK_TABLE_SIZE, CALLBACK_TABLE_FILE
+
+logger = logging.getLogger(__name__)
+
+# Version prefix of the current callback data layout
+CALLBACK_VERSION = "1"
+
+# Telegram limits callback data to 64 bytes
+MAX_CALLBACK_DATA = 64
+
+# Opcodes
+OP_TEAM = "t"
+OP_ACCEPT = "a"
+OP_REJECT = "r"
+OP_END_CHAT = "e"
+
+# Argument types of each opcode; ints are packed in base 36
+OP_SCHEMAS = {
+    OP_TEAM: (str,),
+    OP_ACCEPT: (int, str),
+    OP_REJECT: (int, str),
+    OP_END_CHAT: (int,)
+}
+
+# Prefix of data that is a token into the server-side table
+TOKEN_PREFIX = "~"
+
+# Ends the namespace at the start of a token, e.g. "~2.1a"
+NAMESPACE_SEPARATOR = "."
+
+_SEPARATOR = ":"
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _pack_int(value: int) -> str:
+    if value < 0:
+        return "-" + _pack_int(-value)
+    packed = ""
+    while True:
+        value, digit = divmod(value, 36)
+        packed = _DIGITS[digit] + packed
+        if not value:
+            return packed
+
+
+class CallbackCodec:
+    """Encode callback data as ``<version><opcode><packed args>``.
+
+    Data that would not fit into Telegram's 64 bytes is kept in a bounded
+    server-side table and the button only carries a short token, prefixed
+    with the codec's namespace when it has one (each worker process keeps
+    its own table, so the namespace tells whose table to ask). The table is
+    written to ``filename`` whenever a token is added, so buttons keep
+    working after a restart; pinned tokens, like those of the team keyboard,
+    are never evicted. Legacy ``accept_<user>_<team>`` style data is still
+    understood so buttons sent before the upgrade keep working.
+    """
+
+    def __init__(self, table_size: int = CALLBACK_TABLE_SIZE, namespace: str = "",
+                 filename: Optional[str] = None):
+        self.table_size = table_size
+        self.namespace = namespace
+        self.filename = filename
+        self._table: OrderedDict = OrderedDict()
+        self._tokens: dict = {}
+        self._pinned: set = set()
+        self._next_token = 0
+        if filename is not None:
+            self._load()
+
+    def _load(self) -> None:
+        """Read the table written by an earlier run."""
+        try:
+            if not os.path.exists(self.filename):
+                return
+            with open(self.filename, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            for token, op, args, pinned in data['tokens']:
+                self._add(token, (op, tuple(args)), pinned)
+            self._next_token = data['next_token']
+        except Exception as e:
+            logger.error(f"Failed to load callback table from {self.filename}: {e}")
+
+    def _save(self) -> None:
+        """Write the table, replacing the file atomically."""
+        if self.filename is None:
+            return
+        data = {
+            'next_token': self._next_token,
+            'tokens': [[token, op, list(args), token in self._pinned] for token, (op, args) in self._table.items()]
+        }
+        try:
+            temp_filename = f"{self.filename}.tmp"
+            with open(temp_filename, 'w', encoding='utf-8') as file:
+                json.dump(data, file, ensure_ascii=False)
+            os.replace(temp_filename, self.filename)
+        except Exception as e:
+            logger.error(f"Failed to save callback table to {self.filename}: {e}")
+
+    def _add(self, token: str, entry: tuple, pinned: bool) -> None:
+        self._table[token] = entry
+        self._tokens[entry] = token
+        if pinned:
+            self._pinned.add(token)
+
+    def _evict(self) -> None:
+        """Drop the least recently used unpinned tokens beyond the table size."""
+        unpinned = [token for token in self._table if token not in self._pinned]
+        for token in unpinned[:max(0, len(unpinned) - self.table_size)]:
+            del self._tokens[self._table.pop(token)]
+
+    def encode(self, op: str, *args, pin: bool = False) -> str:
+        """Encode an opcode and its arguments into callback data.
+
+        ``pin`` keeps a table token from being evicted, for buttons that are
+        shown again and again.
+        """
+        fields = [_pack_int(arg) if isinstance(arg, int) else arg for arg in args]
+        data = CALLBACK_VERSION + op + _SEPARATOR.join(fields)
+        if len(data.encode('utf-8')) <= MAX_CALLBACK_DATA:
+            return data
+
+        # The same data always gets the same token
+        entry = (op, tuple(args))
+        token = self._tokens.get(entry)
+        if token is not None:
+            self._table.move_to_end(token)
+            if pin and token not in self._pinned:
+                self._pinned.add(token)
+                self._save()
+            return TOKEN_PREFIX + token
+
+        token = _pack_int(self._next_token)
+        if self.namespace:
+            token = self.namespace + NAMESPACE_SEPARATOR + token
+        self._next_token += 1
+        self._add(token, entry, pin)
+        self._evict()
+        self._save()
+        return TOKEN_PREFIX + token
+
+    def unpin_all(self) -> None:
+        """Let every pinned token be evicted again, e.g. once the team keyboard is rebuilt."""
+        self._pinned.clear()
+
+    def decode(self, data: Optional[str]) -> Optional[Tuple[str, tuple]]:
+        """Decode callback data into ``(opcode, args)``, or None if unknown."""
+        if not data:
+            return None
+        if data.startswith(TOKEN_PREFIX):
+            return self._table.get(data[1:])
+        if data.startswith(CALLBACK_VERSION) and data[1:2] in OP_SCHEMAS:
+            op = data[1]
+            schema = OP_SCHEMAS[op]
+            fields = data[2:].split(_SEPARATOR, len(schema) - 1)
+            if len(fields) != len(schema):
+                return None
+            try:
+                return op, tuple(int(field, 36) if kind is int else field for kind, field in zip(schema, fields))
+            except ValueError:
+                return None
+        return self._decode_legacy(data)
+
+    def _decode_legacy(self, data: str) -> Optional[Tuple[str, tuple]]:
+        """Decode callback data from before the codec was introduced."""
+        try:
+            if data.startswith("team_"):
+                return OP_TEAM, (data,)
+            if data.startswith("end_chat_"):
+                return OP_END_CHAT, (int(data[len("end_chat_"):]),)
+            if data.startswith("accept_") or data.startswith("reject_"):
+                decision, user_id, team_id = data.split("_", 2)
+                return (OP_ACCEPT if decision == "accept" else OP_REJECT), (int(user_id), team_id)
+        except ValueError:
+            logger.warning(f"Malformed legacy callback data: {data}")
+        return None
+
+    def token_namespace(self, data: Optional[str]) -> Optional[str]:
+        """Return the namespace of a table token, or None for other data."""
+        if not data or not data.startswith(TOKEN_PREFIX) or NAMESPACE_SEPARATOR not in data:
+            return None
+        return data[len(TOKEN_PREFIX):].split(NAMESPACE_SEPARATOR, 1)[0]
+
+    def opcode(self, data: Optional[str]) -> Optional[str]:
+        """Return just the opcode of callback data."""
+        decoded = self.decode(data)
+        return decoded[0] if decoded else None
+
+
+# Shared codec used by all inline keyboards
+callback_codec = CallbackCodec(filename=CALLBACK_TABLE_FILE)
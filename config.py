@@ -11,6 +11,63 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_GROUP_ID = int(os.getenv("ADMIN_GROUP_ID", "0"))
 
+# Optional per-team admin groups, e.g. "team_exams=-100123,team_social=-100456".
+# Teams without an entry use ADMIN_GROUP_ID, which also sees every team.
+TEAM_ADMIN_GROUPS = {
+    team_id.strip(): int(chat_id)
+    for team_id, chat_id in (
+        item.split("=", 1) for item in os.getenv("TEAM_ADMIN_GROUPS", "").split(",") if "=" in item
+    )
+}
+ADMIN_CHAT_IDS = {ADMIN_GROUP_ID, *TEAM_ADMIN_GROUPS.values()}
+
+# Fingerprint of the last commands and menu button sent to Telegram
+BOT_SETUP_FILE = "bot_setup.json"
+
+# Logging: "json" or "text" lines written by a background thread, the most
+# records buffered before new ones are dropped, and sampling rates of noisy
+# categories ("category=rate,..."; a category is a record's category or logger
+# name, e.g. "update=0.1,httpx=0.05")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+
+# Per-update traces in OTLP JSON lines, rotated by size; empty disables tracing
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "3"))
+
+# Opt-in recording of incoming updates (scrubbed of personal data) for
+# replay_updates.py; the salt keeps user pseudonyms stable within a recording
+RECORD_UPDATES_FILE = os.getenv("RECORD_UPDATES_FILE", "")
+RECORD_UPDATES_SALT = os.getenv("RECORD_UPDATES_SALT", "replay")
+# Table of the recording's callback data tokens, written next to the recording
+RECORD_CALLBACK_TABLE_SUFFIX = ".callbacks.json"
+
+# Bot API connection pools. Outgoing calls and long polling (getUpdates) use
+# separate pools so bursts of sends never wait behind a poll. Timeouts are in
+# seconds; the pool timeout is how long a call waits for a free connection.
+# HTTP version "2" needs httpx[http2].
+BOT_API_POOL_SIZE = int(os.getenv("BOT_API_POOL_SIZE", "16"))
+BOT_API_KEEPALIVE = float(os.getenv("BOT_API_KEEPALIVE", "30"))
+BOT_API_HTTP_VERSION = os.getenv("BOT_API_HTTP_VERSION", "1.1")
+BOT_API_CONNECT_TIMEOUT = float(os.getenv("BOT_API_CONNECT_TIMEOUT", "5"))
+BOT_API_READ_TIMEOUT = float(os.getenv("BOT_API_READ_TIMEOUT", "5"))
+BOT_API_WRITE_TIMEOUT = float(os.getenv("BOT_API_WRITE_TIMEOUT", "5"))
+BOT_API_POOL_TIMEOUT = float(os.getenv("BOT_API_POOL_TIMEOUT", "5"))
+GET_UPDATES_POOL_SIZE = int(os.getenv("GET_UPDATES_POOL_SIZE", "1"))
+GET_UPDATES_KEEPALIVE = float(os.getenv("GET_UPDATES_KEEPALIVE", "60"))
+GET_UPDATES_HTTP_VERSION = os.getenv("GET_UPDATES_HTTP_VERSION", "1.1")
+
+# Multi-process mode: with more than one worker process, a receiver process
+# polls Telegram and hands every update to the worker owning its user (by a
+# hash of the user id). Each worker keeps its own data files under
+# WORKER_DATA_DIR/worker_<n>; the current data is split between them on the
+# first start, after which the number of workers can't change.
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+WORKER_DATA_DIR = os.getenv("WORKER_DATA_DIR", "workers")
+
 # Conversation states
 ASKING_REASON = 1
 ASKING_EXPERIENCE = 2
@@ -23,11 +80,92 @@ TEAMS = {
     "team_support": "تيم الدعم الفني"
 }
 
-# Data files
+# Data files; applications are stored per team, APPLICATIONS_FILE is the
+# single file used before sharding and is migrated on first start
 APPLICATIONS_FILE = "applications.json"
+APPLICATION_SHARD_FILE = "applications_{team_id}.json"
 USERS_FILE = "users.json"
 STATS_FILE = "stats.json"
 
+# Storage mode: "json" keeps whole applications in memory, "mmap" keeps the
+# free-text answers, names and team names in an append-only data file and
+# only ids, status, timestamps and offsets in RAM
+STORAGE_MODE = os.getenv("STORAGE_MODE", "json").lower()
+APPLICATION_BODIES_FILE = "application_bodies.dat"
+APPLICATION_BODIES_SHARD_FILE = "application_bodies_{team_id}.dat"
+
+# Application fields that are moved out of memory in "mmap" mode
+APPLICATION_BODY_FIELDS = ("reason", "experience")
+
+# Persistence of in-progress conversations across restarts
+PERSISTENCE_FILE = "conversations.journal"
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "30"))
+
+# Abandoned conversations (seconds); a reminder of 0 disables reminders
+CONVERSATION_TIMEOUT = float(os.getenv("CONVERSATION_TIMEOUT", "3600"))
+CONVERSATION_REMINDER_AFTER = float(os.getenv("CONVERSATION_REMINDER_AFTER", "1800"))
+CONVERSATION_SWEEP_INTERVAL = float(os.getenv("CONVERSATION_SWEEP_INTERVAL", "60"))
+
+# Outbound bulk messaging (broadcasts); Telegram allows about 30 messages per second
+BROADCASTS_FILE = "broadcasts.json"
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CHECKPOINT_EVERY = int(os.getenv("BROADCAST_CHECKPOINT_EVERY", "25"))
+
+# Recently processed update ids, so updates replayed after a crash are dropped
+PROCESSED_UPDATES_FILE = "processed_updates.json"
+UPDATE_DEDUP_WINDOW = int(os.getenv("UPDATE_DEDUP_WINDOW", "1000"))
+
+# Seconds between edits of the progress message of bulk decisions
+BULK_PROGRESS_INTERVAL = float(os.getenv("BULK_PROGRESS_INTERVAL", "2"))
+
+# Callback data too long for Telegram's 64 bytes is kept in a server-side table
+CALLBACK_TABLE_SIZE = int(os.getenv("CALLBACK_TABLE_SIZE", "1024"))
+CALLBACK_TABLE_FILE = "callback_table.json"
+
+# Days covered by the rolling hourly/daily application counters
+ROLLING_STATS_DAYS = int(os.getenv("ROLLING_STATS_DAYS", "7"))
+
+# Old applications are moved into compressed segments under ARCHIVE_DIR;
+# decided applications older than ARCHIVE_AFTER_DAYS are archived daily (0 disables)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+
+# Estimated share of common text (0-1) from which two applications' answers
+# count as near duplicates
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.7"))
+
+# Most matches listed by /search
+SEARCH_RESULTS_LIMIT = 10
+
+# Applications listed by /sla, oldest unanswered first, unless a number is given
+SLA_OLDEST_LIMIT = 10
+
+# Digest posted to every admin group: "daily", "weekly" or "off", at a local
+# time; weekly digests go out on DIGEST_WEEKDAY (0 = Sunday ... 6 = Saturday)
+DIGEST_SCHEDULE = os.getenv("DIGEST_SCHEDULE", "daily").lower()
+DIGEST_TIME = os.getenv("DIGEST_TIME", "09:00")
+DIGEST_WEEKDAY = int(os.getenv("DIGEST_WEEKDAY", "0"))
+
+# Longest caption of relayed media kept before the info text (Telegram allows 1024)
+MAX_RELAYED_CAPTION = 700
+
+# Teams and message templates that can be changed at runtime
+CONTENT_FILE = os.getenv("CONTENT_FILE", "content.json")
+CONTENT_POLL_INTERVAL = float(os.getenv("CONTENT_POLL_INTERVAL", "10"))
+
+# Inbound flood protection per user: burst size, sustained messages per second,
+# and "warn" (one warning per throttled streak) or "silent"
+FLOOD_BURST = float(os.getenv("FLOOD_BURST", "8"))
+FLOOD_RATE = float(os.getenv("FLOOD_RATE", "0.5"))
+FLOOD_MODE = os.getenv("FLOOD_MODE", "warn").lower()
+
+# Names of conversation steps used in metrics
+CONVERSATION_STEP_NAMES = {
+    ASKING_REASON: "reason",
+    ASKING_EXPERIENCE: "experience"
+}
+
 # Messages in Arabic (Egyptian dialect)
 WELCOME_MESSAGE = """
 مرحباً بك في بوت التقديم لتيمز Our Goal! 🎯
@@ -88,6 +226,24 @@ UNKNOWN_MESSAGE = """
 يمكنك الضغط على /start للبدء من جديد أو /menu لعرض القائمة الرئيسية.
 """
 
+CONVERSATION_REMINDER_MESSAGE = """
+لسه مستنيين إجابتك علشان نكمل طلب التقديم لـ {team_name} ⏳
+
+اكتب إجابتك في أي وقت، أو اضغط /cancel لو حابب تلغي الطلب.
+"""
+
+CONVERSATION_EXPIRED_MESSAGE = """
+تم إلغاء طلب التقديم لـ {team_name} لعدم الرد لفترة طويلة ⌛
+
+يمكنك الضغط على /start للبدء من جديد في أي وقت.
+"""
+
+FLOOD_WARNING = """
+بتبعت رسايل كتير ورا بعض 🙏
+
+استنى شوية وبعدين ابعت رسالتك تاني.
+"""
+
 NO_STATS_PERMISSION = """
 معذرة، الأمر دا مخصص للادمن بس.
 """
@@ -105,6 +261,225 @@ STATS_TEAM_FORMAT = """
 🔹 {team_name}: {count} طلب
 """
 
+STATS_TREND_HEADER = """
+📈 الطلبات خلال آخر {days} يوم (من الأقدم للأحدث):
+"""
+
+STATS_TREND_FORMAT = """
+🔹 {team_name}: {last_day} خلال آخر 24 ساعة
+{series}
+"""
+
+STATS_ABANDONED_HEADER = """
+⏳ الطلبات المتروكة حسب الخطوة:
+"""
+
+STATS_ABANDONED_FORMAT = """
+🔸 {step}: {count}
+"""
+
+BROADCAST_USAGE = """
+📣 <b>طريقة الاستخدام:</b>
+/broadcast team_id نص الرسالة
+
+أو رد على رسالة بالأمر /broadcast team_id لإرسالها لكل المتقدمين للتيم.
+
+التيمز المتاحة: {team_ids}
+"""
+
+BROADCAST_MESSAGE = """
+📢 <b>رسالة من فريق Our Goal:</b>
+
+{text}
+"""
+
+BROADCAST_STARTED = """
+📣 جاري إرسال الرسالة لـ {count} متقدم في {team_name}...
+"""
+
+BROADCAST_RESUMED = """
+🔄 تم استكمال الإرسال لـ {team_name} بعد إعادة التشغيل ({remaining} متبقي)
+"""
+
+BROADCAST_REPORT = """
+📣 <b>تم الانتهاء من الإرسال لـ {team_name}</b>
+
+✅ تم التوصيل: {delivered}
+❌ فشل: {failed}
+⏱️ المدة: {elapsed:.1f} ثانية ({throughput:.1f} رسالة/ثانية)
+"""
+
+PENDING_HEADER = """
+⏳ الطلبات المنتظرة: {total_pending}
+
+التفاصيل حسب التيم:
+"""
+
+BULK_USAGE = """
+📋 <b>طريقة الاستخدام:</b>
+/bulk accept team_id
+/bulk reject team_id
+
+لقرار على متقدمين محددين أضف معرفاتهم بعد التيم:
+/bulk accept team_id 123456 789012
+
+التيمز المتاحة: {team_ids}
+"""
+
+NO_PENDING_APPLICATIONS = """
+مفيش طلبات في الانتظار للتيم دا.
+"""
+
+BULK_PROGRESS = """
+{icon} جاري إرسال القرار لـ {team_name}: {done}/{total}
+"""
+
+BULK_REPORT = """
+{icon} <b>تم {action} {total} طلب في {team_name}</b>
+
+✅ تم إبلاغ: {delivered}
+❌ فشل الإبلاغ: {failed}
+⏱️ المدة: {elapsed:.1f} ثانية ({throughput:.1f} رسالة/ثانية)
+"""
+
+STATS_FLOOD_FORMAT = """
+🚫 رسائل تم تجاهلها بسبب الإغراق: {throttled_updates} ({throttled_streaks} مرة)
+"""
+
 NO_APPLICATIONS_YET = """
 لسه مفيش طلبات تقديم.
 """
+
+ARCHIVE_USAGE = """
+📦 <b>طريقة الاستخدام:</b>
+/archive days
+/archive days round_name
+
+بيتم أرشفة الطلبات اللي اتاخد فيها قرار وأقدم من عدد الأيام دا.
+الطلبات المؤرشفة بتفضل محسوبة في /stats وبتظهر في /search.
+"""
+
+ARCHIVE_REPORT = """
+📦 تم أرشفة {count} طلب أقدم من {days} يوم.
+"""
+
+NOTHING_TO_ARCHIVE = """
+مفيش طلبات قديمة تتأرشف.
+"""
+
+SEARCH_USAGE = """
+🔍 <b>طريقة الاستخدام:</b>
+/search كلمة البحث
+"""
+
+SEARCH_HEADER = """
+🔍 نتائج البحث: {total} (أول {shown})
+"""
+
+SEARCH_RESULT_FORMAT = """
+👤 {name} ({user_id}) - {team_name} - {status}
+💭 {reason}
+"""
+
+NO_SEARCH_RESULTS = """
+مفيش نتايج للبحث دا.
+"""
+
+CLEAR_REPORT = """
+🗑️ <b>تم بدء دورة تقديم جديدة!</b>
+
+✅ يمكن للمستخدمين الآن التقديم مرة أخرى
+📦 التقديمات السابقة بيتم أرشفتها في الخلفية ولسه محسوبة في /stats
+
+رقم الدورة الحالية:
+{rounds}
+
+♻️ لاسترجاع دورة سابقة استخدم /restore
+"""
+
+RESTORE_USAGE = """
+♻️ <b>طريقة الاستخدام:</b>
+/restore team_id round
+
+الدورة الحالية بتتأرشف والدورة المسترجعة بتبقى هي الحالية.
+
+التيمز المتاحة (الدورة الحالية): {team_ids}
+"""
+
+RESTORE_REPORT = """
+♻️ تم استرجاع {count} طلب من الدورة {epoch} في {team_name}.
+"""
+
+NOTHING_TO_RESTORE = """
+مفيش طلبات مؤرشفة للدورة دي.
+"""
+
+FUNNEL_HEADER = """
+🔻 <b>مراحل التقديم آخر {days} أيام</b>
+
+👋 ضغطوا /start: {start} (الإجمالي: {total_start})
+"""
+
+FUNNEL_TEAM_FORMAT = """
+<b>{team_name}</b>
+اختاروا التيم: {team} ← كتبوا السبب: {reason} ← كتبوا الخبرة: {experience} ← اتقدموا: {submitted}
+نسبة الإكمال: {conversion:.0f}%
+الإجمالي من بداية الدورة: اختاروا التيم {total_team} ← اتقدموا {total_submitted}
+"""
+
+NEAR_DUPLICATE_NOTE = """
+⚠️ <b>إجابات شبه مطابقة لطلبات تانية:</b>
+"""
+
+NEAR_DUPLICATE_FORMAT = """
+• {name} ({user_id}) - {team_name}: {similarity:.0f}%
+"""
+
+DUPLICATES_HEADER = """
+👯 <b>مجموعات طلبات بإجابات شبه مطابقة: {total}</b>
+"""
+
+DUPLICATES_MEMBER_FORMAT = """
+• {name} ({user_id}) - {team_name}
+"""
+
+DUPLICATES_GROUP_HEADER = """
+المجموعة {number}:
+"""
+
+NO_DUPLICATES = """
+مفيش طلبات بإجابات شبه مطابقة.
+"""
+
+DIGEST_HEADER = """
+📰 <b>ملخص {period}</b>
+"""
+
+DIGEST_TEAM_FORMAT = """
+<b>{team_name}</b>
+🆕 طلبات جديدة: {new}
+⏳ في الانتظار: {pending}
+✅ اتاخد فيها قرار: {decided} (متوسط وقت الرد: {average_hours:.1f} ساعة)
+⏱️ أول رد: نص الطلبات خلال {p50_hours:.1f} ساعة، و90% خلال {p90_hours:.1f} ساعة
+🕰️ أقدم طلب بدون رد مستني من: {oldest_hours:.1f} ساعة
+"""
+
+SLA_HEADER = """
+⏱️ <b>زمن أول رد على الطلبات (آخر {days} أيام)</b>
+"""
+
+SLA_TEAM_FORMAT = """
+<b>{team_name}</b>: {count} رد
+نص الطلبات خلال {p50_hours:.1f} ساعة، و90% خلال {p90_hours:.1f} ساعة
+"""
+
+SLA_OLDEST_HEADER = """
+🕰️ <b>أقدم الطلبات بدون رد:</b>
+"""
+
+SLA_OLDEST_FORMAT = """• {name} ({user_id}) - {team_name} - مستني من {hours:.1f} ساعة
+"""
+
+NO_UNANSWERED = """
+✅ كل الطلبات المنتظرة اتردّ عليها.
+"""
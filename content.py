@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import logging
+from string import Formatter
+from typing import Dict, Any, Set
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+import config
+from config import CONTENT_FILE
+from callback_codec import callback_codec, OP_TEAM
+
+logger = logging.getLogger(__name__)
+
+# Message templates are the multi-line strings in config.py; they and TEAMS
+# can be overridden from CONTENT_FILE:
+# {"teams": {"team_id": "name", ...}, "messages": {"WELCOME_MESSAGE": "...", ...}}
+DEFAULT_MESSAGES = {
+    name: value for name, value in vars(config).items()
+    if name.isupper() and isinstance(value, str) and "\n" in value
+}
+
+# Templates that only depend on the team are rendered once per content change
+TEAM_TEMPLATES = ("TEAM_SELECTION_MESSAGE", "EXPERIENCE_QUESTION", "APPLICATION_SUBMITTED", "ALREADY_APPLIED")
+
+
+class ContentSnapshot:
+    """Immutable set of teams, templates and everything prerendered from them."""
+
+    def __init__(self, teams: Dict[str, str], messages: Dict[str, str]):
+        self.teams = dict(teams)
+        self.messages = dict(messages)
+
+        # Team selection keyboard, two buttons per row; it is sent over and over,
+        # so table tokens of its buttons are pinned until the next keyboard
+        callback_codec.unpin_all()
+        keyboard = []
+        row = []
+        for team_id, team_name in self.teams.items():
+            row.append(InlineKeyboardButton(team_name, callback_data=callback_codec.encode(OP_TEAM, team_id, pin=True)))
+            if len(row) == 2:
+                keyboard.append(row)
+                row = []
+        if row:
+            keyboard.append(row)
+        self.team_keyboard = InlineKeyboardMarkup(keyboard)
+
+        self.team_texts = {
+            (name, team_id): self.messages[name].format(team_name=team_name)
+            for name in TEAM_TEMPLATES
+            for team_id, team_name in self.teams.items()
+        }
+
+
+def _format_fields(template: str) -> Set[str]:
+    """Names of the placeholders a template is formatted with."""
+    return {
+        field_name.split('.')[0].split('[')[0]
+        for _, field_name, _, _ in Formatter().parse(template)
+        if field_name is not None
+    }
+
+
+def _load_snapshot() -> ContentSnapshot:
+    """Build a snapshot from the defaults overridden by CONTENT_FILE."""
+    with open(CONTENT_FILE, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+
+    teams = data.get('teams', config.TEAMS)
+    if not isinstance(teams, dict) or not teams or not all(
+        isinstance(team_id, str) and isinstance(team_name, str) for team_id, team_name in teams.items()
+    ):
+        raise ValueError("'teams' must be a non-empty object of team ids to names")
+
+    messages = dict(DEFAULT_MESSAGES)
+    for name, value in data.get('messages', {}).items():
+        if name not in DEFAULT_MESSAGES:
+            raise ValueError(f"Unknown message template {name}")
+        if not isinstance(value, str):
+            raise ValueError(f"Message template {name} must be a string")
+        # Handlers only pass the placeholders of the default, so others would fail there
+        try:
+            unknown = _format_fields(value) - _format_fields(DEFAULT_MESSAGES[name])
+        except ValueError as e:
+            raise ValueError(f"Message template {name} is not a valid format string: {e}")
+        if unknown:
+            raise ValueError(f"Message template {name} uses unknown placeholders: {', '.join(sorted(unknown))}")
+        messages[name] = value
+
+    return ContentSnapshot(teams, messages)
+
+
+def _file_mtime() -> float:
+    try:
+        return os.stat(CONTENT_FILE).st_mtime
+    except OSError:
+        return 0.0
+
+
+_current = ContentSnapshot(config.TEAMS, DEFAULT_MESSAGES)
+_seen_mtime = 0.0
+
+
+def current() -> ContentSnapshot:
+    """Get the content in use right now."""
+    return _current
+
+
+def reload_if_changed() -> bool:
+    """Swap in CONTENT_FILE if its mtime changed; keep the old content on errors."""
+    global _current, _seen_mtime
+    mtime = _file_mtime()
+    if mtime == _seen_mtime:
+        return False
+    _seen_mtime = mtime
+
+    if not mtime:
+        # File removed, fall back to the built-in content
+        _current = ContentSnapshot(config.TEAMS, DEFAULT_MESSAGES)
+        logger.info(f"{CONTENT_FILE} removed, using built-in teams and messages")
+        return True
+
+    try:
+        snapshot = _load_snapshot()
+    except Exception as e:
+        # The broken file is not retried until it changes again
+        logger.error(f"Failed to reload {CONTENT_FILE}, keeping current content: {e}")
+        return False
+
+    _current = snapshot
+    logger.info(f"Reloaded {len(snapshot.teams)} teams and messages from {CONTENT_FILE}")
+    return True
+
+
+def team_text(name: str, team_id: str) -> str:
+    """Get a prerendered team template, rendering it for unknown teams."""
+    text = _current.team_texts.get((name, team_id))
+    if text is None:
+        text = _current.messages[name].format(team_name=_current.teams.get(team_id, "غير معروف"))
+    return text
+
+
+# Pick up the content file before the first update is handled
+reload_if_changed()
+
+
+def __getattr__(name: str) -> Any:
+    # content.TEAMS and content.<TEMPLATE> always resolve against the current snapshot
+    if name == "TEAMS":
+        return _current.teams
+    if name == "TEAM_KEYBOARD":
+        return _current.team_keyboard
+    if name in _current.messages:
+        return _current.messages[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
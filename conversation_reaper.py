@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+from typing import Dict, List, Set, Tuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationReaper:
+    """Track in-progress applications on a timer wheel.
+
+    Each user sits in the bucket of their next deadline (reminder or expiry),
+    so a sweep only visits buckets whose time has passed instead of every
+    open conversation. Rescheduled users are skipped lazily when their old
+    bucket comes up.
+    """
+
+    def __init__(self, timeout: float, reminder_after: float, resolution: float):
+        self.timeout = timeout
+        self.reminder_after = reminder_after if 0 < reminder_after < timeout else 0
+        self.resolution = resolution
+        self._entries: Dict[int, dict] = {}
+        self._wheel: Dict[int, Set[int]] = {}
+        self._cursor = self._bucket(time.time())
+
+    def _bucket(self, when: float) -> int:
+        return int(when // self.resolution)
+
+    def _schedule(self, user_id: int, when: float) -> None:
+        # Deadlines that are already overdue go into the next bucket to sweep
+        bucket = max(self._bucket(when), self._cursor)
+        self._entries[user_id]['bucket'] = bucket
+        self._wheel.setdefault(bucket, set()).add(user_id)
+
+    def touch(self, user_id: int, chat_id: int, step: int, last_activity: Optional[float] = None) -> None:
+        """Record activity of a user waiting at ``step`` of the conversation."""
+        last_activity = last_activity if last_activity is not None else time.time()
+        self._entries[user_id] = {
+            'chat_id': chat_id,
+            'step': step,
+            'last_activity': last_activity,
+            'reminded': False
+        }
+        if self.reminder_after:
+            self._schedule(user_id, last_activity + self.reminder_after)
+        else:
+            self._schedule(user_id, last_activity + self.timeout)
+
+    def discard(self, user_id: int) -> None:
+        """Stop tracking a user whose conversation ended normally."""
+        self._entries.pop(user_id, None)
+
+    def collect_due(self, now: Optional[float] = None) -> Tuple[List[dict], List[dict]]:
+        """Return the conversations that need a reminder and those that expired."""
+        now = now if now is not None else time.time()
+        current = self._bucket(now)
+        reminders = []
+        expired = []
+
+        # Only fully elapsed buckets are swept
+        while self._cursor < current:
+            user_ids = self._wheel.pop(self._cursor, ())
+            self._cursor += 1
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry is None or entry['bucket'] != self._cursor - 1:
+                    continue
+                if self.reminder_after and not entry['reminded']:
+                    entry['reminded'] = True
+                    reminders.append(dict(entry, user_id=user_id))
+                    self._schedule(user_id, entry['last_activity'] + self.timeout)
+                else:
+                    del self._entries[user_id]
+                    expired.append(dict(entry, user_id=user_id))
+
+        return reminders, expired
+
+    def __len__(self) -> int:
+        return len(self._entries)
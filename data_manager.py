@@ -1,22 +1,237 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import glob
 import json
 import os
 import logging
-from typing import Dict, List, Any
+import time
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
-from config import APPLICATIONS_FILE, USERS_FILE, STATS_FILE
+from config import (
+    ARCHIVE_DIR,
+    NEAR_DUPLICATE_THRESHOLD,
+    APPLICATIONS_FILE,
+    USERS_FILE,
+    STATS_FILE,
+    BROADCASTS_FILE,
+    PROCESSED_UPDATES_FILE,
+    UPDATE_DEDUP_WINDOW,
+    ROLLING_STATS_DAYS,
+    STORAGE_MODE,
+    APPLICATION_SHARD_FILE,
+    APPLICATION_BODIES_FILE,
+    APPLICATION_BODIES_SHARD_FILE,
+    APPLICATION_BODY_FIELDS
+)
+import content
+from archive import ArchiveStore
+from record_store import RecordStore
+from rolling_stats import RollingStats, RollingDurations, RollingHistogram
+from funnel import Funnel, ALL_TEAMS
+from near_duplicates import NearDuplicateIndex, signature, encode_signature, decode_signature
+from update_dedup import UpdateWindow
+from unanswered import UnansweredQueue
+from tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+# Application statuses
+STATUS_PENDING = 'pending'
+STATUS_ACCEPTED = 'accepted'
+STATUS_REJECTED = 'rejected'
+
+# Fields besides the answers that leave memory in "mmap" mode; of ``user_info``
+# only the user id stays in RAM, and the signature lives packed in the duplicate index
+DETACHED_FIELDS = APPLICATION_BODY_FIELDS + ('team_name', 'minhash')
+
+class TeamShard:
+    """Applications of one team with their own file, indexes and body store.
+    
+    Writes for a team only rewrite that team's file, so a busy team doesn't
+    slow down saves and decisions for the others.
+    """
+    
+    def __init__(self, team_id: str, applications: List[dict]):
+        self.team_id = team_id
+        self.filename = APPLICATION_SHARD_FILE.format(team_id=team_id)
+        self.applications = applications
+        
+        # One application per user and team, and the pending ones in arrival order
+        self.applicants: Dict[int, dict] = {}
+        self.pending: Dict[int, dict] = {}
+        for application in applications:
+            self.index(application)
+        
+        # In "mmap" mode free-text answers live on disk, addressed by offset; the
+        # file is also opened in "json" mode to read them back into the shard
+        self.record_store = None
+        if STORAGE_MODE == "mmap" or os.path.exists(APPLICATION_BODIES_SHARD_FILE.format(team_id=team_id)):
+            self.record_store = RecordStore(APPLICATION_BODIES_SHARD_FILE.format(team_id=team_id))
+    
+    def index(self, application: dict) -> None:
+        """Add an application to the shard's indexes."""
+        user_id = application['user_info']['user_id']
+        self.applicants[user_id] = application
+        if application.get('status', STATUS_PENDING) == STATUS_PENDING:
+            self.pending[user_id] = application
+    
+    def replace(self, applications: List[dict]) -> List[dict]:
+        """Swap in another list of applications and return the previous one."""
+        previous = self.applications
+        self.applications = applications
+        self.applicants = {}
+        self.pending = {}
+        for application in applications:
+            self.index(application)
+        return previous
+
+
 class DataManager:
     """Handle data persistence for the bot."""
     
     def __init__(self):
-        self.applications = self._load_json(APPLICATIONS_FILE, [])
+        # Data files written since the last processed update was recorded
+        self._writes_since_mark = 0
+        self._update_window_dirty = False
+        self.update_window = UpdateWindow(UPDATE_DEDUP_WINDOW, self._load_json(PROCESSED_UPDATES_FILE, None))
+        
         self.users = self._load_json(USERS_FILE, {})
         self.stats = self._load_json(STATS_FILE, {})
+        self.broadcasts = self._load_json(BROADCASTS_FILE, {})
+        self.shards: Dict[str, TeamShard] = {}
+        # (team_id, epoch, applications) of finished rounds waiting to be archived
+        self.retired: List[Tuple[str, int, List[dict]]] = []
+        self._load_shards()
+        self.archive = ArchiveStore(ARCHIVE_DIR)
+        
+        # Time-bucketed counters; built once from history when first enabled
+        self.rolling_stats = RollingStats(ROLLING_STATS_DAYS, self.stats.get('rolling'))
+        if 'rolling' not in self.stats:
+            for application in self._iter_applications():
+                try:
+                    timestamp = datetime.fromisoformat(application['timestamp']).timestamp()
+                except (KeyError, ValueError):
+                    continue
+                self.rolling_stats.add(application['selected_team'], timestamp)
+            self.stats['rolling'] = self.rolling_stats.to_dict()
+        
+        # Time from submission to the admins' decision, per team and day
+        self.response_times = RollingDurations(ROLLING_STATS_DAYS, self.stats.get('response_times'))
+        
+        # Time from submission to the admins' first answer (a decision or a reply)
+        self.first_responses = RollingHistogram(ROLLING_STATS_DAYS, self.stats.get('first_responses'))
+        
+        # Steps reached by applicants; counted often, so written out in batches
+        # together with the rolling counters
+        self.funnel = Funnel(ROLLING_STATS_DAYS, self.stats.get('funnel'))
+        self._counters_dirty = False
+        
+        # Keep only offsets of free-text answers in memory in "mmap" mode (or
+        # bring them back after switching to "json"), and compute missing
+        # MinHash signatures once before indexing them
+        for shard in self.shards.values():
+            try:
+                changed = self._convert_bodies(shard)
+            except Exception as e:
+                logger.error(f"Failed to convert the stored answers of {shard.team_id}: {e}")
+                continue
+            if changed and not self._save_shard(shard):
+                continue
+            if STORAGE_MODE != "mmap" and shard.record_store is not None:
+                # Every answer is back in the shard file
+                shard.record_store.close()
+                os.replace(shard.record_store.filename, f"{shard.record_store.filename}.migrated")
+                shard.record_store = None
+        
+        # Index the current rounds; afterwards only changed applications are
+        # added or removed
+        self.duplicates = NearDuplicateIndex(NEAR_DUPLICATE_THRESHOLD)
+        self.unanswered = UnansweredQueue()
+        for team_id, shard in self.shards.items():
+            for application in shard.applicants.values():
+                self._index_application(team_id, application)
+    
+    def _load_shards(self) -> None:
+        """Load every team's shard, splitting the single legacy file on first run."""
+        prefix, suffix = APPLICATION_SHARD_FILE.split("{team_id}")
+        team_ids = set(content.TEAMS)
+        for filename in glob.glob(APPLICATION_SHARD_FILE.format(team_id="*")):
+            team_ids.add(filename[len(prefix):len(filename) - len(suffix)])
+        
+        has_shard_files = any(
+            os.path.exists(APPLICATION_SHARD_FILE.format(team_id=team_id)) for team_id in team_ids
+        )
+        if not has_shard_files and os.path.exists(APPLICATIONS_FILE):
+            self._migrate_legacy_applications()
+            return
+        
+        for team_id in team_ids:
+            # Applications of earlier rounds are still on disk if the purge didn't finish
+            epoch = self.get_epoch(team_id)
+            current = []
+            retired: Dict[int, List[dict]] = {}
+            for application in self._load_json(APPLICATION_SHARD_FILE.format(team_id=team_id), []):
+                application_epoch = application.get('epoch', 1)
+                if application_epoch < epoch:
+                    retired.setdefault(application_epoch, []).append(application)
+                else:
+                    current.append(application)
+            self.shards[team_id] = TeamShard(team_id, current)
+            for application_epoch, applications in sorted(retired.items()):
+                self.retired.append((team_id, application_epoch, applications))
+    
+    def _migrate_legacy_applications(self) -> None:
+        """Split the legacy applications file into one shard per team."""
+        legacy_applications = self._load_json(APPLICATIONS_FILE, [])
+        legacy_store = None
+        if os.path.exists(APPLICATION_BODIES_FILE):
+            legacy_store = RecordStore(APPLICATION_BODIES_FILE)
+        
+        grouped: Dict[str, List[dict]] = {team_id: [] for team_id in content.TEAMS}
+        for application in legacy_applications:
+            # Answers kept in the old shared body file are inlined again
+            if 'body_offset' in application and legacy_store is not None:
+                body = legacy_store.read(application.pop('body_offset'), application.pop('body_length'))
+                application.update(body)
+            grouped.setdefault(application['selected_team'], []).append(application)
+        
+        for team_id, applications in grouped.items():
+            shard = TeamShard(team_id, applications)
+            self.shards[team_id] = shard
+            if not self._save_shard(shard):
+                raise RuntimeError(f"Failed to migrate applications of {team_id}")
+        
+        if legacy_store is not None:
+            legacy_store.close()
+            os.replace(APPLICATION_BODIES_FILE, f"{APPLICATION_BODIES_FILE}.migrated")
+        os.replace(APPLICATIONS_FILE, f"{APPLICATIONS_FILE}.migrated")
+        logger.info(f"Migrated {len(legacy_applications)} applications into {len(grouped)} team shards")
+    
+    def _shard(self, team_id: str) -> TeamShard:
+        """Get the shard of a team, creating it on first use."""
+        if team_id not in self.shards:
+            self.shards[team_id] = TeamShard(team_id, [])
+        return self.shards[team_id]
+    
+    def _retired_applications(self, team_id: str) -> List[dict]:
+        """Applications of a team's finished rounds that aren't archived yet."""
+        return [
+            application
+            for retired_team_id, epoch, applications in self.retired if retired_team_id == team_id
+            for application in applications
+        ]
+    
+    def _save_shard(self, shard: TeamShard) -> bool:
+        """Write one team's applications, keeping finished rounds that aren't archived yet."""
+        retired = self._retired_applications(shard.team_id)
+        return self._save_json(shard.filename, retired + shard.applications if retired else shard.applications)
+    
+    def _iter_applications(self, team_ids: Optional[List[str]] = None):
+        """Iterate over stored applications of the given teams (all by default)."""
+        for team_id, shard in self.shards.items():
+            if team_ids is None or team_id in team_ids:
+                yield from shard.applications
     
     def _load_json(self, filename: str, default_value: Any) -> Any:
         """Load JSON data from file."""
@@ -30,28 +245,127 @@ class DataManager:
             return default_value
     
     def _save_json(self, filename: str, data: Any) -> bool:
-        """Save data to JSON file."""
+        """Save data to JSON file, replacing it atomically."""
         try:
-            with open(filename, 'w', encoding='utf-8') as file:
-                json.dump(data, file, ensure_ascii=False, indent=2)
+            temp_filename = f"{filename}.tmp"
+            with tracer.span("storage.write", file=filename):
+                with open(temp_filename, 'w', encoding='utf-8') as file:
+                    json.dump(data, file, ensure_ascii=False, indent=2)
+                os.replace(temp_filename, filename)
+            if filename != PROCESSED_UPDATES_FILE:
+                self._writes_since_mark += 1
             return True
         except Exception as e:
             logger.error(f"Failed to save {filename}: {e}")
             return False
     
+    def _signature(self, application: dict, body: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """MinHash signature of an application's free-text answers."""
+        body = body if body is not None else self.get_application_body(application)
+        values = signature("\n".join(body.get(field, '') for field in APPLICATION_BODY_FIELDS))
+        return encode_signature(values) if values is not None else None
+    
+    def _index_application(self, team_id: str, application: dict) -> None:
+        """Add a current application with its answers to the duplicate index and the unanswered queue."""
+        user_id = application['user_info']['user_id']
+        minhash = application['minhash'] if 'body_offset' not in application else (
+            self.get_application_body(application).get('minhash')
+        )
+        if minhash:
+            self.duplicates.add((team_id, user_id), decode_signature(minhash))
+        if application.get('status', STATUS_PENDING) == STATUS_PENDING and 'answered_at' not in application:
+            self.unanswered.add(team_id, user_id, self._submitted(application))
+    
+    def _submitted(self, application: dict) -> float:
+        """Timestamp an application was submitted at."""
+        try:
+            return datetime.fromisoformat(application['timestamp']).timestamp()
+        except (KeyError, ValueError):
+            return time.time()
+    
+    def _convert_bodies(self, shard: TeamShard) -> bool:
+        """Bring a shard's applications, finished rounds included, in line with STORAGE_MODE.
+        
+        Answers move into the record store in "mmap" mode and back into the
+        applications in "json" mode; records written before names, team
+        names and signatures left memory are moved again. Applications stored before
+        signatures existed are signed on the way. Returns True if anything
+        changed.
+        """
+        changed = False
+        for application in self._retired_applications(shard.team_id) + shard.applications:
+            if 'body_offset' in application and (
+                STORAGE_MODE != "mmap" or any(field in application for field in DETACHED_FIELDS)
+            ):
+                self._inline_body(shard, application)
+                changed = True
+            if 'body_offset' in application:
+                continue
+            if 'minhash' not in application:
+                application['minhash'] = self._signature(application)
+                changed = True
+            if STORAGE_MODE == "mmap":
+                self._detach_body(shard, application)
+                changed = True
+        return changed
+    
+    def _detach_body(self, shard: TeamShard, application: dict) -> dict:
+        """Replace the free-text fields, names, team name and signature of an application with a store offset."""
+        body = {field: application.pop(field, '') for field in DETACHED_FIELDS}
+        body['user_info'] = application['user_info']
+        offset, length = shard.record_store.append(body)
+        application['user_info'] = {'user_id': body['user_info']['user_id']}
+        application['body_offset'] = offset
+        application['body_length'] = length
+        return application
+    
+    def _inline_body(self, shard: TeamShard, application: dict) -> None:
+        """Put the fields kept in the record store back into an application."""
+        body = shard.record_store.read(application['body_offset'], application['body_length'])
+        del application['body_offset'], application['body_length']
+        application.update(body)
+    
+    def get_application_body(self, application: dict) -> Dict[str, Any]:
+        """Get the free-text answers of an application, with the fields kept next to them on disk."""
+        if 'body_offset' not in application:
+            return {field: application.get(field, '') for field in APPLICATION_BODY_FIELDS}
+        try:
+            record_store = self.shards[application['selected_team']].record_store
+            return record_store.read(application['body_offset'], application['body_length'])
+        except Exception as e:
+            logger.error(f"Failed to read application body at {application['body_offset']}: {e}")
+            return {field: '' for field in APPLICATION_BODY_FIELDS}
+    
+    def get_full_application(self, application: dict, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Get a copy of an application including its free-text answers and names."""
+        full_application = dict(application)
+        full_application.pop('body_offset', None)
+        full_application.pop('body_length', None)
+        full_application.update(body if body is not None else self.get_application_body(application))
+        return full_application
+    
     def has_user_applied(self, user_id: int, team_id: str) -> bool:
         """Check if user has already applied to a specific team."""
-        for application in self.applications:
-            if (application['user_info']['user_id'] == user_id and 
-                application['selected_team'] == team_id):
-                return True
-        return False
+        shard = self.shards.get(team_id)
+        return shard is not None and user_id in shard.applicants
     
+    @tracer.traced("storage.save_application")
     def save_application(self, application_data: dict) -> bool:
         """Save a new application."""
         try:
-            # Add application to list
-            self.applications.append(application_data)
+            application_data.setdefault('status', STATUS_PENDING)
+            application_data['epoch'] = self.get_epoch(application_data['selected_team'])
+            application_data['minhash'] = self._signature(application_data)
+            
+            # Add application to its team's shard, keeping only the index in memory in "mmap" mode
+            shard = self._shard(application_data['selected_team'])
+            if shard.record_store is not None:
+                stored_application = self._detach_body(shard, dict(application_data))
+            else:
+                stored_application = application_data
+            shard.applications.append(stored_application)
+            shard.index(stored_application)
+            self._index_application(application_data['selected_team'], application_data)
             
             # Update user data
             user_id = str(application_data['user_info']['user_id'])
@@ -74,8 +388,14 @@ class DataManager:
             # Update last activity
             self.users[user_id]['last_active'] = application_data['timestamp']
             
+            # Update rolling counters; they are written out by flush_statistics so
+            # saves for different teams don't all rewrite the shared stats file
+            self.rolling_stats.add(application_data['selected_team'])
+            self.funnel.add('submitted', application_data['selected_team'])
+            self._counters_dirty = True
+            
             # Save to files
-            self._save_json(APPLICATIONS_FILE, self.applications)
+            self._save_shard(shard)
             self._save_json(USERS_FILE, self.users)
             
             return True
@@ -84,20 +404,32 @@ class DataManager:
             logger.error(f"Failed to save application: {e}")
             return False
     
-    def get_statistics(self) -> Dict[str, Any]:
-        """Get application statistics."""
+    def get_statistics(self, team_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Get application statistics, optionally limited to some teams."""
         try:
             # Count applications by team
             team_counts = {}
             unique_users = set()
             
-            for application in self.applications:
-                team_id = application['selected_team']
-                team_counts[team_id] = team_counts.get(team_id, 0) + 1
-                unique_users.add(application['user_info']['user_id'])
+            for team_id, shard in self.shards.items():
+                if team_ids is not None and team_id not in team_ids:
+                    continue
+                if shard.applications:
+                    team_counts[team_id] = len(shard.applications)
+                unique_users.update(shard.applicants)
+            
+            # Finished rounds count until they are archived, then through the archive's aggregates
+            for team_id, epoch, applications in self.retired:
+                if team_ids is None or team_id in team_ids:
+                    team_counts[team_id] = team_counts.get(team_id, 0) + len(applications)
+                    unique_users.update(application['user_info']['user_id'] for application in applications)
+            for team_id, count in self.archive.team_counts().items():
+                if team_ids is None or team_id in team_ids:
+                    team_counts[team_id] = team_counts.get(team_id, 0) + count
+            unique_users.update(self.archive.user_ids(team_ids))
             
             return {
-                'total_applications': len(self.applications),
+                'total_applications': sum(team_counts.values()),
                 'total_users': len(unique_users),
                 'team_counts': team_counts
             }
@@ -110,34 +442,505 @@ class DataManager:
                 'team_counts': {}
             }
     
+    def record_abandonment(self, step: str) -> None:
+        """Count a conversation that was abandoned at the given step."""
+        abandoned = self.stats.setdefault('abandoned', {})
+        abandoned[step] = abandoned.get(step, 0) + 1
+        self._save_json(STATS_FILE, self.stats)
+    
+    def record_reminder(self) -> None:
+        """Count a reminder sent to an inactive applicant."""
+        self.stats['reminders_sent'] = self.stats.get('reminders_sent', 0) + 1
+        self._save_json(STATS_FILE, self.stats)
+    
+    def get_abandonment_statistics(self) -> Dict[str, Any]:
+        """Get abandoned conversation counts per step."""
+        return {
+            'abandoned': dict(self.stats.get('abandoned', {})),
+            'reminders_sent': self.stats.get('reminders_sent', 0)
+        }
+    
+    def record_funnel_step(self, step: str, team_id: str = ALL_TEAMS) -> None:
+        """Count an applicant reaching a step of the application."""
+        self.funnel.add(step, team_id)
+        self._counters_dirty = True
+    
+    def flush_statistics(self) -> None:
+        """Write out rolling and funnel counts recorded since the last stats write."""
+        if self._counters_dirty:
+            self.stats['rolling'] = self.rolling_stats.to_dict()
+            self.stats['funnel'] = self.funnel.to_dict()
+            self._counters_dirty = not self._save_json(STATS_FILE, self.stats)
+    
+    def get_funnel_statistics(self, team_ids: List[str], days: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """Get applicants per step over the last days for the given teams and for /start.
+        
+        All-time counts of every step are included as ``total_<step>``.
+        """
+        funnel = {}
+        for team_id in [ALL_TEAMS, *team_ids]:
+            funnel[team_id] = self.funnel.counts(team_id, days)
+            for step, count in self.funnel.total_counts(team_id).items():
+                funnel[team_id][f"total_{step}"] = count
+        return funnel
+    
+    def get_digest(self, team_ids: List[str], days: int) -> Dict[str, Dict[str, Any]]:
+        """Get new, pending and decided applications with response times per team.
+        
+        Everything comes from counters and the top of the unanswered queue, so
+        the cost doesn't grow with the data.
+        """
+        digest = {}
+        for team_id in team_ids:
+            shard = self.shards.get(team_id)
+            responses = self.response_times.summary(team_id, days)
+            oldest = self.unanswered.oldest([team_id], 1)
+            digest[team_id] = {
+                'new': sum(self.rolling_stats.daily(team_id, days)),
+                'pending': len(shard.pending) if shard is not None else 0,
+                'decided': responses['count'],
+                'average_response': responses['average'],
+                'first_responses': self.first_responses.counts(team_id, days),
+                'oldest_unanswered': time.time() - oldest[0][0] if oldest else 0.0
+            }
+        return digest
+    
+    def get_rolling_statistics(self, days: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """Get per-team daily counts over the last days and the last 24 hours total."""
+        return {
+            team_id: {
+                'daily': self.rolling_stats.daily(team_id, days),
+                'last_day': sum(self.rolling_stats.hourly(team_id, 24))
+            }
+            for team_id in self.rolling_stats.teams
+        }
+    
     def get_user_applications(self, user_id: int) -> List[Dict[str, Any]]:
         """Get all applications for a specific user."""
         user_applications = []
-        for application in self.applications:
-            if application['user_info']['user_id'] == user_id:
-                user_applications.append(application)
+        for shard in self.shards.values():
+            application = shard.applicants.get(user_id)
+            if application is not None:
+                user_applications.append(self.get_full_application(application))
         return user_applications
     
     def get_team_applications(self, team_id: str) -> List[Dict[str, Any]]:
-        """Get all applications for a specific team."""
-        team_applications = []
-        for application in self.applications:
-            if application['selected_team'] == team_id:
-                team_applications.append(application)
+        """Get all applications for a specific team, archived ones first."""
+        team_applications = list(self.archive.iter_applications([team_id]))
+        shard = self.shards.get(team_id)
+        if shard is not None:
+            team_applications.extend(self.get_full_application(application) for application in shard.applications)
         return team_applications
     
-    def clear_applications(self) -> bool:
-        """Clear all applications data."""
+    @tracer.traced("storage.set_application_status")
+    def set_application_status(self, user_id: int, team_id: str, expected: str, status: str,
+                               decided_by: str = '') -> bool:
+        """Change an application's status only if it is currently ``expected``.
+        
+        Returns False without touching anything when another decision got
+        there first, so repeated button presses are no-ops.
+        """
+        shard = self.shards.get(team_id)
+        application = shard.pending.get(user_id) if shard is not None else None
+        if expected != STATUS_PENDING or application is None:
+            return False
+        return bool(self._decide(team_id, [application], status, decided_by))
+    
+    def reopen_application(self, user_id: int, team_id: str, status: str) -> bool:
+        """Make an application pending again if it is still ``status``.
+        
+        Undoes a decision the applicant couldn't be told about, so it can be
+        made again; the time of the first answer is kept.
+        """
+        shard = self.shards.get(team_id)
+        application = shard.applicants.get(user_id) if shard is not None else None
+        if application is None or application.get('status') != status:
+            return False
+        decision = {key: application.pop(key) for key in ('decided_at', 'decided_by') if key in application}
+        application['status'] = STATUS_PENDING
+        shard.index(application)
+        if not self._save_shard(shard):
+            application['status'] = status
+            application.update(decision)
+            del shard.pending[user_id]
+            return False
+        return True
+    
+    def decide_applications(self, team_id: str, status: str, user_ids: Optional[List[int]] = None,
+                            decided_by: str = '') -> List[Dict[str, Any]]:
+        """Set the status of pending applications of a team in one write.
+        
+        Only applications from ``user_ids`` are decided when given. Returns
+        the applications whose status changed.
+        """
+        shard = self.shards.get(team_id)
+        team_pending = shard.pending if shard is not None else {}
+        if user_ids is None:
+            applications = list(team_pending.values())
+        else:
+            applications = [team_pending[user_id] for user_id in dict.fromkeys(user_ids) if user_id in team_pending]
+        return self._decide(team_id, applications, status, decided_by)
+    
+    def _decide(self, team_id: str, applications: List[dict], status: str, decided_by: str) -> List[Dict[str, Any]]:
+        """Move pending applications to ``status`` and persist them in one write."""
+        if not applications:
+            return []
+        
+        shard = self.shards[team_id]
+        decided_at = datetime.now().isoformat()
+        # A decision is the first answer unless an admin replied before
+        answered = []
+        for application in applications:
+            application['status'] = status
+            application['decided_at'] = decided_at
+            application['decided_by'] = decided_by
+            del shard.pending[application['user_info']['user_id']]
+            if 'answered_at' not in application:
+                application['answered_at'] = decided_at
+                answered.append(application)
+        
+        if not self._save_shard(shard):
+            # Roll back so memory matches what is on disk
+            for application in applications:
+                application['status'] = STATUS_PENDING
+                application.pop('decided_at', None)
+                application.pop('decided_by', None)
+                shard.index(application)
+            for application in answered:
+                application.pop('answered_at', None)
+            return []
+        
+        now = datetime.fromisoformat(decided_at)
+        for application in applications:
+            try:
+                waited = (now - datetime.fromisoformat(application['timestamp'])).total_seconds()
+            except (KeyError, ValueError):
+                continue
+            self.response_times.add(team_id, max(waited, 0))
+        self.stats['response_times'] = self.response_times.to_dict()
+        for application in answered:
+            self._record_first_response(team_id, application)
+        self._save_json(STATS_FILE, self.stats)
+        return applications
+    
+    def _record_first_response(self, team_id: str, application: dict) -> None:
+        """Count the time to an application's first answer; the caller saves the stats."""
+        user_id = application['user_info']['user_id']
+        submitted = self.unanswered.discard(team_id, user_id)
+        if submitted is None:
+            submitted = self._submitted(application)
+        answered = datetime.fromisoformat(application['answered_at']).timestamp()
+        self.first_responses.add(team_id, max(answered - submitted, 0), answered)
+        self.stats['first_responses'] = self.first_responses.to_dict()
+    
+    def record_admin_reply(self, user_id: int, team_ids: List[str]) -> int:
+        """Mark a user's pending applications to the given teams as answered by a reply.
+        
+        Only the first answer counts, so later replies change nothing.
+        Returns the number of applications answered for the first time.
+        """
+        answered_at = datetime.now().isoformat()
+        answered = 0
+        for team_id in team_ids:
+            shard = self.shards.get(team_id)
+            application = shard.pending.get(user_id) if shard is not None else None
+            if application is None or 'answered_at' in application:
+                continue
+            application['answered_at'] = answered_at
+            if not self._save_shard(shard):
+                application.pop('answered_at')
+                continue
+            self._record_first_response(team_id, application)
+            answered += 1
+        if answered:
+            self._save_json(STATS_FILE, self.stats)
+        return answered
+    
+    def get_first_response_histograms(self, team_ids: List[str], days: Optional[int] = None) -> Dict[str, List[int]]:
+        """Get counts of first answers per time bucket (see rolling_stats.DURATION_BOUNDS) per team."""
+        return {team_id: self.first_responses.counts(team_id, days) for team_id in team_ids}
+    
+    def get_oldest_unanswered(self, team_ids: List[str], limit: int) -> List[Dict[str, Any]]:
+        """Get the applications waiting longest for a first answer, with the seconds waited."""
+        now = time.time()
+        oldest = []
+        for submitted, team_id, user_id in self.unanswered.oldest(team_ids, limit):
+            application = self.shards[team_id].pending.get(user_id)
+            if application is None:
+                continue
+            oldest.append({
+                'user_info': self.get_full_application(application)['user_info'],
+                'selected_team': team_id,
+                'waiting': now - submitted
+            })
+        return oldest
+    
+    def get_pending_counts(self, team_ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """Get the number of pending applications per team."""
+        return {
+            team_id: len(shard.pending)
+            for team_id, shard in self.shards.items()
+            if team_ids is None or team_id in team_ids
+        }
+    
+    def find_near_duplicates(self, application: dict) -> List[Dict[str, Any]]:
+        """Get current applications whose answers are nearly the same as this one's."""
+        if not application.get('minhash'):
+            return []
+        key = (application['selected_team'], application['user_info']['user_id'])
+        matches = []
+        for (team_id, user_id), score in self.duplicates.query(decode_signature(application['minhash']), exclude=key):
+            matches.append({
+                'application': self.get_full_application(self.shards[team_id].applicants[user_id]),
+                'similarity': score
+            })
+        return matches
+    
+    def get_near_duplicate_groups(self, team_ids: Optional[List[str]] = None) -> List[List[dict]]:
+        """Get groups of current applications with nearly the same answers."""
+        return [
+            [self.get_full_application(self.shards[team_id].applicants[user_id]) for team_id, user_id in group]
+            for group in self.duplicates.groups(team_ids)
+        ]
+    
+    def get_team_user_ids(self, team_id: str) -> List[int]:
+        """Get the distinct ids of users who applied to a team."""
+        shard = self.shards.get(team_id)
+        return list(shard.applicants) if shard is not None else []
+    
+    def is_update_processed(self, update_id: int) -> bool:
+        """Check whether an update was already handled before."""
+        return self.update_window.seen(update_id)
+    
+    def mark_update_processed(self, update_id: int) -> None:
+        """Record a handled update.
+        
+        Updates that changed stored data are written out right away so a
+        crash can't replay them; the rest are batched by flush_processed_updates.
+        """
+        self.update_window.add(update_id)
+        if self._writes_since_mark:
+            self._writes_since_mark = 0
+            self._update_window_dirty = not self._save_json(PROCESSED_UPDATES_FILE, self.update_window.to_dict())
+        else:
+            self._update_window_dirty = True
+    
+    def flush_processed_updates(self) -> None:
+        """Write out processed update ids recorded since the last write."""
+        if self._update_window_dirty:
+            self._update_window_dirty = not self._save_json(PROCESSED_UPDATES_FILE, self.update_window.to_dict())
+    
+    def save_broadcast(self, broadcast_id: str, broadcast: dict) -> bool:
+        """Checkpoint the progress of a broadcast."""
+        self.broadcasts[broadcast_id] = broadcast
+        return self._save_json(BROADCASTS_FILE, self.broadcasts)
+    
+    def finish_broadcast(self, broadcast_id: str) -> bool:
+        """Forget a broadcast that has been fully delivered."""
+        self.broadcasts.pop(broadcast_id, None)
+        return self._save_json(BROADCASTS_FILE, self.broadcasts)
+    
+    def search_applications(self, text: str, team_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get all applications whose answers contain the given text."""
+        matches = []
+        for application in self._iter_applications(team_ids):
+            body = self.get_application_body(application)
+            if any(text in body.get(field, '') for field in APPLICATION_BODY_FIELDS):
+                matches.append(self.get_full_application(application, body))
+        for application in self.archive.iter_applications(team_ids):
+            if any(text in application.get(field, '') for field in APPLICATION_BODY_FIELDS):
+                matches.append(application)
+        return matches
+    
+    def archive_applications(self, cutoff: datetime, team_ids: Optional[List[str]] = None,
+                             label: str = '') -> int:
+        """Move decided applications submitted before ``cutoff`` into an archive segment.
+        
+        Pending applications stay in place until they are decided. Archived
+        users are free to apply to the team again. Returns the number of
+        archived applications.
+        """
+        archived = []
+        kept_by_team: Dict[str, List[dict]] = {}
+        for team_id, shard in self.shards.items():
+            if team_ids is not None and team_id not in team_ids:
+                continue
+            kept = []
+            for application in shard.applications:
+                try:
+                    old = datetime.fromisoformat(application['timestamp']) < cutoff
+                except (KeyError, ValueError):
+                    old = False
+                if old and application.get('status', STATUS_PENDING) != STATUS_PENDING:
+                    archived.append(self.get_full_application(application))
+                else:
+                    kept.append(application)
+            if len(kept) < len(shard.applications):
+                kept_by_team[team_id] = kept
+        
+        if not archived:
+            return 0
+        
+        # The segment is durable before anything leaves the shards
         try:
-            # Clear applications and users data
-            self.applications = []
-            self.users = {}
-            
-            # Save empty data to files
-            self._save_json(APPLICATIONS_FILE, self.applications)
-            self._save_json(USERS_FILE, self.users)
-            
-            return True
+            self.archive.add_segment(archived, label)
+        except Exception as e:
+            logger.error(f"Failed to write archive segment: {e}")
+            return 0
+        
+        for team_id, kept in kept_by_team.items():
+            shard = self.shards[team_id]
+            shard.replace(kept)
+            if not self._save_shard(shard):
+                logger.error(f"Archived applications of {team_id} are still in {shard.filename}")
+        
+        # Archived applications are decided, so only the duplicate index has them
+        for application in archived:
+            self.duplicates.remove((application['selected_team'], application['user_info']['user_id']))
+        logger.info(f"Archived {len(archived)} applications older than {cutoff.isoformat()}")
+        return len(archived)
+    
+    def get_epoch(self, team_id: str) -> int:
+        """Get the current recruitment round of a team."""
+        return self.stats.get('epochs', {}).get(team_id, 1)
+    
+    def clear_applications(self, team_ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """Start a new recruitment round for the given teams (all by default).
+        
+        Only the round counters are written, so users can apply again right
+        away; the finished rounds are archived later by purge_retired_round.
+        Returns the new round of each cleared team, or an empty dict on errors.
+        """
+        cleared_teams = [
+            team_id for team_id in self.shards
+            if team_ids is None or team_id in team_ids
+        ]
+        epochs = self.stats.setdefault('epochs', {})
+        previous_epochs = dict(epochs)
+        for team_id in cleared_teams:
+            epochs[team_id] = self.get_epoch(team_id) + 1
+        
+        # Applications on disk are told apart by their round from now on
+        if not self._save_json(STATS_FILE, self.stats):
+            self.stats['epochs'] = previous_epochs
+            return {}
+        
+        for team_id in cleared_teams:
+            retired = self.shards[team_id].replace([])
+            if retired:
+                self.retired.append((team_id, epochs[team_id] - 1, retired))
+            self.rolling_stats.teams.pop(team_id, None)
+            self.funnel.reset(team_id)
+            # Only the cleared teams' entries leave the indexes
+            for application in retired:
+                self.duplicates.remove((team_id, application['user_info']['user_id']))
+            self.unanswered.remove_team(team_id)
+        self._counters_dirty = True
+        
+        return {team_id: epochs[team_id] for team_id in cleared_teams}
+    
+    def purge_retired_round(self) -> bool:
+        """Archive the oldest finished round and drop it from its shard file.
+        
+        Returns True while more rounds are waiting.
+        """
+        if not self.retired:
+            return False
+        
+        team_id, epoch, applications = self.retired[0]
+        try:
+            self.archive.add_segment(
+                [self.get_full_application(application) for application in applications],
+                f"{team_id}#{epoch}"
+            )
         except Exception as e:
-            logger.error(f"Failed to clear applications: {e}")
+            logger.error(f"Failed to archive round {epoch} of {team_id}: {e}")
             return False
+        
+        self.retired.pop(0)
+        self._save_shard(self._shard(team_id))
+        logger.info(f"Archived {len(applications)} applications of round {epoch} of {team_id}")
+        return bool(self.retired)
+    
+    def restore_round(self, team_id: str, epoch: int) -> int:
+        """Make an earlier round of a team current again.
+        
+        The round comes from the archive, or straight from the finished rounds
+        if it isn't archived yet. The current round is finished in its place
+        and archived later by purge_retired_round. Returns the number of
+        restored applications.
+        """
+        label = f"{team_id}#{epoch}"
+        retired_index = next((
+            index for index, (retired_team_id, retired_epoch, _) in enumerate(self.retired)
+            if retired_team_id == team_id and retired_epoch == epoch
+        ), None)
+        if retired_index is None and not any(segment['label'] == label for segment in self.archive.index['segments']):
+            return 0
+        if not self.clear_applications([team_id]):
+            return 0
+        
+        new_epoch = self.get_epoch(team_id)
+        shard = self._shard(team_id)
+        if retired_index is not None:
+            applications = self.retired.pop(retired_index)[2]
+        else:
+            applications = list(self.archive.iter_applications([team_id], label))
+        for application in applications:
+            application['epoch'] = new_epoch
+            self._index_application(team_id, application)
+            if shard.record_store is not None and 'body_offset' not in application:
+                self._detach_body(shard, application)
+            self.rolling_stats.add(team_id, self._submitted(application))
+        shard.replace(applications)
+        self._counters_dirty = True
+        
+        # The round is in the shard before it leaves the archive, so a crash can't lose it
+        self._save_shard(shard)
+        if retired_index is None:
+            self.archive.remove_segments(label)
+        return len(applications)
+    
+    def export_partitions(self, directories: List[str], partition) -> None:
+        """Write the data split by applicant into one directory per partition.
+        
+        ``partition`` maps a user id to the index of its directory. Counters
+        that can't be split by applicant (trends, funnel and response times)
+        go to the first directory; every directory gets the round numbers and
+        the processed update ids. Unfinished broadcasts stay here, where the
+        receiver sends them.
+        """
+        self.flush_statistics()
+        parts: List[Dict[str, List[dict]]] = [{} for _ in directories]
+        for team_id, shard in self.shards.items():
+            for application in self._retired_applications(team_id) + shard.applications:
+                index = partition(application['user_info']['user_id'])
+                parts[index].setdefault(team_id, []).append(self.get_full_application(application))
+        
+        archive_labels = list(dict.fromkeys(segment['label'] for segment in self.archive.index['segments']))
+        
+        for index, directory in enumerate(directories):
+            os.makedirs(directory, exist_ok=True)
+            for team_id, applications in parts[index].items():
+                self._save_json(os.path.join(directory, APPLICATION_SHARD_FILE.format(team_id=team_id)), applications)
+            self._save_json(os.path.join(directory, USERS_FILE), {
+                user_id: user for user_id, user in self.users.items() if partition(int(user_id)) == index
+            })
+            if index == 0:
+                stats = self.stats
+            else:
+                # An empty trend keeps the worker from rebuilding it from its applications
+                stats = {'epochs': self.stats.get('epochs', {}), 'rolling': {}}
+            self._save_json(os.path.join(directory, STATS_FILE), stats)
+            self._save_json(os.path.join(directory, PROCESSED_UPDATES_FILE), self.update_window.to_dict())
+            
+            archive = ArchiveStore(os.path.join(directory, ARCHIVE_DIR))
+            for label in archive_labels:
+                applications = [
+                    application for application in self.archive.iter_applications(label=label)
+                    if partition(application['user_info']['user_id']) == index
+                ]
+                if applications:
+                    archive.add_segment(applications, label)
+        
+        logger.info(f"Split the data of {len(self.users)} users into {len(directories)} partitions")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+from telegram.error import Forbidden, BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Space out calls so no more than ``rate`` start per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every sender, e.g. after Telegram asked us to slow down."""
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+async def deliver(
+    items: Iterable[Any],
+    send: Callable[[Any], Awaitable[None]],
+    concurrency: int,
+    rate: float,
+    on_result: Optional[Callable[[Any, bool], Awaitable[None]]] = None,
+    max_retries: int = 3
+) -> Dict[str, float]:
+    """Run ``send`` for every item with bounded concurrency and a global rate.
+
+    Flood-control errors pause all senders and retry the item; users who
+    blocked the bot or can't be messaged count as failed without retries.
+    Returns delivered/failed counts, elapsed seconds and throughput.
+    """
+    limiter = RateLimiter(rate)
+    counts = {'delivered': 0, 'failed': 0}
+    started = time.monotonic()
+    pending = iter(items)
+
+    async def send_one(item: Any) -> bool:
+        for attempt in range(max_retries + 1):
+            await limiter.acquire()
+            try:
+                await send(item)
+                return True
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if hasattr(retry_after, 'total_seconds'):
+                    retry_after = retry_after.total_seconds()
+                logger.warning(f"Flood limit hit, pausing senders for {retry_after}s")
+                limiter.pause(retry_after)
+            except (Forbidden, BadRequest) as e:
+                logger.info(f"Cannot deliver to {item}: {e}", extra={'category': "delivery"})
+                return False
+            except Exception as e:
+                logger.error(f"Failed to deliver to {item} (attempt {attempt + 1}): {e}")
+        return False
+
+    async def worker() -> None:
+        # Workers share one iterator, so at most ``concurrency`` sends are in flight
+        for item in pending:
+            delivered = await send_one(item)
+            counts['delivered' if delivered else 'failed'] += 1
+            if on_result is not None:
+                await on_result(item, delivered)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    elapsed = time.monotonic() - started
+    total = counts['delivered'] + counts['failed']
+    return {
+        'delivered': counts['delivered'],
+        'failed': counts['failed'],
+        'elapsed': elapsed,
+        'throughput': total / elapsed if elapsed > 0 else 0.0
+    }
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Results of InboundLimiter.check
+ALLOWED = 0
+THROTTLED_FIRST = 1
+THROTTLED = 2
+
+
+class InboundLimiter:
+    """Token bucket per user for incoming messages.
+
+    Buckets are kept in least-recently-seen order. A bucket that has been idle
+    long enough to refill completely is identical to a fresh one, so it is
+    evicted from the front and memory only holds recently active users.
+    """
+
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.idle_ttl = capacity / refill_rate if refill_rate > 0 else float('inf')
+        # user_id -> [tokens, last_seen, throttled]
+        self._buckets: OrderedDict = OrderedDict()
+        self.throttled_updates = 0
+        self.throttled_streaks = 0
+
+    def _expire(self, now: float) -> None:
+        while self._buckets:
+            user_id, bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < self.idle_ttl:
+                break
+            self._buckets.popitem(last=False)
+
+    def check(self, user_id: int, now: Optional[float] = None) -> int:
+        """Take a token for the user.
+
+        Returns ALLOWED, THROTTLED_FIRST for the first throttled message of a
+        streak (the one worth warning about) or THROTTLED.
+        """
+        now = now if now is not None else time.monotonic()
+        self._expire(now)
+
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = [self.capacity, now, False]
+            self._buckets[user_id] = bucket
+        else:
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_rate)
+            bucket[1] = now
+            self._buckets.move_to_end(user_id)
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return ALLOWED
+
+        self.throttled_updates += 1
+        if bucket[2]:
+            return THROTTLED
+        bucket[2] = True
+        self.throttled_streaks += 1
+        return THROTTLED_FIRST
+
+    def __len__(self) -> int:
+        return len(self._buckets)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+from typing import Dict, Any, Optional
+from rolling_stats import RingCounter
+
+# Steps of an application in order; /start happens before a team is chosen
+FUNNEL_STEPS = ("start", "team", "reason", "experience", "submitted")
+ALL_TEAMS = "*"
+
+
+class Funnel:
+    """Applicants reaching each step per team: daily counts and all-time totals."""
+
+    def __init__(self, days: int, data: Optional[Dict[str, Any]] = None):
+        self.days = days
+        self.daily: Dict[str, Dict[str, RingCounter]] = {}
+        self.totals: Dict[str, Dict[str, int]] = {}
+        for team_id, steps in (data or {}).get('daily', {}).items():
+            self.daily[team_id] = {step: RingCounter(days, 86400, counter) for step, counter in steps.items()}
+        for team_id, steps in (data or {}).get('totals', {}).items():
+            self.totals[team_id] = dict(steps)
+
+    def add(self, step: str, team_id: str = ALL_TEAMS, timestamp: Optional[float] = None) -> None:
+        """Count one applicant reaching a step."""
+        steps = self.daily.setdefault(team_id, {})
+        if step not in steps:
+            steps[step] = RingCounter(self.days, 86400)
+        steps[step].add(timestamp if timestamp is not None else time.time())
+        totals = self.totals.setdefault(team_id, {})
+        totals[step] = totals.get(step, 0) + 1
+
+    def counts(self, team_id: str, days: Optional[int] = None) -> Dict[str, int]:
+        """Get the number of applicants per step over the last days."""
+        steps = self.daily.get(team_id, {})
+        return {step: sum(steps[step].series(length=days)) if step in steps else 0 for step in FUNNEL_STEPS}
+
+    def total_counts(self, team_id: str) -> Dict[str, int]:
+        """Get the number of applicants per step since the team's round started."""
+        totals = self.totals.get(team_id, {})
+        return {step: totals.get(step, 0) for step in FUNNEL_STEPS}
+
+    def reset(self, team_id: str) -> None:
+        self.daily.pop(team_id, None)
+        self.totals.pop(team_id, None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'daily': {
+                team_id: {step: counter.to_dict() for step, counter in steps.items()}
+                for team_id, steps in self.daily.items()
+            },
+            'totals': self.totals
+        }
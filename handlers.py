@@ -1,12 +1,24 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import html
+import time
 import logging
-from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import CallbackContext, ConversationHandler
+from datetime import datetime, timedelta
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, __version_info__ as PTB_VERSION
+from telegram.ext import ApplicationHandlerStop, CallbackContext, ConversationHandler
 from config import *
-from data_manager import DataManager
+import content
+from data_manager import DataManager, STATUS_PENDING, STATUS_ACCEPTED, STATUS_REJECTED
+from conversation_reaper import ConversationReaper
+from delivery import deliver
+from flood_control import InboundLimiter, ALLOWED, THROTTLED_FIRST
+from routing import get_team_admin_group, get_chat_teams, is_admin_chat
+from tracing import tracer, end_update_trace
+from structured_logging import end_update
+from funnel import ALL_TEAMS
+from rolling_stats import histogram_percentile
+from callback_codec import callback_codec, OP_TEAM, OP_ACCEPT, OP_REJECT, OP_END_CHAT
 
 logger = logging.getLogger(__name__)
 
@@ -14,38 +26,50 @@ logger = logging.getLogger(__name__)
 data_manager = DataManager()
 
 # Store mapping of admin messages to original user IDs
-# Format: {admin_message_id: user_id}
+# Format: {(admin_chat_id, admin_message_id): user_id}
 admin_message_to_user = {}
 
 # Store active conversations between users and admins
-# Format: {user_id: {'admin_id': admin_id, 'active': True}}
+# Format: {user_id: {'admin_id': admin_id, 'admin_chat_id': chat_id, 'active': True}}
 active_conversations = {}
 
+# Per-user token buckets for incoming messages
+inbound_limiter = InboundLimiter(FLOOD_BURST, FLOOD_RATE)
+
+# Reminds and expires applicants who stop answering mid-application
+conversation_reaper = ConversationReaper(
+    CONVERSATION_TIMEOUT,
+    CONVERSATION_REMINDER_AFTER,
+    CONVERSATION_SWEEP_INTERVAL
+)
+
+def track_conversation_step(update: Update, context: CallbackContext, step: int) -> None:
+    """Record that the user is now waiting at the given conversation step."""
+    now = time.time()
+    context.user_data['conversation_step'] = step
+    context.user_data['conversation_chat_id'] = update.effective_chat.id
+    context.user_data['last_activity'] = now
+    conversation_reaper.touch(update.effective_user.id, update.effective_chat.id, step, now)
+
+def restore_conversation_tracking(user_data: dict) -> None:
+    """Rebuild the reaper from persisted user_data after a restart."""
+    for user_id, data in user_data.items():
+        if 'conversation_step' in data:
+            conversation_reaper.touch(
+                user_id,
+                data.get('conversation_chat_id', user_id),
+                data['conversation_step'],
+                data.get('last_activity')
+            )
+
 async def start_command(update: Update, context: CallbackContext) -> None:
     """Handle /start command - show welcome message and team selection buttons."""
     user = update.effective_user
-    
-    # Create inline keyboard with team options
-    keyboard = []
-    row = []
-    
-    for team_id, team_name in TEAMS.items():
-        row.append(InlineKeyboardButton(team_name, callback_data=team_id))
-        
-        # Create rows of 2 buttons each
-        if len(row) == 2:
-            keyboard.append(row)
-            row = []
-    
-    # Add remaining button if any
-    if row:
-        keyboard.append(row)
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    data_manager.record_funnel_step('start')
     
     await update.message.reply_text(
-        WELCOME_MESSAGE,
-        reply_markup=reply_markup,
+        content.WELCOME_MESSAGE,
+        reply_markup=content.TEAM_KEYBOARD,
         parse_mode='HTML'
     )
 
@@ -77,16 +101,19 @@ async def team_selection_callback(update: Update, context: CallbackContext) -> i
     await query.answer()
     
     user = update.effective_user
-    team_id = query.data
-    team_name = TEAMS.get(team_id, "غير معروف")
+    _, (team_id,) = callback_codec.decode(query.data)
+    team_name = content.TEAMS.get(team_id, "غير معروف")
     
     # Check if user already applied to this team
     if data_manager.has_user_applied(user.id, team_id):
         await query.edit_message_text(
-            ALREADY_APPLIED.format(team_name=team_name)
+            content.team_text('ALREADY_APPLIED', team_id)
         )
         return ConversationHandler.END
     
+    # Only applications that actually start count in the funnel
+    data_manager.record_funnel_step('team', team_id)
+    
     # Store team selection in context
     context.user_data['selected_team'] = team_id
     context.user_data['team_name'] = team_name
@@ -100,32 +127,38 @@ async def team_selection_callback(update: Update, context: CallbackContext) -> i
     
     # Ask for reason
     await query.edit_message_text(
-        TEAM_SELECTION_MESSAGE.format(team_name=team_name)
+        content.team_text('TEAM_SELECTION_MESSAGE', team_id)
     )
     
+    track_conversation_step(update, context, ASKING_REASON)
+    
     return ASKING_REASON
 
 async def handle_reason_input(update: Update, context: CallbackContext) -> int:
     """Handle user's reason for joining the team."""
     user_reason = update.message.text
-    team_name = context.user_data.get('team_name', 'غير معروف')
     
     # Store reason in context
     context.user_data['reason'] = user_reason
+    data_manager.record_funnel_step('reason', context.user_data.get('selected_team'))
     
     # Ask for experience
     await update.message.reply_text(
-        EXPERIENCE_QUESTION.format(team_name=team_name)
+        content.team_text('EXPERIENCE_QUESTION', context.user_data.get('selected_team'))
     )
     
+    track_conversation_step(update, context, ASKING_EXPERIENCE)
+    
     return ASKING_EXPERIENCE
 
+@tracer.traced("handler.handle_experience_input")
 async def handle_experience_input(update: Update, context: CallbackContext) -> int:
     """Handle user's experience input and complete application."""
     user_experience = update.message.text
     
     # Store experience in context
     context.user_data['experience'] = user_experience
+    data_manager.record_funnel_step('experience', context.user_data['selected_team'])
     
     # Prepare application data
     application_data = {
@@ -145,14 +178,20 @@ async def handle_experience_input(update: Update, context: CallbackContext) -> i
     
     # Confirm to user
     await update.message.reply_text(
-        APPLICATION_SUBMITTED.format(team_name=context.user_data['team_name'])
+        content.team_text('APPLICATION_SUBMITTED', context.user_data['selected_team'])
     )
     
     # Clear context
     context.user_data.clear()
+    conversation_reaper.discard(update.effective_user.id)
     
     return ConversationHandler.END
 
+async def lookup_near_duplicates(application_data: dict) -> list:
+    """Get near-duplicates of a new application; workers of multi-process mode replace this to search every worker."""
+    return data_manager.find_near_duplicates(application_data)
+
+@tracer.traced("handler.send_admin_notification")
 async def send_admin_notification(context: CallbackContext, application_data: dict) -> None:
     """Send application notification to admin group."""
     try:
@@ -184,104 +223,257 @@ async def send_admin_notification(context: CallbackContext, application_data: di
 💬 <b>للرد على المتقدم:</b> رد على هذه الرسالة وسيتم إرسال ردك إليه تلقائياً
 """
         
+        # Flag answers copied from other teams or accounts
+        near_duplicates = await lookup_near_duplicates(application_data)
+        if near_duplicates:
+            notification_text += content.NEAR_DUPLICATE_NOTE
+            for match in near_duplicates[:5]:
+                notification_text += format_duplicate(match['application'], match['similarity'])
+        
         # Create inline keyboard with accept/reject buttons
         keyboard = [
             [
-                InlineKeyboardButton("✅ قبول", callback_data=f"accept_{user_info['user_id']}_{application_data['selected_team']}"),
-                InlineKeyboardButton("❌ رفض", callback_data=f"reject_{user_info['user_id']}_{application_data['selected_team']}")
+                InlineKeyboardButton("✅ قبول", callback_data=callback_codec.encode(
+                    OP_ACCEPT, user_info['user_id'], application_data['selected_team']
+                )),
+                InlineKeyboardButton("❌ رفض", callback_data=callback_codec.encode(
+                    OP_REJECT, user_info['user_id'], application_data['selected_team']
+                ))
             ]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
+        # Each team's applications go to that team's admin group
+        admin_chat_id = get_team_admin_group(application_data['selected_team'])
         sent_message = await context.bot.send_message(
-            chat_id=ADMIN_GROUP_ID,
+            chat_id=admin_chat_id,
             text=notification_text,
             parse_mode='HTML',
             reply_markup=reply_markup
         )
         
         # Store mapping for reply handling
-        admin_message_to_user[sent_message.message_id] = user_info['user_id']
+        admin_message_to_user[(admin_chat_id, sent_message.message_id)] = user_info['user_id']
         
     except Exception as e:
         logger.error(f"Failed to send admin notification: {e}")
 
-async def stats_command(update: Update, context: CallbackContext) -> None:
-    """Handle /stats command - show application statistics (admin only)."""
-    # Check if message is from admin group
-    if update.effective_chat.id != ADMIN_GROUP_ID:
-        await update.message.reply_text(NO_STATS_PERMISSION)
-        return
-    
-    # Get statistics
-    stats = data_manager.get_statistics()
-    
-    if stats['total_applications'] == 0:
-        await update.message.reply_text(NO_APPLICATIONS_YET)
-        return
-    
-    # Format statistics message
-    stats_text = STATS_HEADER.format(
+def format_duplicate(application: dict, similarity: float = 0.0) -> str:
+    """Format one application of a near-duplicate listing, with its similarity if given."""
+    user_info = application['user_info']
+    template = content.NEAR_DUPLICATE_FORMAT if similarity else content.DUPLICATES_MEMBER_FORMAT
+    return template.format(
+        name=html.escape(f"{user_info['first_name']} {user_info.get('last_name') or ''}".strip()),
+        user_id=user_info['user_id'],
+        team_name=content.TEAMS.get(application['selected_team'], application['selected_team']),
+        similarity=100 * similarity
+    )
+
+def collect_stats(team_ids: list) -> dict:
+    """Gather the numbers shown by /stats for the given teams."""
+    return {
+        'statistics': data_manager.get_statistics(team_ids),
+        'rolling': data_manager.get_rolling_statistics(),
+        'flood': {
+            'throttled_updates': inbound_limiter.throttled_updates,
+            'throttled_streaks': inbound_limiter.throttled_streaks
+        },
+        'abandonment': data_manager.get_abandonment_statistics()
+    }
+
+def format_stats(collected: dict, team_ids: list) -> str:
+    """Format the /stats message from collected numbers."""
+    stats = collected['statistics']
+    stats_text = content.STATS_HEADER.format(
         total_applications=stats['total_applications'],
         total_users=stats['total_users']
     )
     
-    for team_id, team_name in TEAMS.items():
+    for team_id in team_ids:
+        team_name = content.TEAMS[team_id]
         count = stats['team_counts'].get(team_id, 0)
         if count > 0:
-            stats_text += STATS_TEAM_FORMAT.format(
+            stats_text += content.STATS_TEAM_FORMAT.format(
                 team_name=team_name,
                 count=count
             )
     
-    await update.message.reply_text(stats_text)
+    rolling = collected['rolling']
+    if rolling:
+        stats_text += content.STATS_TREND_HEADER.format(days=ROLLING_STATS_DAYS)
+        for team_id in team_ids:
+            if team_id in rolling:
+                stats_text += content.STATS_TREND_FORMAT.format(
+                    team_name=content.TEAMS[team_id],
+                    last_day=rolling[team_id]['last_day'],
+                    series=" · ".join(str(count) for count in rolling[team_id]['daily'])
+                )
+    
+    if collected['flood']['throttled_updates']:
+        stats_text += content.STATS_FLOOD_FORMAT.format(**collected['flood'])
+    
+    abandonment = collected['abandonment']
+    if abandonment['abandoned']:
+        stats_text += content.STATS_ABANDONED_HEADER
+        for step, count in abandonment['abandoned'].items():
+            stats_text += content.STATS_ABANDONED_FORMAT.format(step=step, count=count)
+    
+    return stats_text
+
+async def stats_command(update: Update, context: CallbackContext) -> None:
+    """Handle /stats command - show application statistics (admin only)."""
+    # Check if message is from admin group
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+    
+    # Get statistics of the teams this group manages
+    team_ids = get_chat_teams(update.effective_chat.id)
+    collected = collect_stats(team_ids)
+    
+    if collected['statistics']['total_applications'] == 0:
+        await update.message.reply_text(content.NO_APPLICATIONS_YET)
+        return
+    
+    await update.message.reply_text(format_stats(collected, team_ids))
 
 async def clear_applications_command(update: Update, context: CallbackContext) -> None:
-    """Handle /clear command - clear all applications (admin only)."""
+    """Handle /clear command - start a new round for the group's teams (admin only)."""
     # Check if user is admin
-    if update.effective_chat.id != ADMIN_GROUP_ID:
+    if not is_admin_chat(update.effective_chat.id):
         await update.message.reply_text("⚠️ هذا الأمر مخصص للإدارة فقط")
         return
     
-    # Clear applications
-    if data_manager.clear_applications():
-        await update.message.reply_text("""
-🗑️ <b>تم مسح جميع التقديمات بنجاح!</b>
-
-✅ تم مسح جميع التقديمات والبيانات
-✅ يمكن للمستخدمين الآن التقديم مرة أخرى
-✅ تم إعادة تصفير الإحصائيات
+    # Start a new round for the teams this group manages; the old one is archived in the background
+    epochs = data_manager.clear_applications(get_chat_teams(update.effective_chat.id))
+    if epochs:
+        context.job_queue.run_once(purge_retired_rounds, when=0)
+    await reply_clear_report(update, epochs)
 
-📊 <b>للتأكد من المسح، يمكنك استخدام الأمر /stats</b>
-""", parse_mode='HTML')
-    else:
+async def reply_clear_report(update: Update, epochs: dict) -> None:
+    """Reply to /clear with the new round of every cleared team."""
+    if not epochs:
         await update.message.reply_text("❌ حدث خطأ أثناء مسح التقديمات")
+        return
+    await update.message.reply_text(content.CLEAR_REPORT.format(
+        rounds="\n".join(
+            f"• {content.TEAMS.get(team_id, team_id)}: {epoch}" for team_id, epoch in epochs.items()
+        )
+    ), parse_mode='HTML')
+
+async def purge_retired_rounds(context: CallbackContext) -> None:
+    """Job: archive finished rounds one at a time so updates are handled in between."""
+    if data_manager.purge_retired_round():
+        context.job_queue.run_once(purge_retired_rounds, when=0)
+
+async def restore_command(update: Update, context: CallbackContext) -> None:
+    """Handle /restore command - make an archived round of a team current again (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+    
+    team_ids = get_chat_teams(update.effective_chat.id)
+    epochs = {team_id: data_manager.get_epoch(team_id) for team_id in team_ids}
+    team_id, epoch = parse_restore(context.args or [], epochs)
+    if team_id is None:
+        await reply_restore_usage(update, epochs)
+        return
+    
+    count = data_manager.restore_round(team_id, epoch)
+    if count:
+        # The round that was current until now is archived in the background
+        context.job_queue.run_once(purge_retired_rounds, when=0)
+    await reply_restore_report(update, team_id, epoch, count)
+
+def parse_restore(args: list, epochs: dict) -> tuple:
+    """Team id and round of /restore arguments, or (None, 0) unless it's an earlier round of a group's team."""
+    team_id = args[0] if args else None
+    try:
+        epoch = int(args[1]) if len(args) > 1 else 0
+    except ValueError:
+        epoch = 0
+    if team_id not in epochs or not 0 < epoch < epochs[team_id]:
+        return None, 0
+    return team_id, epoch
+
+async def reply_restore_usage(update: Update, epochs: dict) -> None:
+    await update.message.reply_text(
+        content.RESTORE_USAGE.format(team_ids=", ".join(
+            f"{team_id} ({epoch})" for team_id, epoch in epochs.items()
+        )),
+        parse_mode='HTML'
+    )
+
+async def reply_restore_report(update: Update, team_id: str, epoch: int, count: int) -> None:
+    if count == 0:
+        await update.message.reply_text(content.NOTHING_TO_RESTORE)
+        return
+    await update.message.reply_text(content.RESTORE_REPORT.format(
+        count=count,
+        epoch=epoch,
+        team_name=content.TEAMS.get(team_id, team_id)
+    ))
 
 async def cancel_command(update: Update, context: CallbackContext) -> int:
     """Handle /cancel command - cancel current conversation."""
     context.user_data.clear()
-    await update.message.reply_text(CANCEL_MESSAGE)
+    conversation_reaper.discard(update.effective_user.id)
+    await update.message.reply_text(content.CANCEL_MESSAGE)
     return ConversationHandler.END
 
+def relayed_body(message) -> str:
+    """Get the HTML text or caption of a message being relayed."""
+    if message.text:
+        return message.text_html
+    if not message.caption:
+        return ""
+    if len(message.caption) > MAX_RELAYED_CAPTION:
+        return html.escape(message.caption[:MAX_RELAYED_CAPTION]) + "…"
+    return message.caption_html
+
+async def relay_message(message, chat_id: int, text: str) -> list:
+    """Relay a message with ``text`` as its visible body; return the new message ids.
+    
+    Media is copied by file id, so nothing is downloaded or uploaded again.
+    Media that can't carry a caption gets the text as a reply to the copy.
+    """
+    if message.text:
+        sent_message = await message.get_bot().send_message(chat_id=chat_id, text=text, parse_mode='HTML')
+        return [sent_message.message_id]
+    
+    if message.sticker or message.video_note:
+        copied = await message.copy(chat_id=chat_id)
+        sent_message = await message.get_bot().send_message(
+            chat_id=chat_id,
+            text=text,
+            parse_mode='HTML',
+            reply_to_message_id=copied.message_id
+        )
+        return [copied.message_id, sent_message.message_id]
+    
+    copied = await message.copy(chat_id=chat_id, caption=text, parse_mode='HTML')
+    return [copied.message_id]
+
+@tracer.traced("handler.handle_admin_reply")
 async def handle_admin_reply(update: Update, context: CallbackContext) -> None:
     """Handle admin replies to application notifications."""
     # Check if message is from admin group
-    if update.effective_chat.id != ADMIN_GROUP_ID:
+    if not is_admin_chat(update.effective_chat.id):
         return
     
     # Check if this is a reply to a bot message
     if not update.message.reply_to_message:
         return
     
-    replied_message_id = update.message.reply_to_message.message_id
+    replied_message_key = (update.effective_chat.id, update.message.reply_to_message.message_id)
     
     # Check if we have a mapping for this message
-    if replied_message_id not in admin_message_to_user:
+    if replied_message_key not in admin_message_to_user:
         return
     
     try:
         # Get the original user ID
-        user_id = admin_message_to_user[replied_message_id]
+        user_id = admin_message_to_user[replied_message_key]
         
         # Get admin info
         admin_name = update.effective_user.first_name
@@ -294,6 +486,7 @@ async def handle_admin_reply(update: Update, context: CallbackContext) -> None:
         active_conversations[user_id] = {
             'admin_id': admin_id,
             'admin_name': admin_name,
+            'admin_chat_id': update.effective_chat.id,
             'active': True
         }
         
@@ -301,7 +494,7 @@ async def handle_admin_reply(update: Update, context: CallbackContext) -> None:
         reply_text = f"""
 📩 <b>رد من فريق Our Goal:</b>
 
-{update.message.text}
+{relayed_body(update.message)}
 
 ---
 📅 <b>وقت الرد:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
@@ -310,11 +503,10 @@ async def handle_admin_reply(update: Update, context: CallbackContext) -> None:
 """
         
         # Send reply to the original user
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=reply_text,
-            parse_mode='HTML'
-        )
+        await relay_message(update.message, user_id, reply_text)
+        
+        # The first reply answers the user's pending applications to this group's teams
+        data_manager.record_admin_reply(user_id, get_chat_teams(update.effective_chat.id))
         
         # React to the admin message to show it was sent
         await update.message.reply_text("✅ تم إرسال الرد للمتقدم بنجاح")
@@ -323,36 +515,10 @@ async def handle_admin_reply(update: Update, context: CallbackContext) -> None:
         logger.error(f"Failed to send admin reply: {e}")
         await update.message.reply_text("❌ فشل في إرسال الرد للمتقدم")
 
-async def handle_admin_decision(update: Update, context: CallbackContext) -> None:
-    """Handle admin accept/reject button clicks."""
-    query = update.callback_query
-    await query.answer()
-    
-    # Check if message is from admin group
-    if query.message.chat.id != ADMIN_GROUP_ID:
-        await query.answer("هذا الأمر مخصص للإدارة فقط", show_alert=True)
-        return
-    
-    # Parse callback data
-    callback_data = query.data
-    if not (callback_data.startswith("accept_") or callback_data.startswith("reject_")):
-        return
-    
-    try:
-        parts = callback_data.split("_")
-        decision = parts[0]  # "accept" or "reject"
-        user_id = int(parts[1])
-        team_id = parts[2]
-        team_name = TEAMS.get(team_id, "غير معروف")
-        
-        # Get admin info
-        admin_name = query.from_user.first_name
-        if query.from_user.last_name:
-            admin_name += f" {query.from_user.last_name}"
-        
-        # Prepare message based on decision
-        if decision == "accept":
-            user_message = f"""
+def build_decision_message(decision: str, team_name: str, admin_name: str) -> str:
+    """Build the message sent to an applicant after an accept/reject decision."""
+    if decision == "accept":
+        return f"""
 🎉 <b>تهانينا! تم قبول طلبك</b>
 
 مرحباً بك في {team_name}! 🎯
@@ -367,9 +533,7 @@ async def handle_admin_decision(update: Update, context: CallbackContext) -> Non
 ✅ <b>تم الموافقة بواسطة:</b> {admin_name}
 📅 <b>تاريخ القبول:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 """
-            admin_confirmation = f"✅ تم قبول المتقدم وإرسال رسالة التهنئة"
-        else:
-            user_message = f"""
+    return f"""
 📝 <b>شكراً لك على اهتمامك</b>
 
 نشكرك على تقديمك للانضمام لـ {team_name}.
@@ -384,14 +548,59 @@ async def handle_admin_decision(update: Update, context: CallbackContext) -> Non
 ❌ <b>تم الرفض بواسطة:</b> {admin_name}
 📅 <b>تاريخ الرد:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 """
+
+@tracer.traced("handler.handle_admin_decision")
+async def handle_admin_decision(update: Update, context: CallbackContext) -> None:
+    """Handle admin accept/reject button clicks."""
+    query = update.callback_query
+    await query.answer()
+    
+    # Check if message is from admin group
+    if not is_admin_chat(query.message.chat.id):
+        await query.answer("هذا الأمر مخصص للإدارة فقط", show_alert=True)
+        return
+    
+    # Parse callback data
+    decoded = callback_codec.decode(query.data)
+    if decoded is None or decoded[0] not in (OP_ACCEPT, OP_REJECT):
+        return
+    
+    try:
+        op, (user_id, team_id) = decoded
+        if team_id not in get_chat_teams(query.message.chat.id):
+            return
+        decision = "accept" if op == OP_ACCEPT else "reject"
+        team_name = content.TEAMS.get(team_id, "غير معروف")
+        
+        # Get admin info
+        admin_name = query.from_user.first_name
+        if query.from_user.last_name:
+            admin_name += f" {query.from_user.last_name}"
+        
+        # Record the decision first; a repeated or concurrent press finds it
+        # already decided and stops here without messaging the user again
+        status = STATUS_ACCEPTED if decision == "accept" else STATUS_REJECTED
+        if not data_manager.set_application_status(user_id, team_id, STATUS_PENDING, status, decided_by=admin_name):
+            logger.info(f"Ignoring repeated decision for {user_id} in {team_id}")
+            return
+        
+        # Prepare message based on decision
+        user_message = build_decision_message(decision, team_name, admin_name)
+        if decision == "accept":
+            admin_confirmation = f"✅ تم قبول المتقدم وإرسال رسالة التهنئة"
+        else:
             admin_confirmation = f"❌ تم رفض المتقدم وإرسال رسالة مهذبة"
         
-        # Send message to user
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=user_message,
-            parse_mode='HTML'
-        )
+        # Send message to user; if that fails the decision is undone so it can be made again
+        try:
+            await context.bot.send_message(
+                chat_id=user_id,
+                text=user_message,
+                parse_mode='HTML'
+            )
+        except Exception:
+            data_manager.reopen_application(user_id, team_id, status)
+            raise
         
         # Update admin message to show decision was made
         original_text = query.message.text
@@ -406,6 +615,7 @@ async def handle_admin_decision(update: Update, context: CallbackContext) -> Non
         logger.error(f"Failed to handle admin decision: {e}")
         await query.answer("حدث خطأ في معالجة القرار", show_alert=True)
 
+@tracer.traced("handler.handle_user_reply")
 async def handle_user_reply(update: Update, context: CallbackContext) -> None:
     """Handle user replies in active conversations."""
     user_id = update.effective_user.id
@@ -429,7 +639,7 @@ async def handle_user_reply(update: Update, context: CallbackContext) -> None:
         admin_message = f"""
 💬 <b>رد من المتقدم:</b>
 
-{update.message.text}
+{relayed_body(update.message)}
 
 ---
 👤 <b>من:</b> {user_name} {username_text}
@@ -439,15 +649,13 @@ async def handle_user_reply(update: Update, context: CallbackContext) -> None:
         
         # No end conversation button needed - admin can just accept/reject
         
-        # Send to admin group
-        sent_message = await context.bot.send_message(
-            chat_id=ADMIN_GROUP_ID,
-            text=admin_message,
-            parse_mode='HTML'
-        )
+        # Send to the admin group the conversation started from
+        admin_chat_id = conversation.get('admin_chat_id', ADMIN_GROUP_ID)
+        sent_message_ids = await relay_message(update.message, admin_chat_id, admin_message)
         
-        # Store mapping for potential replies
-        admin_message_to_user[sent_message.message_id] = user_id
+        # Store mapping for potential replies, to the media and to its info text
+        for message_id in sent_message_ids:
+            admin_message_to_user[(admin_chat_id, message_id)] = user_id
         
         # Confirm to user
         await update.message.reply_text("✅ تم إرسال رسالتك للإدارة")
@@ -462,16 +670,17 @@ async def handle_end_conversation(update: Update, context: CallbackContext) -> N
     await query.answer()
     
     # Check if message is from admin group
-    if query.message.chat.id != ADMIN_GROUP_ID:
+    if not is_admin_chat(query.message.chat.id):
         await query.answer("هذا الأمر مخصص للإدارة فقط", show_alert=True)
         return
     
     # Parse callback data
-    if not query.data.startswith("end_chat_"):
+    decoded = callback_codec.decode(query.data)
+    if decoded is None or decoded[0] != OP_END_CHAT:
         return
     
     try:
-        user_id = int(query.data.split("_")[2])
+        _, (user_id,) = decoded
         
         # End the conversation
         if user_id in active_conversations:
@@ -517,4 +726,586 @@ async def handle_unknown_message(update: Update, context: CallbackContext) -> No
     if user_id in active_conversations and active_conversations[user_id]['active']:
         await handle_user_reply(update, context)
     else:
-        await update.message.reply_text(UNKNOWN_MESSAGE)
+        await update.message.reply_text(content.UNKNOWN_MESSAGE)
+
+# PTB versions whose ConversationHandler._update_state is known to drop a conversation
+# by its key (see end_conversation)
+SWEEP_PTB_VERSIONS = ((20, 0), (22, 99))
+
+def end_conversation(conversation_handler: ConversationHandler, chat_id: int, user_id: int) -> bool:
+    """End a user's conversation outside of an update; returns False if it can't be done.
+    
+    ConversationHandler has no public way to end a conversation from a job:
+    conversation_timeout only ends idle ones on its own per-user timers, which
+    don't survive restarts. So this uses the private _update_state, and only
+    on the PTB versions it was checked against, since it may change in any
+    release. The persisted conversations are updated with it.
+    """
+    if not SWEEP_PTB_VERSIONS[0] <= PTB_VERSION[:2] <= SWEEP_PTB_VERSIONS[1]:
+        logger.error(f"Can't end conversations on python-telegram-bot {PTB_VERSION}; "
+                     f"check ConversationHandler._update_state and SWEEP_PTB_VERSIONS")
+        return False
+    conversation_handler._update_state(ConversationHandler.END, (chat_id, user_id))
+    return True
+
+async def sweep_abandoned_conversations(context: CallbackContext) -> None:
+    """Job: remind inactive applicants and end conversations that timed out."""
+    conversation_handler = context.job.data
+    reminders, expired = conversation_reaper.collect_due()
+    
+    for entry in reminders:
+        user_data = context.application.user_data.get(entry['user_id'], {})
+        try:
+            await context.bot.send_message(
+                chat_id=entry['chat_id'],
+                text=content.CONVERSATION_REMINDER_MESSAGE.format(team_name=user_data.get('team_name', 'التيم'))
+            )
+            data_manager.record_reminder()
+        except Exception as e:
+            logger.error(f"Failed to send reminder to {entry['user_id']}: {e}")
+    
+    for entry in expired:
+        user_id = entry['user_id']
+        team_name = context.application.user_data.get(user_id, {}).get('team_name', 'التيم')
+        
+        # Free the conversation state and the half-filled application
+        if not end_conversation(conversation_handler, entry['chat_id'], user_id):
+            continue
+        context.application.drop_user_data(user_id)
+        data_manager.record_abandonment(CONVERSATION_STEP_NAMES.get(entry['step'], str(entry['step'])))
+        
+        try:
+            await context.bot.send_message(
+                chat_id=entry['chat_id'],
+                text=content.CONVERSATION_EXPIRED_MESSAGE.format(team_name=team_name)
+            )
+        except Exception as e:
+            logger.error(f"Failed to notify {user_id} about expired conversation: {e}")
+    
+    if expired:
+        logger.info(f"Expired {len(expired)} abandoned conversations, {len(conversation_reaper)} still open")
+
+async def broadcast_command(update: Update, context: CallbackContext) -> None:
+    """Handle /broadcast command - message every applicant of a team (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+    
+    team_ids = get_chat_teams(update.effective_chat.id)
+    team_id, text = parse_broadcast(update, team_ids)
+    if team_id is None:
+        await update.message.reply_text(
+            content.BROADCAST_USAGE.format(team_ids=", ".join(team_ids)),
+            parse_mode='HTML'
+        )
+        return
+    
+    await start_broadcast(update, context, team_id, text, data_manager.get_team_user_ids(team_id))
+
+def parse_broadcast(update: Update, team_ids: list) -> tuple:
+    """Team id and text of a /broadcast command, or (None, None) if either is missing."""
+    # Text follows the team id, or comes from the message being replied to
+    parts = update.message.text.split(maxsplit=2)
+    team_id = parts[1] if len(parts) > 1 else None
+    text = parts[2] if len(parts) > 2 else None
+    if text is None and update.message.reply_to_message:
+        text = update.message.reply_to_message.text
+    if team_id not in team_ids or not text:
+        return None, None
+    return team_id, text
+
+async def start_broadcast(update: Update, context: CallbackContext, team_id: str, text: str,
+                          recipients: list) -> None:
+    """Save a broadcast to the team's applicants and start delivering it in the background."""
+    if not recipients:
+        await update.message.reply_text(content.NO_APPLICATIONS_YET)
+        return
+    
+    broadcast_id = f"{update.effective_chat.id}_{update.message.message_id}"
+    data_manager.save_broadcast(broadcast_id, {
+        'team_id': team_id,
+        'text': text,
+        'admin_chat_id': update.effective_chat.id,
+        'recipients': recipients,
+        'done': [],
+        'delivered': 0,
+        'failed': 0,
+        'elapsed': 0.0
+    })
+    
+    await update.message.reply_text(
+        content.BROADCAST_STARTED.format(count=len(recipients), team_name=content.TEAMS[team_id])
+    )
+    context.application.create_task(run_broadcast(context.bot, broadcast_id))
+
+async def run_broadcast(bot, broadcast_id: str) -> None:
+    """Deliver a broadcast, checkpointing progress so a restart can resume it."""
+    broadcast = data_manager.broadcasts[broadcast_id]
+    team_name = content.TEAMS.get(broadcast['team_id'], broadcast['team_id'])
+    done = set(broadcast['done'])
+    remaining = [user_id for user_id in broadcast['recipients'] if user_id not in done]
+    text = content.BROADCAST_MESSAGE.format(text=html.escape(broadcast['text']))
+    since_checkpoint = 0
+    # Time spent by earlier runs, so throughput after a resume covers every recipient
+    previous_elapsed = broadcast['elapsed']
+    started = time.monotonic()
+    
+    async def send(user_id: int) -> None:
+        await bot.send_message(chat_id=user_id, text=text, parse_mode='HTML')
+    
+    async def on_result(user_id: int, delivered: bool) -> None:
+        nonlocal since_checkpoint
+        broadcast['done'].append(user_id)
+        broadcast['delivered' if delivered else 'failed'] += 1
+        since_checkpoint += 1
+        if since_checkpoint >= BROADCAST_CHECKPOINT_EVERY:
+            since_checkpoint = 0
+            broadcast['elapsed'] = previous_elapsed + time.monotonic() - started
+            data_manager.save_broadcast(broadcast_id, broadcast)
+    
+    result = await deliver(remaining, send, BROADCAST_CONCURRENCY, BROADCAST_RATE, on_result)
+    
+    broadcast['elapsed'] = previous_elapsed + result['elapsed']
+    data_manager.finish_broadcast(broadcast_id)
+    
+    total = broadcast['delivered'] + broadcast['failed']
+    logger.info(f"Broadcast {broadcast_id} finished: {broadcast['delivered']}/{total} delivered")
+    try:
+        await bot.send_message(
+            chat_id=broadcast['admin_chat_id'],
+            text=content.BROADCAST_REPORT.format(
+                team_name=team_name,
+                delivered=broadcast['delivered'],
+                failed=broadcast['failed'],
+                elapsed=broadcast['elapsed'],
+                throughput=total / broadcast['elapsed'] if broadcast['elapsed'] else 0.0
+            ),
+            parse_mode='HTML'
+        )
+    except Exception as e:
+        logger.error(f"Failed to send broadcast report: {e}")
+
+async def resume_broadcasts(context: CallbackContext) -> None:
+    """Job: resume broadcasts interrupted by a restart."""
+    for broadcast_id, broadcast in list(data_manager.broadcasts.items()):
+        remaining = len(broadcast['recipients']) - len(broadcast['done'])
+        logger.info(f"Resuming broadcast {broadcast_id} with {remaining} recipients left")
+        try:
+            await context.bot.send_message(
+                chat_id=broadcast['admin_chat_id'],
+                text=content.BROADCAST_RESUMED.format(
+                    team_name=content.TEAMS.get(broadcast['team_id'], broadcast['team_id']),
+                    remaining=remaining
+                )
+            )
+        except Exception as e:
+            logger.error(f"Failed to announce resumed broadcast: {e}")
+        context.application.create_task(run_broadcast(context.bot, broadcast_id))
+
+async def bulk_decision_command(update: Update, context: CallbackContext) -> None:
+    """Handle /bulk command - accept or reject pending applications of a team (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+    
+    team_ids = get_chat_teams(update.effective_chat.id)
+    decision, team_id, user_ids = parse_bulk(context.args or [], team_ids)
+    if decision is None:
+        await update.message.reply_text(
+            content.BULK_USAGE.format(team_ids=", ".join(team_ids)),
+            parse_mode='HTML'
+        )
+        return
+    
+    # Record every decision in one write before notifying anyone
+    admin_name = admin_display_name(update.effective_user)
+    decided = data_manager.decide_applications(team_id, decision_status(decision), user_ids, decided_by=admin_name)
+    await start_bulk_notifications(
+        update,
+        context,
+        decision,
+        team_id,
+        [application['user_info']['user_id'] for application in decided],
+        admin_name
+    )
+
+def parse_bulk(args: list, team_ids: list) -> tuple:
+    """Decision, team id and user ids (None for all) of /bulk arguments, or (None, None, None) if invalid."""
+    decision = args[0] if args else None
+    team_id = args[1] if len(args) > 1 else None
+    try:
+        user_ids = [int(user_id) for user_id in args[2:]] or None
+    except ValueError:
+        user_ids = []
+    if decision not in ("accept", "reject") or team_id not in team_ids or user_ids == []:
+        return None, None, None
+    return decision, team_id, user_ids
+
+def decision_status(decision: str) -> str:
+    return STATUS_ACCEPTED if decision == "accept" else STATUS_REJECTED
+
+def admin_display_name(user) -> str:
+    admin_name = user.first_name
+    if user.last_name:
+        admin_name += f" {user.last_name}"
+    return admin_name
+
+async def start_bulk_notifications(update: Update, context: CallbackContext, decision: str, team_id: str,
+                                   user_ids: list, admin_name: str) -> None:
+    """Reply with a progress message and notify the decided applicants in the background."""
+    if not user_ids:
+        await update.message.reply_text(content.NO_PENDING_APPLICATIONS)
+        return
+    
+    icon = "✅" if decision == "accept" else "❌"
+    team_name = content.TEAMS[team_id]
+    progress_message = await update.message.reply_text(
+        content.BULK_PROGRESS.format(icon=icon, team_name=team_name, done=0, total=len(user_ids))
+    )
+    context.application.create_task(notify_bulk_decision(
+        context.bot,
+        progress_message,
+        user_ids,
+        decision,
+        team_name,
+        admin_name
+    ))
+
+async def notify_bulk_decision(bot, progress_message, user_ids: list, decision: str,
+                               team_name: str, admin_name: str) -> None:
+    """Send decision messages in parallel while editing one progress message."""
+    user_message = build_decision_message(decision, team_name, admin_name)
+    icon = "✅" if decision == "accept" else "❌"
+    done = 0
+    last_edit = time.monotonic()
+    
+    async def send(user_id: int) -> None:
+        await bot.send_message(chat_id=user_id, text=user_message, parse_mode='HTML')
+    
+    async def on_result(user_id: int, delivered: bool) -> None:
+        nonlocal done, last_edit
+        done += 1
+        # Edits are rate limited too, so only refresh the counter periodically
+        if time.monotonic() - last_edit < BULK_PROGRESS_INTERVAL or done == len(user_ids):
+            return
+        last_edit = time.monotonic()
+        try:
+            await progress_message.edit_text(
+                content.BULK_PROGRESS.format(icon=icon, team_name=team_name, done=done, total=len(user_ids))
+            )
+        except Exception as e:
+            logger.warning(f"Failed to update bulk progress: {e}")
+    
+    result = await deliver(user_ids, send, BROADCAST_CONCURRENCY, BROADCAST_RATE, on_result)
+    
+    try:
+        await progress_message.edit_text(
+            content.BULK_REPORT.format(
+                icon=icon,
+                action="قبول" if decision == "accept" else "رفض",
+                total=len(user_ids),
+                team_name=team_name,
+                **result
+            ),
+            parse_mode='HTML'
+        )
+    except Exception as e:
+        logger.error(f"Failed to send bulk decision report: {e}")
+
+def format_pending(pending_counts: dict, team_ids: list) -> str:
+    """Format the /pending message from pending counts per team."""
+    pending_text = content.PENDING_HEADER.format(total_pending=sum(pending_counts.values()))
+    for team_id in team_ids:
+        count = pending_counts.get(team_id, 0)
+        if count > 0:
+            pending_text += content.STATS_TEAM_FORMAT.format(team_name=content.TEAMS[team_id], count=count)
+    return pending_text
+
+async def pending_command(update: Update, context: CallbackContext) -> None:
+    """Handle /pending command - show pending applications per team (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+    
+    team_ids = get_chat_teams(update.effective_chat.id)
+    pending_counts = data_manager.get_pending_counts(team_ids)
+    if sum(pending_counts.values()) == 0:
+        await update.message.reply_text(content.NO_PENDING_APPLICATIONS)
+        return
+    
+    await update.message.reply_text(format_pending(pending_counts, team_ids))
+
+async def archive_command(update: Update, context: CallbackContext) -> None:
+    """Handle /archive command - archive the group's old decided applications (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+    
+    days, label = parse_archive(context.args or [])
+    if days is None:
+        await update.message.reply_text(content.ARCHIVE_USAGE, parse_mode='HTML')
+        return
+    
+    cutoff = datetime.now() - timedelta(days=days)
+    count = data_manager.archive_applications(cutoff, get_chat_teams(update.effective_chat.id), label)
+    await reply_archive_report(update, days, count)
+
+def parse_archive(args: list) -> tuple:
+    """Age in days and segment label of /archive arguments, or (None, '') if invalid."""
+    try:
+        days = int(args[0]) if args else -1
+    except ValueError:
+        days = -1
+    if days < 0:
+        return None, ''
+    return days, " ".join(args[1:])
+
+async def reply_archive_report(update: Update, days: int, count: int) -> None:
+    if count == 0:
+        await update.message.reply_text(content.NOTHING_TO_ARCHIVE)
+        return
+    await update.message.reply_text(content.ARCHIVE_REPORT.format(count=count, days=days))
+
+async def archive_old_applications(context: CallbackContext) -> None:
+    """Job: archive decided applications older than ARCHIVE_AFTER_DAYS."""
+    data_manager.archive_applications(datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS))
+
+async def search_command(update: Update, context: CallbackContext) -> None:
+    """Handle /search command - find the group's applications by their answers (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+    
+    text = " ".join(context.args or [])
+    if not text:
+        await update.message.reply_text(content.SEARCH_USAGE, parse_mode='HTML')
+        return
+    
+    matches = data_manager.search_applications(text, get_chat_teams(update.effective_chat.id))
+    if not matches:
+        await update.message.reply_text(content.NO_SEARCH_RESULTS)
+        return
+    
+    await update.message.reply_text(format_search(matches[:SEARCH_RESULTS_LIMIT], len(matches)))
+
+def format_search(shown: list, total: int) -> str:
+    """Format the /search message from the shown matches out of all of them."""
+    search_text = content.SEARCH_HEADER.format(total=total, shown=len(shown))
+    for application in shown:
+        user_info = application['user_info']
+        search_text += content.SEARCH_RESULT_FORMAT.format(
+            name=f"{user_info['first_name']} {user_info.get('last_name') or ''}".strip(),
+            user_id=user_info['user_id'],
+            team_name=content.TEAMS.get(application['selected_team'], application['selected_team']),
+            status=application.get('status', STATUS_PENDING),
+            reason=application.get('reason', '')[:200]
+        )
+    return search_text
+
+def format_funnel(funnel: dict, team_ids: list) -> str:
+    """Format the /funnel message from applicants per step and team."""
+    funnel_text = content.FUNNEL_HEADER.format(days=ROLLING_STATS_DAYS, **funnel[ALL_TEAMS])
+    for team_id in team_ids:
+        counts = funnel[team_id]
+        if not counts['total_team']:
+            continue
+        funnel_text += content.FUNNEL_TEAM_FORMAT.format(
+            team_name=content.TEAMS[team_id],
+            conversion=100 * counts['submitted'] / counts['team'] if counts['team'] else 0.0,
+            **counts
+        )
+    return funnel_text
+
+async def funnel_command(update: Update, context: CallbackContext) -> None:
+    """Handle /funnel command - show where applicants drop off per team (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+    
+    team_ids = get_chat_teams(update.effective_chat.id)
+    funnel = data_manager.get_funnel_statistics(team_ids)
+    await update.message.reply_text(format_funnel(funnel, team_ids), parse_mode='HTML')
+
+async def duplicates_command(update: Update, context: CallbackContext) -> None:
+    """Handle /duplicates command - list applications with nearly the same answers (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+    
+    groups = data_manager.get_near_duplicate_groups(get_chat_teams(update.effective_chat.id))
+    if not groups:
+        await update.message.reply_text(content.NO_DUPLICATES)
+        return
+    
+    await update.message.reply_text(format_duplicates(groups[:SEARCH_RESULTS_LIMIT], len(groups)), parse_mode='HTML')
+
+def format_duplicates(shown: list, total: int) -> str:
+    """Format the /duplicates message from the shown groups out of all of them."""
+    duplicates_text = content.DUPLICATES_HEADER.format(total=total)
+    for number, group in enumerate(shown, 1):
+        duplicates_text += content.DUPLICATES_GROUP_HEADER.format(number=number)
+        for application in group:
+            duplicates_text += format_duplicate(application)
+    return duplicates_text
+
+def format_sla(histograms: dict, oldest: list, team_ids: list) -> str:
+    """Format the /sla message from first answer histograms and the oldest unanswered applications."""
+    sla_text = content.SLA_HEADER.format(days=ROLLING_STATS_DAYS)
+    for team_id in team_ids:
+        counts = histograms[team_id]
+        if not sum(counts):
+            continue
+        sla_text += content.SLA_TEAM_FORMAT.format(
+            team_name=content.TEAMS[team_id],
+            count=sum(counts),
+            p50_hours=histogram_percentile(counts, 0.5) / 3600,
+            p90_hours=histogram_percentile(counts, 0.9) / 3600
+        )
+    
+    if not oldest:
+        return sla_text + content.NO_UNANSWERED
+    sla_text += content.SLA_OLDEST_HEADER
+    for waiting in oldest:
+        user_info = waiting['user_info']
+        sla_text += content.SLA_OLDEST_FORMAT.format(
+            name=html.escape(f"{user_info['first_name']} {user_info.get('last_name') or ''}".strip()),
+            user_id=user_info['user_id'],
+            team_name=content.TEAMS.get(waiting['selected_team'], waiting['selected_team']),
+            hours=waiting['waiting'] / 3600
+        )
+    return sla_text
+
+def sla_limit(args: list) -> int:
+    """Number of oldest applications asked for by /sla."""
+    try:
+        return max(1, min(int(args[0]), 50)) if args else SLA_OLDEST_LIMIT
+    except ValueError:
+        return SLA_OLDEST_LIMIT
+
+async def sla_command(update: Update, context: CallbackContext) -> None:
+    """Handle /sla command - show first answer times and the oldest unanswered applications (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+    
+    team_ids = get_chat_teams(update.effective_chat.id)
+    sla_text = format_sla(
+        data_manager.get_first_response_histograms(team_ids),
+        data_manager.get_oldest_unanswered(team_ids, sla_limit(context.args or [])),
+        team_ids
+    )
+    await update.message.reply_text(sla_text, parse_mode='HTML')
+
+def format_digest(digest: dict, team_ids: list, days: int) -> str:
+    """Format the digest of an admin group's teams."""
+    period = "اليوم" if days == 1 else f"آخر {days} أيام"
+    digest_text = content.DIGEST_HEADER.format(period=period)
+    for team_id in team_ids:
+        team_digest = digest[team_id]
+        digest_text += content.DIGEST_TEAM_FORMAT.format(
+            team_name=content.TEAMS[team_id],
+            new=team_digest['new'],
+            pending=team_digest['pending'],
+            decided=team_digest['decided'],
+            average_hours=team_digest['average_response'] / 3600,
+            p50_hours=histogram_percentile(team_digest['first_responses'], 0.5) / 3600,
+            p90_hours=histogram_percentile(team_digest['first_responses'], 0.9) / 3600,
+            oldest_hours=team_digest['oldest_unanswered'] / 3600
+        )
+    return digest_text
+
+async def send_digest(context: CallbackContext) -> None:
+    """Job: post the daily or weekly digest of their teams to every admin group."""
+    days = context.job.data
+    for chat_id in ADMIN_CHAT_IDS:
+        if not chat_id:
+            continue
+        team_ids = get_chat_teams(chat_id)
+        digest_text = format_digest(data_manager.get_digest(team_ids, days), team_ids, days)
+        try:
+            await context.bot.send_message(chat_id=chat_id, text=digest_text, parse_mode='HTML')
+        except Exception as e:
+            logger.error(f"Failed to send digest to {chat_id}: {e}")
+
+def is_team_callback(callback_data: str) -> bool:
+    """Match team selection buttons that start an application."""
+    return callback_codec.opcode(callback_data) == OP_TEAM
+
+# Handlers of callback buttons outside the application conversation, by opcode
+CALLBACK_HANDLERS = {
+    OP_ACCEPT: handle_admin_decision,
+    OP_REJECT: handle_admin_decision,
+    OP_END_CHAT: handle_end_conversation
+}
+
+async def dispatch_callback(update: Update, context: CallbackContext) -> None:
+    """Route a callback button press to its handler by opcode."""
+    handler = CALLBACK_HANDLERS.get(callback_codec.opcode(update.callback_query.data))
+    if handler is None:
+        await update.callback_query.answer()
+        return
+    await handler(update, context)
+
+async def reload_content(context: CallbackContext) -> None:
+    """Job: swap in changed teams and message templates from the content file."""
+    content.reload_if_changed()
+
+async def flood_guard(update: Update, context: CallbackContext) -> None:
+    """Drop messages from users who exceed their inbound quota, before any handler runs."""
+    if update.message is None or update.effective_user is None:
+        return
+    if is_admin_chat(update.effective_chat.id):
+        return
+    
+    result = inbound_limiter.check(update.effective_user.id)
+    if result == ALLOWED:
+        return
+    
+    if result == THROTTLED_FIRST:
+        logger.warning(f"Throttling messages from user {update.effective_user.id}", extra={'category': "flood"})
+        if FLOOD_MODE == "warn":
+            try:
+                await update.message.reply_text(content.FLOOD_WARNING)
+            except Exception as e:
+                logger.error(f"Failed to send flood warning: {e}")
+    
+    await stop_update(update, context, "throttled")
+
+async def drop_duplicate_update(update: Update, context: CallbackContext) -> None:
+    """Stop updates that were already handled before a crash or restart."""
+    if data_manager.is_update_processed(update.update_id):
+        logger.info(f"Dropping replayed update {update.update_id}", extra={'category': "dedup"})
+        await stop_update(update, context, "duplicate")
+
+async def stop_update(update: Update, context: CallbackContext, outcome: str) -> None:
+    """Skip the remaining handler groups, finishing the update's log record and trace first.
+    
+    ApplicationHandlerStop also skips end_update and end_update_trace in the
+    last groups, so they run here with the reason the update was stopped.
+    """
+    await end_update(update, context, outcome)
+    await end_update_trace(update, context, outcome)
+    raise ApplicationHandlerStop
+
+async def mark_update_processed(update: Update, context: CallbackContext) -> None:
+    """Record an update as handled once every other handler group has run."""
+    data_manager.mark_update_processed(update.update_id)
+
+async def flush_processed_updates(context: CallbackContext) -> None:
+    """Job: persist rolling and funnel counts and processed update ids that were only recorded in memory."""
+    data_manager.flush_statistics()
+    data_manager.flush_processed_updates()
+
+# Telegram keeps undelivered updates for a day, so an older window can't
+# match anything it still holds (and ids may have restarted since)
+ACKNOWLEDGE_MAX_AGE = 86400
+
+async def acknowledge_processed_updates(bot) -> None:
+    """Confirm already processed updates to Telegram so polling resumes after them."""
+    max_id = data_manager.update_window.max_id
+    if not max_id or time.time() - data_manager.update_window.updated > ACKNOWLEDGE_MAX_AGE:
+        return
+    try:
+        await bot.get_updates(offset=max_id + 1, limit=1, timeout=0)
+    except Exception as e:
+        logger.warning(f"Failed to acknowledge processed updates: {e}")
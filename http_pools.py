@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+from typing import Type
+import httpx
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+
+def build_request(request_class: Type[HTTPXRequest] = HTTPXRequest, pool_size: int = 1,
+                  keepalive: float = 30.0, http_version: str = "1.1", connect_timeout: float = 5.0,
+                  read_timeout: float = 5.0, write_timeout: float = 5.0,
+                  pool_timeout: float = 1.0) -> HTTPXRequest:
+    """Create a Bot API transport with its own connection pool.
+
+    ``keepalive`` is how long idle connections stay open for reuse. HTTP/2
+    needs the optional ``h2`` package (``httpx[http2]``); without it the
+    pool falls back to HTTP/1.1.
+    """
+    if http_version.startswith("2"):
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.error("HTTP/2 needs httpx[http2], falling back to HTTP/1.1")
+            http_version = "1.1"
+
+    return request_class(
+        connection_pool_size=pool_size,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        write_timeout=write_timeout,
+        pool_timeout=pool_timeout,
+        http_version=http_version,
+        httpx_kwargs={
+            'limits': httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=keepalive
+            )
+        }
+    )
@@ -1,12 +1,21 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import os
+import asyncio
 import logging
-from dotenv import load_dotenv
-from telegram import BotCommand, MenuButton, MenuButtonCommands
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, filters
+from datetime import datetime
+from startup import (
+    profiler,
+    setup_fingerprint,
+    load_setup_fingerprint,
+    save_setup_fingerprint,
+    note_first_update
+)
+from telegram import BotCommand, MenuButton, MenuButtonCommands, Update
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, TypeHandler, filters
+profiler.mark("import telegram")
 from handlers import (
+    data_manager,
     start_command,
     menu_command,
     team_selection_callback,
@@ -15,59 +24,207 @@ from handlers import (
     cancel_command,
     stats_command,
     clear_applications_command,
+    purge_retired_rounds,
+    restore_command,
     handle_admin_reply,
-    handle_admin_decision,
-    handle_end_conversation,
-    handle_unknown_message
+    handle_unknown_message,
+    restore_conversation_tracking,
+    sweep_abandoned_conversations,
+    broadcast_command,
+    resume_broadcasts,
+    bulk_decision_command,
+    pending_command,
+    archive_command,
+    archive_old_applications,
+    search_command,
+    funnel_command,
+    duplicates_command,
+    sla_command,
+    send_digest,
+    is_team_callback,
+    dispatch_callback,
+    reload_content,
+    flood_guard,
+    drop_duplicate_update,
+    mark_update_processed,
+    flush_processed_updates,
+    acknowledge_processed_updates
 )
-from config import ASKING_REASON, ASKING_EXPERIENCE, ADMIN_GROUP_ID
-
-# Enable logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", 
-    level=logging.INFO
+profiler.mark("load config and data")
+from persistence import JournalPersistence
+from structured_logging import setup_logging, parse_sampling, begin_update, end_update
+from update_recorder import record_update
+from http_pools import build_request
+from tracing import TracedRequest, TraceContextFilter, begin_update_trace, end_update_trace
+import workers
+from config import (
+    BOT_TOKEN,
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_QUEUE_SIZE,
+    LOG_SAMPLING,
+    BOT_API_POOL_SIZE,
+    BOT_API_KEEPALIVE,
+    BOT_API_HTTP_VERSION,
+    BOT_API_CONNECT_TIMEOUT,
+    BOT_API_READ_TIMEOUT,
+    BOT_API_WRITE_TIMEOUT,
+    BOT_API_POOL_TIMEOUT,
+    GET_UPDATES_POOL_SIZE,
+    GET_UPDATES_KEEPALIVE,
+    GET_UPDATES_HTTP_VERSION,
+    BOT_SETUP_FILE,
+    ASKING_REASON,
+    ASKING_EXPERIENCE,
+    ADMIN_CHAT_IDS,
+    PERSISTENCE_FILE,
+    PERSISTENCE_FLUSH_INTERVAL,
+    CONVERSATION_SWEEP_INTERVAL,
+    CONTENT_POLL_INTERVAL,
+    ARCHIVE_AFTER_DAYS,
+    DIGEST_SCHEDULE,
+    DIGEST_TIME,
+    DIGEST_WEEKDAY,
+    WORKER_PROCESSES,
+    WORKER_DATA_DIR
 )
+
+# Enable logging; records are written by a background thread
+log_handler = setup_logging(LOG_FORMAT, logging.getLevelName(LOG_LEVEL), LOG_QUEUE_SIZE, parse_sampling(LOG_SAMPLING))
+log_handler.addFilter(TraceContextFilter())
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Messages relayed between applicants and admins; media is copied, never re-uploaded
+RELAYED_MESSAGES = (
+    filters.TEXT
+    | filters.PHOTO
+    | filters.Document.ALL
+    | filters.VIDEO
+    | filters.AUDIO
+    | filters.VOICE
+    | filters.VIDEO_NOTE
+    | filters.ANIMATION
+    | filters.Sticker.ALL
+)
 
-def main():
-    """Start the bot."""
-    # Get bot token from environment
-    bot_token = os.getenv("BOT_TOKEN")
-    if not bot_token:
-        logger.error("BOT_TOKEN environment variable is required!")
+# Commands listed in the bot's menu
+BOT_COMMANDS = [
+    BotCommand("start", "بدء استخدام البوت والتقديم للتيمز"),
+    BotCommand("menu", "عرض القائمة الرئيسية والخيارات المتاحة"),
+    BotCommand("cancel", "إلغاء العملية الحالية"),
+    BotCommand("stats", "إحصائيات التقديمات (للإدارة فقط)"),
+    BotCommand("clear", "بدء دورة تقديم جديدة وأرشفة الحالية (للإدارة فقط)"),
+    BotCommand("restore", "استرجاع دورة تقديم سابقة (للإدارة فقط)"),
+    BotCommand("broadcast", "إرسال رسالة لكل المتقدمين لتيم (للإدارة فقط)"),
+    BotCommand("pending", "عدد الطلبات المنتظرة لكل تيم (للإدارة فقط)"),
+    BotCommand("bulk", "قبول أو رفض الطلبات المنتظرة لتيم (للإدارة فقط)"),
+    BotCommand("archive", "أرشفة الطلبات القديمة (للإدارة فقط)"),
+    BotCommand("search", "البحث في الطلبات والأرشيف (للإدارة فقط)"),
+    BotCommand("funnel", "مراحل التقديم ونسب الإكمال (للإدارة فقط)"),
+    BotCommand("duplicates", "الطلبات ذات الإجابات المتشابهة (للإدارة فقط)"),
+    BotCommand("sla", "أقدم الطلبات بدون رد وأزمنة الرد (للإدارة فقط)")
+]
+
+async def set_up_bot_commands(bot) -> None:
+    """Send the commands and menu button to Telegram; they only change on deploys that edit them."""
+    menu_button = MenuButtonCommands()
+    fingerprint = setup_fingerprint(
+        bot.id,
+        [command.to_dict() for command in BOT_COMMANDS],
+        menu_button.to_dict()
+    )
+    if fingerprint == load_setup_fingerprint(BOT_SETUP_FILE):
+        logger.info("Bot commands and menu button unchanged, skipping setup")
         return
+    await asyncio.gather(
+        bot.set_my_commands(BOT_COMMANDS),
+        bot.set_chat_menu_button(menu_button=menu_button)
+    )
+    save_setup_fingerprint(BOT_SETUP_FILE, fingerprint)
+
+def build_bot_api_request():
+    """Transport of outgoing Bot API calls, recorded as spans of the update that made them."""
+    return build_request(
+        TracedRequest,
+        pool_size=BOT_API_POOL_SIZE,
+        keepalive=BOT_API_KEEPALIVE,
+        http_version=BOT_API_HTTP_VERSION,
+        connect_timeout=BOT_API_CONNECT_TIMEOUT,
+        read_timeout=BOT_API_READ_TIMEOUT,
+        write_timeout=BOT_API_WRITE_TIMEOUT,
+        pool_timeout=BOT_API_POOL_TIMEOUT
+    )
+
+def build_get_updates_request():
+    """Transport of long polling, in its own pool so it never competes with sends."""
+    return build_request(
+        pool_size=GET_UPDATES_POOL_SIZE,
+        keepalive=GET_UPDATES_KEEPALIVE,
+        http_version=GET_UPDATES_HTTP_VERSION,
+        connect_timeout=BOT_API_CONNECT_TIMEOUT,
+        write_timeout=BOT_API_WRITE_TIMEOUT,
+        pool_timeout=BOT_API_POOL_TIMEOUT
+    )
+
+def schedule_digest(job_queue, callback) -> None:
+    """Post the digest to the admin groups as configured by DIGEST_SCHEDULE."""
+    digest_time = datetime.strptime(DIGEST_TIME, "%H:%M").time().replace(tzinfo=datetime.now().astimezone().tzinfo)
+    if DIGEST_SCHEDULE == "daily":
+        job_queue.run_daily(callback, digest_time, data=1)
+    elif DIGEST_SCHEDULE == "weekly":
+        job_queue.run_daily(callback, digest_time, days=(DIGEST_WEEKDAY,), data=7)
+
+def create_application(bot_token: str, request=None, get_updates_request=None, worker: bool = False) -> Application:
+    """Build the application with all handlers and jobs registered.
+    
+    ``request`` and ``get_updates_request`` replace the Bot API transports,
+    e.g. with a stand-in for replays. A ``worker`` of multi-process mode
+    leaves polling, the bot's commands and the digest to the receiver.
+    """
+    # Keep in-progress applications across restarts
+    persistence = JournalPersistence(PERSISTENCE_FILE, update_interval=PERSISTENCE_FLUSH_INTERVAL)
+    profiler.mark("load conversations")
     
     # Create application
-    application = Application.builder().token(bot_token).build()
+    application = (
+        Application.builder()
+        .token(bot_token)
+        .persistence(persistence)
+        .request(request or build_bot_api_request())
+        .get_updates_request(get_updates_request or build_get_updates_request())
+        .build()
+    )
+    profiler.mark("build application")
     
     # Set up menu button and commands after bot initialization
     async def post_init(application):
         """Setup bot commands and menu button after bot is ready."""
-        commands = [
-            BotCommand("start", "بدء استخدام البوت والتقديم للتيمز"),
-            BotCommand("menu", "عرض القائمة الرئيسية والخيارات المتاحة"),
-            BotCommand("cancel", "إلغاء العملية الحالية"),
-            BotCommand("stats", "إحصائيات التقديمات (للإدارة فقط)"),
-            BotCommand("clear", "مسح جميع التقديمات (للإدارة فقط)")
-        ]
+        # Everything since the last mark is application.initialize() (getMe, persistence)
+        profiler.mark("initialize")
         
-        # Set commands
-        await application.bot.set_my_commands(commands)
+        if not worker:
+            await asyncio.gather(
+                acknowledge_processed_updates(application.bot),
+                set_up_bot_commands(application.bot)
+            )
         
-        # Set menu button
-        menu_button = MenuButtonCommands()
-        await application.bot.set_chat_menu_button(menu_button=menu_button)
+        # Resume timeouts of conversations restored from persistence
+        restore_conversation_tracking(application.user_data)
+        profiler.finish("post_init")
+    
+    async def post_shutdown(application):
+        """Write out state that is only flushed periodically."""
+        data_manager.flush_statistics()
+        data_manager.flush_processed_updates()
     
-    # Set post init callback
+    # Set post init and shutdown callbacks
     application.post_init = post_init
+    application.post_shutdown = post_shutdown
     
     # Define conversation handler for team applications
     conversation_handler = ConversationHandler(
         entry_points=[
-            CallbackQueryHandler(team_selection_callback, pattern="^team_")
+            CallbackQueryHandler(team_selection_callback, pattern=is_team_callback)
         ],
         states={
             ASKING_REASON: [
@@ -81,28 +238,165 @@ def main():
             CommandHandler("cancel", cancel_command),
             CommandHandler("start", start_command)
         ],
-        allow_reentry=True
+        allow_reentry=True,
+        name="applications",
+        persistent=True
     )
     
+    # Sweep abandoned conversations in one periodic job
+    application.job_queue.run_repeating(
+        sweep_abandoned_conversations,
+        interval=CONVERSATION_SWEEP_INTERVAL,
+        data=conversation_handler
+    )
+    
+    # Watch the content file for changed teams and templates
+    application.job_queue.run_repeating(reload_content, interval=CONTENT_POLL_INTERVAL)
+    
+    # Pick up broadcasts that were interrupted by a restart; in multi-process
+    # mode the receiver sends them
+    if not worker:
+        application.job_queue.run_once(resume_broadcasts, when=0)
+    
+    # Finish archiving rounds that were cleared before a restart
+    application.job_queue.run_once(purge_retired_rounds, when=0)
+    
+    # Move old decided applications into the archive once a day
+    if ARCHIVE_AFTER_DAYS > 0:
+        application.job_queue.run_repeating(archive_old_applications, interval=86400, first=60)
+    
+    # Post the digest to the admin groups
+    if not worker:
+        schedule_digest(application.job_queue, send_digest)
+    
+    # Report the time to the first update after a restart, and tag log records
+    # with the update being handled until its latency is logged at the end
+    application.add_handler(TypeHandler(Update, note_first_update), group=-3)
+    application.add_handler(TypeHandler(Update, begin_update), group=-4)
+    application.add_handler(TypeHandler(Update, end_update), group=101)
+    
+    # Record updates exactly as they arrive when RECORD_UPDATES_FILE is set
+    application.add_handler(TypeHandler(Update, record_update), group=-6)
+    
+    # Trace each update from the first handler group to the last
+    application.add_handler(TypeHandler(Update, begin_update_trace), group=-5)
+    application.add_handler(TypeHandler(Update, end_update_trace), group=102)
+    
+    # Drop replayed updates first and record every update once all groups ran
+    application.add_handler(TypeHandler(Update, drop_duplicate_update), group=-2)
+    application.add_handler(TypeHandler(Update, mark_update_processed), group=100)
+    application.job_queue.run_repeating(flush_processed_updates, interval=PERSISTENCE_FLUSH_INTERVAL)
+    
+    # Throttle flooding users before any other handler sees their messages
+    application.add_handler(TypeHandler(Update, flood_guard), group=-1)
+    
     # Add handlers
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("menu", menu_command))
     application.add_handler(CommandHandler("stats", stats_command))
     application.add_handler(CommandHandler("clear", clear_applications_command))
+    application.add_handler(CommandHandler("restore", restore_command))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("pending", pending_command))
+    application.add_handler(CommandHandler("bulk", bulk_decision_command))
+    application.add_handler(CommandHandler("archive", archive_command))
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CommandHandler("funnel", funnel_command))
+    application.add_handler(CommandHandler("duplicates", duplicates_command))
+    application.add_handler(CommandHandler("sla", sla_command))
     application.add_handler(CommandHandler("cancel", cancel_command))
     application.add_handler(conversation_handler)
     
-    # Handle admin decision buttons
-    application.add_handler(CallbackQueryHandler(handle_admin_decision, pattern="^(accept_|reject_)"))
-    
-    # Handle end conversation button
-    application.add_handler(CallbackQueryHandler(handle_end_conversation, pattern="^end_chat_"))
+    # Handle admin decision and end conversation buttons through one opcode lookup
+    application.add_handler(CallbackQueryHandler(dispatch_callback))
     
-    # Handle admin replies (only from admin group)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & filters.Chat(ADMIN_GROUP_ID), handle_admin_reply))
+    # Handle admin replies (only from admin groups)
+    application.add_handler(MessageHandler(RELAYED_MESSAGES & ~filters.COMMAND & filters.Chat(chat_id=ADMIN_CHAT_IDS), handle_admin_reply))
     
     # Handle unknown messages
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_unknown_message))
+    application.add_handler(MessageHandler(RELAYED_MESSAGES & ~filters.COMMAND, handle_unknown_message))
+    
+    return application
+
+def create_receiver(bot_token: str) -> Application:
+    """Build the receiver of multi-process mode, which hands updates to the worker processes."""
+    application = (
+        Application.builder()
+        .token(bot_token)
+        .request(build_bot_api_request())
+        .get_updates_request(build_get_updates_request())
+        .build()
+    )
+    
+    async def post_init(application):
+        """Set up the bot's commands and start the workers."""
+        profiler.mark("initialize")
+        await asyncio.gather(
+            acknowledge_processed_updates(application.bot),
+            set_up_bot_commands(application.bot),
+            workers.worker_pool.start()
+        )
+        profiler.finish("post_init")
+    
+    async def post_shutdown(application):
+        """Stop the workers once polling has stopped."""
+        await workers.worker_pool.stop()
+        data_manager.flush_processed_updates()
+    
+    application.post_init = post_init
+    application.post_shutdown = post_shutdown
+    
+    application.add_handler(TypeHandler(Update, note_first_update), group=-1)
+    
+    # Admin commands that change data run here, so replayed updates are dropped here too
+    application.add_handler(TypeHandler(Update, drop_duplicate_update), group=-2)
+    application.add_handler(TypeHandler(Update, mark_update_processed), group=100)
+    application.job_queue.run_repeating(flush_processed_updates, interval=PERSISTENCE_FLUSH_INTERVAL)
+    
+    # Team ids and templates of the replies follow the content file
+    application.job_queue.run_repeating(reload_content, interval=CONTENT_POLL_INTERVAL)
+    
+    # Admin commands combine the answers of all workers and are answered once; everything else is handled by them
+    application.add_handler(CommandHandler("stats", workers.stats_command))
+    application.add_handler(CommandHandler("pending", workers.pending_command))
+    application.add_handler(CommandHandler("funnel", workers.funnel_command))
+    application.add_handler(CommandHandler("search", workers.search_command))
+    application.add_handler(CommandHandler("duplicates", workers.duplicates_command))
+    application.add_handler(CommandHandler("sla", workers.sla_command))
+    application.add_handler(CommandHandler("clear", workers.clear_command))
+    application.add_handler(CommandHandler("restore", workers.restore_command))
+    application.add_handler(CommandHandler("archive", workers.archive_command))
+    application.add_handler(CommandHandler("bulk", workers.bulk_decision_command))
+    application.add_handler(CommandHandler("broadcast", workers.broadcast_command))
+    application.add_handler(TypeHandler(Update, workers.dispatch_update))
+    
+    # Broadcasts are sent from here at the full rate, with progress in this process's data
+    application.job_queue.run_once(resume_broadcasts, when=0)
+    
+    schedule_digest(application.job_queue, workers.send_digest)
+    return application
+
+def main():
+    """Start the bot."""
+    # Get bot token from environment (loaded once by config)
+    bot_token = BOT_TOKEN
+    if not bot_token:
+        logger.error("BOT_TOKEN environment variable is required!")
+        return
+    
+    # With several worker processes this process only receives updates
+    if WORKER_PROCESSES > 1:
+        if not workers.worker_pool.prepare(data_manager):
+            return
+        application = create_receiver(bot_token)
+    else:
+        # The data here stopped changing when it was split between workers
+        split_count = workers.worker_pool.split_count()
+        if split_count is not None:
+            logger.error(f"The data was split for {split_count} worker processes in {WORKER_DATA_DIR}, "
+                         f"so the data here is out of date; set WORKER_PROCESSES={split_count}")
+            return
+        application = create_application(bot_token)
     
     # Log startup
     logger.info("Bot started successfully!")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import re
+import zlib
+from array import array
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+# Signature length and its split into LSH bands; with 16 bands of 4 rows, pairs
+# about 50% similar or more share a band with high probability
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+SHINGLE_SIZE = 4
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed so signatures stay comparable across restarts
+_rng = random.Random(1729)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+# (team_id, user_id) of an application
+ApplicationKey = Tuple[str, int]
+
+
+def _shingles(text: str) -> Set[int]:
+    """Hashes of the overlapping character n-grams of normalized text."""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    if len(text) < SHINGLE_SIZE:
+        return {zlib.crc32(text.encode('utf-8'))} if text else set()
+    return {
+        zlib.crc32(text[index:index + SHINGLE_SIZE].encode('utf-8'))
+        for index in range(len(text) - SHINGLE_SIZE + 1)
+    }
+
+
+def signature(text: str) -> Optional[List[int]]:
+    """MinHash signature of a text, or None for empty text."""
+    shingles = _shingles(text)
+    if not shingles:
+        return None
+    return [
+        min(((a * shingle + b) % _PRIME) & _MAX_HASH for shingle in shingles)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def encode_signature(values: List[int]) -> str:
+    return "".join(f"{value:08x}" for value in values)
+
+
+def decode_signature(encoded: str) -> array:
+    """Signature packed as 32-bit values, about a tenth of the size of a list of ints."""
+    return array('I', (int(encoded[index:index + 8], 16) for index in range(0, len(encoded), 8)))
+
+
+def similarity(first: Sequence[int], second: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_HASHES
+
+
+class NearDuplicateIndex:
+    """Locality-sensitive hashing index of application signatures.
+
+    A signature is split into bands and every band is a bucket key, so only
+    applications sharing at least one band are compared instead of all pairs.
+    Signatures are kept packed and band keys are short byte strings, since
+    the index holds one of each per current application.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.signatures: Dict[ApplicationKey, array] = {}
+        self.buckets: Dict[bytes, List[ApplicationKey]] = {}
+
+    def _bands(self, values: array):
+        for band in range(BANDS):
+            yield bytes((band,)) + values[band * ROWS:(band + 1) * ROWS].tobytes()
+
+    def add(self, key: ApplicationKey, values: Sequence[int]) -> None:
+        self.remove(key)
+        values = values if isinstance(values, array) else array('I', values)
+        self.signatures[key] = values
+        for band_key in self._bands(values):
+            self.buckets.setdefault(band_key, []).append(key)
+
+    def remove(self, key: ApplicationKey) -> None:
+        values = self.signatures.pop(key, None)
+        if values is None:
+            return
+        for band_key in self._bands(values):
+            bucket = self.buckets.get(band_key)
+            if bucket is not None and key in bucket:
+                bucket.remove(key)
+                if not bucket:
+                    del self.buckets[band_key]
+
+    def query(self, values: Sequence[int], exclude: Optional[ApplicationKey] = None) -> List[Tuple[ApplicationKey, float]]:
+        """Get indexed applications similar to a signature, most similar first."""
+        values = values if isinstance(values, array) else array('I', values)
+        candidates = set()
+        for band_key in self._bands(values):
+            candidates.update(self.buckets.get(band_key, ()))
+        candidates.discard(exclude)
+
+        matches = []
+        for key in candidates:
+            score = similarity(values, self.signatures[key])
+            if score >= self.threshold:
+                matches.append((key, score))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
+
+    def groups(self, team_ids: Optional[List[str]] = None) -> List[List[ApplicationKey]]:
+        """Get groups of near-duplicate applications touching the given teams."""
+        parent: Dict[ApplicationKey, ApplicationKey] = {}
+
+        def find(key: ApplicationKey) -> ApplicationKey:
+            while parent.setdefault(key, key) != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        compared = set()
+        for bucket in self.buckets.values():
+            if len(bucket) < 2:
+                continue
+            members = sorted(bucket)
+            for index, first in enumerate(members):
+                for second in members[index + 1:]:
+                    if (first, second) in compared:
+                        continue
+                    compared.add((first, second))
+                    if similarity(self.signatures[first], self.signatures[second]) >= self.threshold:
+                        parent[find(first)] = find(second)
+
+        grouped: Dict[ApplicationKey, List[ApplicationKey]] = {}
+        for key in parent:
+            grouped.setdefault(find(key), []).append(key)
+        return [
+            sorted(group) for group in grouped.values()
+            if len(group) > 1 and (team_ids is None or any(team_id in team_ids for team_id, _ in group))
+        ]
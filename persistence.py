@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import os
+import logging
+from typing import Dict, Any, Optional, Tuple
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+
+class JournalPersistence(BasePersistence):
+    """Persist ``user_data`` and conversation states in an append-only journal.
+
+    The application hands us only the users and conversations that changed
+    since its last persistence run. Those entries are marked dirty and written
+    as one batch of JSON lines, and the journal is compacted once stale lines
+    outnumber the live entries.
+    """
+
+    def __init__(self, filename: str, update_interval: float = 60, compact_threshold: int = 1000):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.filename = filename
+        self.compact_threshold = compact_threshold
+        self.user_data: Dict[int, dict] = {}
+        self.conversations: Dict[str, Dict[Tuple[int, ...], object]] = {}
+        self._dirty_users = set()
+        self._dirty_conversations = set()
+        self._journal_lines = 0
+        self._write_scheduled = False
+        self._load()
+
+    def _load(self) -> None:
+        """Replay the journal into memory."""
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A crash mid-write can only damage the last line
+                        logger.warning(f"Skipping unreadable line in {self.filename}")
+                        continue
+                    self._journal_lines += 1
+                    self._apply(entry)
+        except Exception as e:
+            logger.error(f"Failed to load {self.filename}: {e}")
+
+    def _apply(self, entry: dict) -> None:
+        """Apply one journal entry to the in-memory state."""
+        if entry['kind'] == 'user_data':
+            if entry['value'] is None:
+                self.user_data.pop(entry['key'], None)
+            else:
+                self.user_data[entry['key']] = entry['value']
+        elif entry['kind'] == 'conversation':
+            states = self.conversations.setdefault(entry['name'], {})
+            key = tuple(entry['key'])
+            if entry['value'] is None:
+                states.pop(key, None)
+            else:
+                states[key] = entry['value']
+
+    def _dirty_entries(self):
+        """Yield journal entries for everything changed since the last write."""
+        for user_id in self._dirty_users:
+            yield {'kind': 'user_data', 'key': user_id, 'value': self.user_data.get(user_id)}
+        for name, key in self._dirty_conversations:
+            yield {
+                'kind': 'conversation',
+                'name': name,
+                'key': list(key),
+                'value': self.conversations.get(name, {}).get(key)
+            }
+
+    def _schedule_write(self) -> None:
+        """Coalesce all updates of one persistence run into a single write."""
+        if self._write_scheduled:
+            return
+        self._write_scheduled = True
+        try:
+            asyncio.get_running_loop().call_soon(self._write_dirty)
+        except RuntimeError:
+            self._write_dirty()
+
+    def _write_dirty(self) -> None:
+        """Append the dirty entries to the journal."""
+        self._write_scheduled = False
+        if not self._dirty_users and not self._dirty_conversations:
+            return
+        try:
+            lines = [json.dumps(entry, ensure_ascii=False) for entry in self._dirty_entries()]
+            with open(self.filename, 'a', encoding='utf-8') as file:
+                file.write('\n'.join(lines) + '\n')
+            self._journal_lines += len(lines)
+            self._dirty_users.clear()
+            self._dirty_conversations.clear()
+        except Exception as e:
+            logger.error(f"Failed to write {self.filename}: {e}")
+            return
+
+        live_entries = len(self.user_data) + sum(len(states) for states in self.conversations.values())
+        if self._journal_lines > max(self.compact_threshold, 2 * live_entries):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the journal so it only holds live entries."""
+        temp_filename = f"{self.filename}.tmp"
+        try:
+            lines = [
+                json.dumps({'kind': 'user_data', 'key': user_id, 'value': data}, ensure_ascii=False)
+                for user_id, data in self.user_data.items()
+            ]
+            for name, states in self.conversations.items():
+                for key, state in states.items():
+                    lines.append(json.dumps({'kind': 'conversation', 'name': name, 'key': list(key), 'value': state}))
+            with open(temp_filename, 'w', encoding='utf-8') as file:
+                file.write(''.join(line + '\n' for line in lines))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_filename, self.filename)
+            self._journal_lines = len(lines)
+        except Exception as e:
+            logger.error(f"Failed to compact {self.filename}: {e}")
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {user_id: dict(data) for user_id, data in self.user_data.items()}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[Tuple[int, ...], object]:
+        return dict(self.conversations.get(name, {}))
+
+    async def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]) -> None:
+        states = self.conversations.setdefault(name, {})
+        if states.get(key) == new_state:
+            return
+        if new_state is None:
+            states.pop(key, None)
+        else:
+            states[key] = new_state
+        self._dirty_conversations.add((name, key))
+        self._schedule_write()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        # Cleared user_data is dropped instead of stored as an empty dict
+        if not data:
+            await self.drop_user_data(user_id)
+            return
+        if self.user_data.get(user_id) == data:
+            return
+        self.user_data[user_id] = data
+        self._dirty_users.add(user_id)
+        self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if user_id not in self.user_data:
+            return
+        del self.user_data[user_id]
+        self._dirty_users.add(user_id)
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        self._write_dirty()
+        self._compact()
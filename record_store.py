@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import mmap
+import os
+import logging
+import struct
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Every record is a 4-byte little-endian length followed by a UTF-8 JSON body
+_HEADER = struct.Struct("<I")
+
+
+class RecordStore:
+    """Append-only data file read back through a memory map.
+
+    Records are addressed by the offset returned from ``append``, so callers
+    only need to keep ``(offset, length)`` pairs in memory.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._file = open(filename, 'a+b')
+        self._map: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+
+    def _remap(self) -> None:
+        """Map the whole file again after it has grown."""
+        size = os.fstat(self._file.fileno()).st_size
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        # mmap refuses to map an empty file
+        if size:
+            self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        self._mapped_size = size
+
+    def append(self, record: Dict[str, Any]) -> Tuple[int, int]:
+        """Append a record and return its ``(offset, length)``."""
+        body = json.dumps(record, ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            self._file.write(_HEADER.pack(len(body)))
+            self._file.write(body)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        return offset, len(body)
+
+    def read(self, offset: int, length: int) -> Dict[str, Any]:
+        """Read the record stored at ``offset``."""
+        end = offset + _HEADER.size + length
+        with self._lock:
+            if end > self._mapped_size:
+                self._remap()
+            if self._map is None or end > self._mapped_size:
+                raise ValueError(f"Record at {offset} is outside {self.filename}")
+            (stored_length,) = _HEADER.unpack_from(self._map, offset)
+            if stored_length != length:
+                raise ValueError(f"Corrupt record header at {offset} in {self.filename}")
+            body = self._map[offset + _HEADER.size:end]
+        return json.loads(body.decode('utf-8'))
+
+    def close(self) -> None:
+        """Release the memory map and the file handle."""
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._file.close()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Replay recorded updates through the bot's handlers against a stand-in Bot API.
+
+Usage: python replay_updates.py updates.jsonl [--speed N] [--workdir DIR]
+
+--speed 1 keeps the recorded gaps between updates, 10 replays ten times
+faster and 0 (the default) sends them back to back. Data files are written
+in a fresh temporary directory unless --workdir is given.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import List, Optional, Tuple
+from telegram.request import BaseRequest, RequestData
+from config import CALLBACK_TABLE_FILE, RECORD_CALLBACK_TABLE_SUFFIX
+
+# Any well-formed token; no request leaves the process
+REPLAY_TOKEN = "123456:replay"
+
+
+class StandInRequest(BaseRequest):
+    """Answer every Bot API call locally with a minimal successful result."""
+
+    def __init__(self):
+        self.calls: dict = {}
+        self._message_id = 0
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _message(self, parameters: dict) -> dict:
+        self._message_id += 1
+        return {
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(parameters.get('chat_id', 0) or 0), 'type': 'private'},
+            'text': parameters.get('text', '')
+        }
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         *args, **kwargs) -> Tuple[int, bytes]:
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        parameters = request_data.parameters if request_data is not None else {}
+
+        if endpoint == 'getMe':
+            result = {'id': int(REPLAY_TOKEN.split(':')[0]), 'is_bot': True, 'first_name': 'Replay', 'username': 'replay_bot'}
+        elif endpoint == 'getUpdates':
+            result = []
+        elif endpoint == 'copyMessage':
+            self._message_id += 1
+            result = {'message_id': self._message_id}
+        elif endpoint.startswith(('send', 'edit', 'forward')):
+            result = self._message(parameters)
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode('utf-8')
+
+
+def load_recording(filename: str) -> List[dict]:
+    with open(filename, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def replay(recording: List[dict], speed: float) -> None:
+    # Imported here so data files are created in the working directory
+    from telegram import Update
+    from main import create_application
+
+    request = StandInRequest()
+    application = create_application(REPLAY_TOKEN, request=request, get_updates_request=request)
+    latencies = []
+
+    async with application:
+        await application.post_init(application)
+        started = time.perf_counter()
+        first_time = recording[0]['time'] if recording else 0
+        for entry in recording:
+            if speed > 0:
+                delay = (entry['time'] - first_time) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            update = Update.de_json(entry['update'], application.bot)
+            update_started = time.perf_counter()
+            await application.process_update(update)
+            latencies.append((time.perf_counter() - update_started) * 1000)
+        elapsed = time.perf_counter() - started
+        await application.update_persistence()
+
+    print(f"Replayed {len(latencies)} updates in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed if elapsed else 0:.1f} updates/s)")
+    print(f"Latency ms: p50 {percentile(latencies, 0.5):.2f}  p95 {percentile(latencies, 0.95):.2f}  "
+          f"max {max(latencies, default=0):.2f}")
+    print("Bot API calls: " + ", ".join(f"{name} {count}" for name, count in sorted(request.calls.items())))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('recording', help="JSONL file written with RECORD_UPDATES_FILE")
+    parser.add_argument('--speed', type=float, default=0, help="replay speed factor, 0 for no delays")
+    parser.add_argument('--workdir', help="directory for the bot's data files")
+    args = parser.parse_args()
+
+    recording_file = os.path.abspath(args.recording)
+    recording = load_recording(recording_file)
+    os.chdir(args.workdir or tempfile.mkdtemp(prefix="replay-"))
+    print(f"Data files in {os.getcwd()}")
+    # Buttons with long data carry tokens of the table written with the recording
+    if os.path.exists(recording_file + RECORD_CALLBACK_TABLE_SUFFIX):
+        shutil.copyfile(recording_file + RECORD_CALLBACK_TABLE_SUFFIX, CALLBACK_TABLE_FILE)
+    asyncio.run(replay(recording, args.speed))
+
+
+if __name__ == "__main__":
+    main()
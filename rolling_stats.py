@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+# Buckets follow local time so days start at local midnight
+_UTC_OFFSET = datetime.now().astimezone().utcoffset().total_seconds()
+
+
+class RingCounter:
+    """Fixed number of time buckets reused in a ring.
+
+    Each slot remembers which bucket it currently counts, so a slot left over
+    from a previous lap of the ring is reset on write and ignored on read.
+    """
+
+    def __init__(self, slots: int, width: int, data: Optional[Dict[str, List[int]]] = None):
+        self.slots = slots
+        self.width = width
+        self.counts = [0] * slots
+        self.buckets = [-1] * slots
+        if data and len(data.get('counts', ())) == slots:
+            self.counts = list(data['counts'])
+            self.buckets = list(data['buckets'])
+
+    def _bucket(self, timestamp: float) -> int:
+        return int((timestamp + _UTC_OFFSET) // self.width)
+
+    def add(self, timestamp: float, amount: int = 1) -> None:
+        bucket = self._bucket(timestamp)
+        slot = bucket % self.slots
+        if self.buckets[slot] != bucket:
+            # Older data than the ring covers is dropped
+            if bucket < self.buckets[slot]:
+                return
+            self.buckets[slot] = bucket
+            self.counts[slot] = 0
+        self.counts[slot] += amount
+
+    def series(self, now: Optional[float] = None, length: Optional[int] = None) -> List[int]:
+        """Counts of the last ``length`` buckets, oldest first, ending with the current one."""
+        current = self._bucket(now if now is not None else time.time())
+        length = min(length or self.slots, self.slots)
+        result = []
+        for bucket in range(current - length + 1, current + 1):
+            slot = bucket % self.slots
+            result.append(self.counts[slot] if self.buckets[slot] == bucket else 0)
+        return result
+
+    def to_dict(self) -> Dict[str, List[int]]:
+        return {'counts': self.counts, 'buckets': self.buckets}
+
+
+class RollingStats:
+    """Hourly and daily application counters per team over the last N days."""
+
+    def __init__(self, days: int, data: Optional[Dict[str, Any]] = None):
+        self.days = days
+        self.teams: Dict[str, Dict[str, RingCounter]] = {}
+        for team_id, counters in (data or {}).items():
+            self.teams[team_id] = {
+                'hourly': RingCounter(days * 24, 3600, counters.get('hourly')),
+                'daily': RingCounter(days, 86400, counters.get('daily'))
+            }
+
+    def _team(self, team_id: str) -> Dict[str, RingCounter]:
+        if team_id not in self.teams:
+            self.teams[team_id] = {
+                'hourly': RingCounter(self.days * 24, 3600),
+                'daily': RingCounter(self.days, 86400)
+            }
+        return self.teams[team_id]
+
+    def add(self, team_id: str, timestamp: Optional[float] = None) -> None:
+        """Count one application for a team."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        counters = self._team(team_id)
+        counters['hourly'].add(timestamp)
+        counters['daily'].add(timestamp)
+
+    def hourly(self, team_id: str, hours: int = 24, now: Optional[float] = None) -> List[int]:
+        if team_id not in self.teams:
+            return [0] * min(hours, self.days * 24)
+        return self.teams[team_id]['hourly'].series(now, hours)
+
+    def daily(self, team_id: str, days: Optional[int] = None, now: Optional[float] = None) -> List[int]:
+        if team_id not in self.teams:
+            return [0] * min(days or self.days, self.days)
+        return self.teams[team_id]['daily'].series(now, days)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            team_id: {name: counter.to_dict() for name, counter in counters.items()}
+            for team_id, counters in self.teams.items()
+        }
+
+
+class RollingDurations:
+    """Daily count and total of durations per team, e.g. time to a decision."""
+
+    def __init__(self, days: int, data: Optional[Dict[str, Any]] = None):
+        self.days = days
+        self.teams: Dict[str, Dict[str, RingCounter]] = {}
+        for team_id, counters in (data or {}).items():
+            self.teams[team_id] = {
+                'count': RingCounter(days, 86400, counters.get('count')),
+                'seconds': RingCounter(days, 86400, counters.get('seconds'))
+            }
+
+    def add(self, team_id: str, seconds: float, timestamp: Optional[float] = None) -> None:
+        """Record one duration for a team."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        if team_id not in self.teams:
+            self.teams[team_id] = {
+                'count': RingCounter(self.days, 86400),
+                'seconds': RingCounter(self.days, 86400)
+            }
+        self.teams[team_id]['count'].add(timestamp)
+        self.teams[team_id]['seconds'].add(timestamp, int(seconds))
+
+    def summary(self, team_id: str, days: Optional[int] = None, now: Optional[float] = None) -> Dict[str, float]:
+        """Number and average of the durations recorded over the last days."""
+        if team_id not in self.teams:
+            return {'count': 0, 'average': 0.0}
+        count = sum(self.teams[team_id]['count'].series(now, days))
+        seconds = sum(self.teams[team_id]['seconds'].series(now, days))
+        return {'count': count, 'average': seconds / count if count else 0.0}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            team_id: {name: counter.to_dict() for name, counter in counters.items()}
+            for team_id, counters in self.teams.items()
+        }
+
+
+# Upper bounds (seconds) of the buckets of duration histograms; the last bucket is open
+DURATION_BOUNDS = (300, 900, 1800, 3600, 7200, 14400, 28800, 43200, 86400, 172800, 259200, 604800, float('inf'))
+
+
+class RollingHistogram:
+    """Daily histograms of durations per team, e.g. time to the first answer.
+
+    Counts of different processes or periods can simply be added up, and
+    percentiles are estimated from the counts.
+    """
+
+    def __init__(self, days: int, data: Optional[Dict[str, Any]] = None):
+        self.days = days
+        self.teams: Dict[str, List[RingCounter]] = {}
+        for team_id, counters in (data or {}).items():
+            if len(counters) == len(DURATION_BOUNDS):
+                self.teams[team_id] = [RingCounter(days, 86400, counter) for counter in counters]
+
+    def add(self, team_id: str, seconds: float, timestamp: Optional[float] = None) -> None:
+        """Record one duration for a team."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        if team_id not in self.teams:
+            self.teams[team_id] = [RingCounter(self.days, 86400) for _ in DURATION_BOUNDS]
+        self.teams[team_id][bisect.bisect_left(DURATION_BOUNDS, seconds)].add(timestamp)
+
+    def counts(self, team_id: str, days: Optional[int] = None, now: Optional[float] = None) -> List[int]:
+        """Durations per bucket recorded over the last days."""
+        if team_id not in self.teams:
+            return [0] * len(DURATION_BOUNDS)
+        return [sum(counter.series(now, days)) for counter in self.teams[team_id]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            team_id: [counter.to_dict() for counter in counters]
+            for team_id, counters in self.teams.items()
+        }
+
+
+def histogram_percentile(counts: List[int], fraction: float) -> float:
+    """Estimate a percentile from histogram counts, interpolating within its bucket."""
+    rank = fraction * sum(counts)
+    seen = 0
+    for index, count in enumerate(counts):
+        if count and seen + count >= rank:
+            lower = DURATION_BOUNDS[index - 1] if index else 0
+            upper = DURATION_BOUNDS[index]
+            if upper == float('inf'):
+                return lower
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return 0.0
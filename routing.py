@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import List
+import content
+from config import ADMIN_GROUP_ID, ADMIN_CHAT_IDS, TEAM_ADMIN_GROUPS
+
+
+def get_team_admin_group(team_id: str) -> int:
+    """Get the admin group that handles a team."""
+    return TEAM_ADMIN_GROUPS.get(team_id, ADMIN_GROUP_ID)
+
+
+def is_admin_chat(chat_id: int) -> bool:
+    """Check whether a chat is one of the admin groups."""
+    return chat_id in ADMIN_CHAT_IDS
+
+
+def get_chat_teams(chat_id: int) -> List[str]:
+    """Get the teams an admin group may manage; the main group manages all."""
+    if chat_id == ADMIN_GROUP_ID:
+        return list(content.TEAMS)
+    return [team_id for team_id in content.TEAMS if TEAM_ADMIN_GROUPS.get(team_id) == chat_id]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    """Time consecutive startup phases from process start until the bot is ready.
+
+    Each mark closes the phase that began at the previous mark, so the phases
+    add up to the total startup time.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last_mark = self.started
+        self.phases: List[Tuple[str, float]] = []
+        self.ready = False
+        self.first_update_seen = False
+
+    def mark(self, phase: str) -> None:
+        """Close the current phase under the given name."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last_mark))
+        self._last_mark = now
+
+    def finish(self, phase: str) -> None:
+        """Close the last phase and log the report."""
+        self.mark(phase)
+        self.ready = True
+        logger.info(self.report())
+
+    def report(self) -> str:
+        total = self._last_mark - self.started
+        lines = [f"Startup took {total * 1000:.0f} ms:"]
+        for phase, duration in self.phases:
+            lines.append(f"  {phase:<24} {duration * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+    def first_update(self) -> None:
+        """Log when the first update arrives after start."""
+        if self.first_update_seen:
+            return
+        self.first_update_seen = True
+        logger.info(f"First update handled {time.perf_counter() - self.started:.2f}s after start")
+
+
+# Created at import so main.py can time everything imported after it
+profiler = StartupProfiler()
+
+
+def setup_fingerprint(*parts: Any) -> str:
+    """Hash the bot setup (commands, menu button) to skip unchanged API calls."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_setup_fingerprint(filename: str) -> str:
+    try:
+        with open(filename, 'r', encoding='utf-8') as file:
+            return json.load(file).get('fingerprint', '')
+    except (OSError, ValueError):
+        return ''
+
+
+def save_setup_fingerprint(filename: str, fingerprint: str) -> None:
+    try:
+        temp_filename = f"{filename}.tmp"
+        with open(temp_filename, 'w', encoding='utf-8') as file:
+            json.dump({'fingerprint': fingerprint}, file)
+        os.replace(temp_filename, filename)
+    except OSError as e:
+        logger.error(f"Failed to save {filename}: {e}")
+
+
+async def note_first_update(update, context) -> None:
+    """Handler: report the time from process start to the first update."""
+    profiler.first_update()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# (update_id, user_id, started) of the update being handled in this task
+current_update: contextvars.ContextVar = contextvars.ContextVar("current_update", default=None)
+
+
+class UpdateContextFilter(logging.Filter):
+    """Attach the id of the update being handled and its user to every record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        update_context = current_update.get()
+        if update_context is not None:
+            record.update_id, record.user_id = update_context[0], update_context[1]
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of high-volume records.
+
+    The category of a record is its ``category`` extra or else its logger
+    name, so e.g. {"update": 0.1, "httpx": 0.01} keeps 10% of per-update
+    records and 1% of HTTP request lines. Warnings and errors are never sampled.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, 'category', record.name))
+        return rate is None or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to the writer thread, dropping them when its queue is full.
+
+    Only the message is rendered on the calling thread; formatting and I/O
+    happen in the listener, so a slow stream never blocks the event loop.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the update context fields when present."""
+
+    FIELDS = ('update_id', 'user_id', 'trace_id', 'update_kind', 'outcome', 'latency_ms', 'category', 'worker')
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """Parse "category=rate,..." into a dict of sampling rates."""
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            category, rate = item.split("=", 1)
+            rates[category.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(log_format: str = "json", level: int = logging.INFO, queue_size: int = 10000,
+                  sampling: Optional[Dict[str, float]] = None) -> DroppingQueueHandler:
+    """Route all logging through a bounded queue to a background writer thread."""
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if log_format == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    queue_handler.addFilter(UpdateContextFilter())
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler)
+    listener.start()
+
+    def stop() -> None:
+        listener.stop()
+        if queue_handler.dropped:
+            sys.stderr.write(f"{queue_handler.dropped} log records were dropped under load\n")
+
+    atexit.register(stop)
+    return queue_handler
+
+
+def update_kind(update) -> str:
+    """Describe the kind of an update: a callback query, the command of a message, or a plain message."""
+    if update.callback_query is not None:
+        return "callback_query"
+    message = update.effective_message
+    if message is not None and message.text and message.text.startswith("/"):
+        return message.text.split()[0].split("@")[0]
+    return "message"
+
+
+async def begin_update(update, context) -> None:
+    """Handler: remember the update being handled for the log records it produces."""
+    user_id = update.effective_user.id if update.effective_user else None
+    current_update.set((update.update_id, user_id, time.perf_counter()))
+
+
+async def end_update(update, context, outcome: str = "handled") -> None:
+    """Handler: log how long the update took and whether it was handled or stopped early."""
+    update_context = current_update.get()
+    if update_context is None:
+        return
+    logger.info(
+        "Update handled",
+        extra={
+            'category': "update",
+            'update_kind': update_kind(update),
+            'outcome': outcome,
+            'latency_ms': round((time.perf_counter() - update_context[2]) * 1000, 2)
+        }
+    )
+    current_update.set(None)
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The bot's modules live at the top of the repository and keep their data
+# files in the working directory, so they are imported from there and the
+# tests run in a scratch directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="bot-tests-"))
@@ -0,0 +1,55 @@
+from archive import ArchiveStore
+
+
+def application(user_id, team_id):
+    return {'user_info': {'user_id': user_id}, 'selected_team': team_id, 'reason': f"reason {user_id}"}
+
+
+def test_segments_are_read_back_by_team_and_label(tmp_path):
+    archive = ArchiveStore(str(tmp_path / "archive"))
+    archive.add_segment([application(1, "team_media"), application(2, "team_exams")], "team_media#1")
+    archive.add_segment([application(3, "team_media")], "old")
+
+    assert [item['user_info']['user_id'] for item in archive.iter_applications()] == [1, 2, 3]
+    assert [item['user_info']['user_id'] for item in archive.iter_applications(["team_media"])] == [1, 3]
+    assert [item['user_info']['user_id'] for item in archive.iter_applications(label="old")] == [3]
+
+
+def test_index_keeps_aggregates_across_a_restart(tmp_path):
+    archive = ArchiveStore(str(tmp_path / "archive"))
+    archive.add_segment([application(1, "team_media"), application(2, "team_media")])
+    archive.add_segment([application(1, "team_media"), application(3, "team_exams")])
+
+    reopened = ArchiveStore(str(tmp_path / "archive"))
+
+    assert reopened.team_counts() == {'team_media': 3, 'team_exams': 1}
+    assert reopened.user_ids(["team_media"]) == {1, 2}
+    assert reopened.user_ids() == {1, 2, 3}
+
+
+def test_removed_segments_are_returned_and_leave_the_aggregates(tmp_path):
+    archive = ArchiveStore(str(tmp_path / "archive"))
+    archive.add_segment([application(1, "team_media"), application(2, "team_media")], "team_media#1")
+    archive.add_segment([application(1, "team_media")], "team_media#2")
+
+    removed = archive.remove_segments("team_media#1")
+
+    assert [item['user_info']['user_id'] for item in removed] == [1, 2]
+    assert archive.team_counts() == {'team_media': 1}
+    # User 1 still has an application in the other segment
+    assert archive.user_ids() == {1}
+    assert [segment['label'] for segment in archive.index['segments']] == ["team_media#2"]
+    assert len(list((tmp_path / "archive").glob("segment_*"))) == 1
+    assert archive.remove_segments("team_media#1") == []
+
+
+def test_segment_numbers_are_not_reused_after_a_removal(tmp_path):
+    archive = ArchiveStore(str(tmp_path / "archive"))
+    archive.add_segment([application(1, "team_media")], "first")
+    second = archive.add_segment([application(2, "team_media")], "second")
+    archive.remove_segments("first")
+
+    third = archive.add_segment([application(3, "team_media")], "third")
+
+    assert third['file'] != second['file']
+    assert [item['user_info']['user_id'] for item in archive.iter_applications()] == [2, 3]
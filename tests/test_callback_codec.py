@@ -0,0 +1,100 @@
+from callback_codec import (
+    CallbackCodec,
+    MAX_CALLBACK_DATA,
+    OP_TEAM,
+    OP_ACCEPT,
+    OP_REJECT,
+    OP_END_CHAT
+)
+
+LONG_TEAM_ID = "team_" + "x" * MAX_CALLBACK_DATA
+
+
+def test_short_data_round_trips_without_the_table():
+    codec = CallbackCodec(table_size=10)
+
+    data = codec.encode(OP_ACCEPT, 123456789, "team_media")
+
+    assert len(data) < len("accept_123456789_team_media")
+    assert codec.decode(data) == (OP_ACCEPT, (123456789, "team_media"))
+    assert codec.decode(codec.encode(OP_END_CHAT, 42)) == (OP_END_CHAT, (42,))
+    assert codec.opcode(codec.encode(OP_TEAM, "team_media")) == OP_TEAM
+
+
+def test_long_data_gets_one_reused_token():
+    codec = CallbackCodec(table_size=10)
+
+    data = codec.encode(OP_TEAM, LONG_TEAM_ID)
+
+    assert len(data.encode('utf-8')) <= MAX_CALLBACK_DATA
+    assert codec.encode(OP_TEAM, LONG_TEAM_ID) == data
+    assert codec.decode(data) == (OP_TEAM, (LONG_TEAM_ID,))
+
+
+def test_least_recently_used_tokens_are_evicted():
+    codec = CallbackCodec(table_size=2)
+    first = codec.encode(OP_TEAM, LONG_TEAM_ID + "1")
+    second = codec.encode(OP_TEAM, LONG_TEAM_ID + "2")
+    codec.encode(OP_TEAM, LONG_TEAM_ID + "1")
+
+    codec.encode(OP_TEAM, LONG_TEAM_ID + "3")
+
+    assert codec.decode(first) == (OP_TEAM, (LONG_TEAM_ID + "1",))
+    assert codec.decode(second) is None
+
+
+def test_pinned_tokens_are_not_evicted_until_unpinned():
+    codec = CallbackCodec(table_size=1)
+    pinned = codec.encode(OP_TEAM, LONG_TEAM_ID + "1", pin=True)
+    for index in range(2, 5):
+        codec.encode(OP_TEAM, LONG_TEAM_ID + str(index))
+
+    assert codec.decode(pinned) == (OP_TEAM, (LONG_TEAM_ID + "1",))
+
+    codec.unpin_all()
+    codec.encode(OP_TEAM, LONG_TEAM_ID + "5")
+    assert codec.decode(pinned) is None
+
+
+def test_table_survives_a_restart(tmp_path):
+    filename = str(tmp_path / "callback_table.json")
+    codec = CallbackCodec(table_size=10, filename=filename)
+    pinned = codec.encode(OP_TEAM, LONG_TEAM_ID + "1", pin=True)
+    data = codec.encode(OP_TEAM, LONG_TEAM_ID + "2")
+
+    restarted = CallbackCodec(table_size=10, filename=filename)
+
+    assert restarted.decode(data) == (OP_TEAM, (LONG_TEAM_ID + "2",))
+    # New tokens don't reuse the ones handed out before the restart
+    assert restarted.encode(OP_TEAM, LONG_TEAM_ID + "3") not in (pinned, data)
+    restarted.table_size = 0
+    restarted.encode(OP_TEAM, LONG_TEAM_ID + "4")
+    assert restarted.decode(pinned) == (OP_TEAM, (LONG_TEAM_ID + "1",))
+
+
+def test_tokens_carry_the_namespace():
+    codec = CallbackCodec(table_size=10, namespace="2")
+
+    data = codec.encode(OP_TEAM, LONG_TEAM_ID)
+
+    assert codec.token_namespace(data) == "2"
+    assert codec.token_namespace(codec.encode(OP_END_CHAT, 42)) is None
+
+
+def test_legacy_data_is_decoded():
+    codec = CallbackCodec(table_size=10)
+
+    assert codec.decode("team_media") == (OP_TEAM, ("team_media",))
+    assert codec.decode("accept_123_team_media") == (OP_ACCEPT, (123, "team_media"))
+    assert codec.decode("reject_123_team_media") == (OP_REJECT, (123, "team_media"))
+    assert codec.decode("end_chat_123") == (OP_END_CHAT, (123,))
+
+
+def test_unknown_or_malformed_data_decodes_to_none():
+    codec = CallbackCodec(table_size=10)
+
+    assert codec.decode(None) is None
+    assert codec.decode("something_else") is None
+    assert codec.decode("end_chat_abc") is None
+    assert codec.decode("1a!:team_media") is None
+    assert codec.decode("~unknown") is None
@@ -0,0 +1,38 @@
+import json
+import os
+import pytest
+import content
+
+
+@pytest.fixture
+def content_file(tmp_path, monkeypatch):
+    filename = str(tmp_path / "content.json")
+    monkeypatch.setattr(content, 'CONTENT_FILE', filename)
+    monkeypatch.setattr(content, '_seen_mtime', 0.0)
+    monkeypatch.setattr(content, '_current', content.current())
+    return filename
+
+
+def write_content(filename, messages, mtime):
+    with open(filename, 'w', encoding='utf-8') as file:
+        json.dump({'teams': {'team_media': "Media"}, 'messages': messages}, file)
+    os.utime(filename, (mtime, mtime))
+
+
+def test_templates_are_reloaded(content_file):
+    write_content(content_file, {'APPLICATION_SUBMITTED': "Thanks for applying to {team_name}\n"}, 1000)
+
+    assert content.reload_if_changed()
+    assert content.team_text("APPLICATION_SUBMITTED", "team_media") == "Thanks for applying to Media\n"
+
+
+@pytest.mark.parametrize("template", ["Welcome {user_name}\n", "Unclosed {team_name\n"])
+def test_bad_placeholders_keep_the_old_content(content_file, template):
+    write_content(content_file, {'APPLICATION_SUBMITTED': "Thanks for applying to {team_name}\n"}, 1000)
+    content.reload_if_changed()
+
+    write_content(content_file, {'APPLICATION_SUBMITTED': template}, 2000)
+
+    assert not content.reload_if_changed()
+    assert content.APPLICATION_SUBMITTED == "Thanks for applying to {team_name}\n"
+    assert content.team_text("APPLICATION_SUBMITTED", "team_media") == "Thanks for applying to Media\n"
@@ -0,0 +1,62 @@
+import time
+from conversation_reaper import ConversationReaper
+
+
+def test_reminds_then_expires_an_idle_conversation():
+    now = time.time()
+    reaper = ConversationReaper(timeout=120, reminder_after=60, resolution=10)
+    reaper.touch(1, chat_id=100, step=2, last_activity=now)
+
+    assert reaper.collect_due(now + 30) == ([], [])
+
+    reminders, expired = reaper.collect_due(now + 80)
+    assert [(entry['user_id'], entry['chat_id'], entry['step']) for entry in reminders] == [(1, 100, 2)]
+    assert expired == []
+
+    reminders, expired = reaper.collect_due(now + 200)
+    assert reminders == []
+    assert [entry['user_id'] for entry in expired] == [1]
+    assert len(reaper) == 0
+
+
+def test_activity_pushes_the_deadline_back():
+    now = time.time()
+    reaper = ConversationReaper(timeout=120, reminder_after=60, resolution=10)
+    reaper.touch(1, chat_id=100, step=1, last_activity=now)
+    reaper.touch(1, chat_id=100, step=2, last_activity=now + 50)
+
+    # The old reminder bucket passes without a reminder
+    assert reaper.collect_due(now + 80) == ([], [])
+    reminders, _ = reaper.collect_due(now + 130)
+    assert [entry['step'] for entry in reminders] == [2]
+
+
+def test_discarded_conversations_are_never_due():
+    now = time.time()
+    reaper = ConversationReaper(timeout=120, reminder_after=60, resolution=10)
+    reaper.touch(1, chat_id=100, step=1, last_activity=now)
+    reaper.discard(1)
+
+    assert reaper.collect_due(now + 500) == ([], [])
+    assert len(reaper) == 0
+
+
+def test_without_reminders_conversations_expire_at_the_timeout():
+    now = time.time()
+    reaper = ConversationReaper(timeout=120, reminder_after=0, resolution=10)
+    reaper.touch(1, chat_id=100, step=1, last_activity=now)
+
+    assert reaper.collect_due(now + 100) == ([], [])
+    reminders, expired = reaper.collect_due(now + 140)
+    assert reminders == []
+    assert [entry['user_id'] for entry in expired] == [1]
+
+
+def test_overdue_conversations_restored_after_a_restart_are_swept_next():
+    now = time.time()
+    reaper = ConversationReaper(timeout=120, reminder_after=60, resolution=10)
+    reaper.touch(1, chat_id=100, step=1, last_activity=now - 1000)
+
+    _, expired = reaper.collect_due(now + 20)
+    assert [entry['user_id'] for entry in expired] == [1]
+    assert len(reaper) == 0
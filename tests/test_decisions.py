@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from telegram.error import TimedOut
+from config import ADMIN_GROUP_ID
+import content
+import handlers
+from callback_codec import callback_codec, OP_ACCEPT, OP_REJECT
+from data_manager import DataManager, STATUS_PENDING, STATUS_ACCEPTED, STATUS_REJECTED
+
+USER_ID = 123
+
+
+class FakeBot:
+    """Records messages; fails the queued number of sends first."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        # Let a concurrent press run in between, as a real network call would
+        await asyncio.sleep(0)
+        if self.failures:
+            self.failures -= 1
+            raise TimedOut()
+        self.sent.append(chat_id)
+
+
+def button_press(op, team_id):
+    async def answer(*args, **kwargs):
+        pass
+
+    async def edit_message_text(**kwargs):
+        pass
+
+    query = SimpleNamespace(
+        data=callback_codec.encode(op, USER_ID, team_id),
+        message=SimpleNamespace(chat=SimpleNamespace(id=ADMIN_GROUP_ID), text="application"),
+        from_user=SimpleNamespace(first_name="Admin", last_name=None),
+        answer=answer,
+        edit_message_text=edit_message_text
+    )
+    return SimpleNamespace(callback_query=query)
+
+
+@pytest.fixture
+def team_id():
+    return list(content.TEAMS)[0]
+
+
+@pytest.fixture
+def data_manager(tmp_path, monkeypatch, team_id):
+    monkeypatch.chdir(tmp_path)
+    data_manager = DataManager()
+    data_manager.save_application({
+        'user_info': {'user_id': USER_ID, 'first_name': "A", 'last_name': "", 'username': ""},
+        'selected_team': team_id,
+        'team_name': team_id,
+        'reason': "reason",
+        'experience': "experience",
+        'timestamp': datetime.now().isoformat()
+    })
+    monkeypatch.setattr(handlers, 'data_manager', data_manager)
+    return data_manager
+
+
+def decide(bot, *presses):
+    context = SimpleNamespace(bot=bot)
+
+    async def press_all():
+        await asyncio.gather(*(handlers.handle_admin_decision(press, context) for press in presses))
+
+    asyncio.run(press_all())
+
+
+def status(data_manager, team_id):
+    return data_manager.shards[team_id].applicants[USER_ID]['status']
+
+
+def test_status_only_changes_from_pending(data_manager, team_id):
+    assert data_manager.set_application_status(USER_ID, team_id, STATUS_PENDING, STATUS_ACCEPTED)
+    assert not data_manager.set_application_status(USER_ID, team_id, STATUS_PENDING, STATUS_REJECTED)
+
+    assert status(data_manager, team_id) == STATUS_ACCEPTED
+    assert DataManager().shards[team_id].applicants[USER_ID]['status'] == STATUS_ACCEPTED
+
+
+def test_concurrent_decisions_message_the_applicant_once(data_manager, team_id):
+    bot = FakeBot()
+
+    decide(bot, button_press(OP_ACCEPT, team_id), button_press(OP_REJECT, team_id))
+
+    assert bot.sent == [USER_ID]
+    assert status(data_manager, team_id) == STATUS_ACCEPTED
+
+
+def test_failed_send_reopens_the_application(data_manager, team_id):
+    decide(FakeBot(failures=1), button_press(OP_REJECT, team_id))
+
+    assert status(data_manager, team_id) == STATUS_PENDING
+    assert USER_ID in data_manager.shards[team_id].pending
+    assert DataManager().shards[team_id].applicants[USER_ID]['status'] == STATUS_PENDING
+
+    # The decision can be made again
+    bot = FakeBot()
+    decide(bot, button_press(OP_ACCEPT, team_id))
+
+    assert bot.sent == [USER_ID]
+    assert status(data_manager, team_id) == STATUS_ACCEPTED
+
+
+def test_reopen_ignores_other_statuses(data_manager, team_id):
+    data_manager.set_application_status(USER_ID, team_id, STATUS_PENDING, STATUS_ACCEPTED)
+
+    assert not data_manager.reopen_application(USER_ID, team_id, STATUS_REJECTED)
+    assert status(data_manager, team_id) == STATUS_ACCEPTED
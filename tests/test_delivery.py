@@ -0,0 +1,125 @@
+import asyncio
+from datetime import timedelta
+import pytest
+from telegram.error import Forbidden, RetryAfter, TimedOut
+import delivery
+from delivery import RateLimiter, deliver
+
+_sleep = asyncio.sleep
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class FakeClock:
+    """Monotonic time that only moves when someone sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await _sleep(0)
+
+
+class FakeBot:
+    """Records sends, raising the queued errors of a chat first."""
+
+    def __init__(self, clock, errors=None):
+        self.clock = clock
+        self.errors = {chat_id: list(queued) for chat_id, queued in (errors or {}).items()}
+        self.sent = []
+
+    async def send_message(self, chat_id):
+        queued = self.errors.get(chat_id)
+        if queued:
+            raise queued.pop(0)
+        self.sent.append((chat_id, self.clock.now))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(delivery.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(delivery.asyncio, 'sleep', clock.sleep)
+    return clock
+
+
+def test_limiter_spaces_out_calls(clock):
+    limiter = RateLimiter(rate=4)
+
+    async def acquire(count):
+        started = []
+        for _ in range(count):
+            await limiter.acquire()
+            started.append(clock.now)
+        return started
+
+    assert run(acquire(3)) == [0.0, 0.25, 0.5]
+
+
+def test_limiter_pause_holds_back_the_next_call(clock):
+    limiter = RateLimiter(rate=10)
+
+    async def acquire():
+        await limiter.acquire()
+        limiter.pause(5)
+        await limiter.acquire()
+
+    run(acquire())
+
+    assert clock.now == 5
+
+
+def test_limiter_without_rate_never_waits(clock):
+    limiter = RateLimiter(rate=0)
+
+    async def acquire():
+        for _ in range(5):
+            await limiter.acquire()
+
+    run(acquire())
+
+    assert clock.sleeps == []
+
+
+def test_flood_limit_pauses_and_retries(clock):
+    bot = FakeBot(clock, {2: [RetryAfter(timedelta(seconds=30))]})
+    results = []
+
+    async def on_result(chat_id, delivered):
+        results.append((chat_id, delivered))
+
+    result = run(deliver([1, 2, 3], bot.send_message, concurrency=1, rate=10, on_result=on_result))
+
+    assert results == [(1, True), (2, True), (3, True)]
+    assert result['delivered'] == 3 and result['failed'] == 0
+    # Chat 2 was retried once the pause was over, and chat 3 waited behind it
+    assert [chat_id for chat_id, _ in bot.sent] == [1, 2, 3]
+    assert bot.sent[1][1] >= 30
+
+
+def test_blocked_users_fail_without_retries(clock):
+    bot = FakeBot(clock, {2: [Forbidden("blocked"), Forbidden("blocked")]})
+
+    result = run(deliver([1, 2], bot.send_message, concurrency=2, rate=0))
+
+    assert result['delivered'] == 1 and result['failed'] == 1
+    assert len(bot.errors[2]) == 1
+
+
+def test_other_errors_are_retried_up_to_the_limit(clock):
+    bot = FakeBot(clock, {1: [TimedOut()] * 2, 2: [TimedOut()] * 5})
+
+    result = run(deliver([1, 2], bot.send_message, concurrency=2, rate=0, max_retries=3))
+
+    assert [chat_id for chat_id, _ in bot.sent] == [1]
+    assert result['delivered'] == 1 and result['failed'] == 1
+    # One first attempt and three retries
+    assert len(bot.errors[2]) == 1
@@ -0,0 +1,45 @@
+from flood_control import InboundLimiter, ALLOWED, THROTTLED_FIRST, THROTTLED
+
+
+def test_burst_is_allowed_then_throttled_once_per_streak():
+    limiter = InboundLimiter(capacity=3, refill_rate=1)
+
+    results = [limiter.check(1, now=0.0) for _ in range(5)]
+
+    assert results == [ALLOWED, ALLOWED, ALLOWED, THROTTLED_FIRST, THROTTLED]
+    assert limiter.throttled_updates == 2
+    assert limiter.throttled_streaks == 1
+
+
+def test_tokens_refill_over_time():
+    limiter = InboundLimiter(capacity=2, refill_rate=0.5)
+    limiter.check(1, now=0.0)
+    limiter.check(1, now=0.0)
+    assert limiter.check(1, now=0.0) == THROTTLED_FIRST
+
+    assert limiter.check(1, now=2.0) == ALLOWED
+    # A new streak is warned about again
+    assert limiter.check(1, now=2.0) == THROTTLED_FIRST
+    assert limiter.throttled_streaks == 2
+
+
+def test_users_have_their_own_buckets():
+    limiter = InboundLimiter(capacity=1, refill_rate=1)
+    limiter.check(1, now=0.0)
+
+    assert limiter.check(1, now=0.0) == THROTTLED_FIRST
+    assert limiter.check(2, now=0.0) == ALLOWED
+
+
+def test_fully_refilled_buckets_are_evicted():
+    limiter = InboundLimiter(capacity=2, refill_rate=1)
+    limiter.check(1, now=0.0)
+    limiter.check(2, now=1.5)
+    assert len(limiter) == 2
+
+    limiter.check(3, now=2.5)
+
+    # User 1 was idle for the time a full refill takes, user 2 wasn't
+    assert len(limiter) == 2
+    assert limiter.check(1, now=2.5) == ALLOWED
+    assert len(limiter) == 3
@@ -0,0 +1,34 @@
+from datetime import datetime
+from data_manager import DataManager
+from funnel import ALL_TEAMS
+
+TEAM_ID = "team_media"
+
+
+def test_counts_follow_start_team_submit(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_manager = DataManager()
+    # Two users start, both pick the team, one of them submits
+    for user_id in (1, 2):
+        data_manager.record_funnel_step('start')
+        data_manager.record_funnel_step('team', TEAM_ID)
+    data_manager.save_application({
+        'user_info': {'user_id': 1, 'first_name': "A", 'last_name': "", 'username': ""},
+        'selected_team': TEAM_ID,
+        'team_name': TEAM_ID,
+        'reason': "reason",
+        'experience': "experience",
+        'timestamp': datetime.now().isoformat()
+    })
+
+    funnel = data_manager.get_funnel_statistics([TEAM_ID], days=1)
+
+    assert funnel[ALL_TEAMS]['start'] == funnel[ALL_TEAMS]['total_start'] == 2
+    assert funnel[TEAM_ID]['team'] == funnel[TEAM_ID]['total_team'] == 2
+    assert funnel[TEAM_ID]['submitted'] == funnel[TEAM_ID]['total_submitted'] == 1
+    assert funnel[TEAM_ID]['start'] == 0
+
+    # The counts are written out with the statistics
+    data_manager.flush_statistics()
+    assert DataManager().get_funnel_statistics([TEAM_ID], days=1) == funnel
+
@@ -0,0 +1,71 @@
+from near_duplicates import (
+    NearDuplicateIndex,
+    signature,
+    encode_signature,
+    decode_signature,
+    similarity
+)
+
+ANSWER = (
+    "I have been volunteering with the media team of my faculty for two years, "
+    "editing videos and designing posts for every event we organized."
+)
+REWORDED = ANSWER.replace("two years", "three years")
+OTHER = "I like solving exam questions and would love to help write and review them for students."
+
+
+def test_similar_texts_have_similar_signatures():
+    assert similarity(signature(ANSWER), signature(ANSWER.upper() + "  ")) == 1.0
+    assert similarity(signature(ANSWER), signature(REWORDED)) >= 0.7
+    assert similarity(signature(ANSWER), signature(OTHER)) < 0.3
+    assert signature("   ") is None
+
+
+def test_signatures_round_trip_through_hex():
+    values = signature(ANSWER)
+
+    assert list(decode_signature(encode_signature(values))) == values
+
+
+def test_query_finds_near_duplicates_most_similar_first():
+    index = NearDuplicateIndex(threshold=0.5)
+    index.add(("team_media", 1), signature(ANSWER))
+    index.add(("team_media", 2), signature(REWORDED))
+    index.add(("team_exams", 3), signature(OTHER))
+
+    matches = index.query(signature(ANSWER), exclude=("team_media", 1))
+
+    assert [key for key, _ in matches] == [("team_media", 2)]
+    assert index.query(signature(ANSWER))[0] == (("team_media", 1), 1.0)
+
+
+def test_removed_applications_are_not_found():
+    index = NearDuplicateIndex(threshold=0.5)
+    index.add(("team_media", 1), signature(ANSWER))
+    index.add(("team_media", 2), signature(REWORDED))
+
+    index.remove(("team_media", 2))
+    index.remove(("team_media", 5))
+
+    assert [key for key, _ in index.query(signature(REWORDED))] == [("team_media", 1)]
+    assert index.groups() == []
+
+
+def test_readding_an_application_replaces_its_signature():
+    index = NearDuplicateIndex(threshold=0.5)
+    index.add(("team_media", 1), signature(ANSWER))
+    index.add(("team_media", 1), signature(OTHER))
+
+    assert index.query(signature(ANSWER)) == []
+    assert all(len(bucket) == 1 for bucket in index.buckets.values())
+
+
+def test_groups_join_near_duplicates_across_teams():
+    index = NearDuplicateIndex(threshold=0.5)
+    index.add(("team_media", 1), signature(ANSWER))
+    index.add(("team_exams", 2), signature(REWORDED))
+    index.add(("team_exams", 3), signature(OTHER))
+
+    assert index.groups() == [[("team_exams", 2), ("team_media", 1)]]
+    assert index.groups(["team_media"]) == [[("team_exams", 2), ("team_media", 1)]]
+    assert index.groups(["team_support"]) == []
@@ -0,0 +1,83 @@
+import asyncio
+from persistence import JournalPersistence
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_user_data_and_conversations_survive_a_restart(tmp_path):
+    filename = str(tmp_path / "journal.jsonl")
+    persistence = JournalPersistence(filename)
+
+    async def update():
+        await persistence.update_user_data(1, {'team': "team_media"})
+        await persistence.update_conversation("applications", (1, 1), 2)
+        await persistence.flush()
+
+    run(update())
+    reloaded = JournalPersistence(filename)
+
+    assert run(reloaded.get_user_data()) == {1: {'team': "team_media"}}
+    assert run(reloaded.get_conversations("applications")) == {(1, 1): 2}
+
+
+def test_updates_of_one_run_are_written_together(tmp_path):
+    filename = tmp_path / "journal.jsonl"
+    persistence = JournalPersistence(str(filename))
+
+    async def update():
+        await persistence.update_user_data(1, {'step': 1})
+        await persistence.update_user_data(2, {'step': 1})
+        assert not filename.exists()
+        # The write is scheduled for once the persistence run yields
+        await asyncio.sleep(0)
+
+    run(update())
+
+    assert len(filename.read_text(encoding='utf-8').splitlines()) == 2
+
+
+def test_dropped_entries_are_gone_after_a_restart(tmp_path):
+    filename = str(tmp_path / "journal.jsonl")
+    persistence = JournalPersistence(filename)
+
+    async def update():
+        await persistence.update_user_data(1, {'step': 1})
+        await persistence.update_conversation("applications", (1, 1), 2)
+        await asyncio.sleep(0)
+        # Cleared user_data counts as dropped
+        await persistence.update_user_data(1, {})
+        await persistence.update_conversation("applications", (1, 1), None)
+        await asyncio.sleep(0)
+
+    run(update())
+    reloaded = JournalPersistence(filename)
+
+    assert run(reloaded.get_user_data()) == {}
+    assert run(reloaded.get_conversations("applications")) == {}
+
+
+def test_damaged_last_line_is_skipped(tmp_path):
+    filename = tmp_path / "journal.jsonl"
+    filename.write_text(
+        '{"kind": "user_data", "key": 1, "value": {"step": 1}}\n{"kind": "user_da',
+        encoding='utf-8'
+    )
+
+    assert run(JournalPersistence(str(filename)).get_user_data()) == {1: {'step': 1}}
+
+
+def test_journal_is_compacted_once_stale_lines_pile_up(tmp_path):
+    filename = tmp_path / "journal.jsonl"
+    persistence = JournalPersistence(str(filename), compact_threshold=10)
+
+    async def update():
+        for step in range(20):
+            await persistence.update_user_data(1, {'step': step})
+            await asyncio.sleep(0)
+
+    run(update())
+
+    assert len(filename.read_text(encoding='utf-8').splitlines()) <= 10
+    assert run(JournalPersistence(str(filename)).get_user_data()) == {1: {'step': 19}}
@@ -0,0 +1,44 @@
+import pytest
+from record_store import RecordStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    record_store = RecordStore(str(tmp_path / "bodies.dat"))
+    yield record_store
+    record_store.close()
+
+
+def test_records_read_back_by_offset(store):
+    first = store.append({'reason': "أول"})
+    second = store.append({'reason': "second", 'experience': "x" * 1000})
+
+    assert store.read(*second) == {'reason': "second", 'experience': "x" * 1000}
+    assert store.read(*first) == {'reason': "أول"}
+
+
+def test_records_survive_reopening(store):
+    offset, length = store.append({'reason': "kept"})
+    store.close()
+
+    reopened = RecordStore(store.filename)
+    try:
+        assert reopened.read(offset, length) == {'reason': "kept"}
+    finally:
+        reopened.close()
+
+
+def test_read_outside_file_raises(store):
+    offset, length = store.append({'reason': "short"})
+
+    with pytest.raises(ValueError):
+        store.read(offset, length + 100)
+
+
+def test_read_with_wrong_length_raises(store):
+    store.append({'reason': "one"})
+    offset, length = store.append({'reason': "two"})
+
+    with pytest.raises(ValueError):
+        store.read(0, length + 1)
+
@@ -0,0 +1,66 @@
+from rolling_stats import RingCounter, DURATION_BOUNDS, histogram_percentile
+
+# Bucket boundaries are shifted by the UTC offset, which is a multiple of 100 seconds
+WIDTH = 100
+START = 1_000_000
+
+
+def test_counts_land_in_their_buckets():
+    counter = RingCounter(slots=5, width=WIDTH)
+    counter.add(START)
+    counter.add(START + 50, amount=2)
+    counter.add(START + 2 * WIDTH)
+
+    assert counter.series(now=START + 2 * WIDTH) == [0, 0, 3, 0, 1]
+    assert counter.series(now=START + 2 * WIDTH, length=2) == [0, 1]
+
+
+def test_slots_from_an_earlier_lap_are_reset():
+    counter = RingCounter(slots=5, width=WIDTH)
+    counter.add(START)
+    counter.add(START + 5 * WIDTH)
+
+    assert counter.series(now=START + 5 * WIDTH) == [0, 0, 0, 0, 1]
+    # Reading also ignores slots the ring has moved past
+    assert counter.series(now=START + 9 * WIDTH) == [1, 0, 0, 0, 0]
+
+
+def test_data_older_than_the_ring_is_dropped():
+    counter = RingCounter(slots=5, width=WIDTH)
+    counter.add(START + 5 * WIDTH)
+    counter.add(START)
+
+    assert sum(counter.series(now=START + 5 * WIDTH)) == 1
+
+
+def test_counter_round_trips_through_its_dict():
+    counter = RingCounter(slots=5, width=WIDTH)
+    counter.add(START, amount=4)
+
+    restored = RingCounter(slots=5, width=WIDTH, data=counter.to_dict())
+    resized = RingCounter(slots=6, width=WIDTH, data=counter.to_dict())
+
+    assert restored.series(now=START) == counter.series(now=START)
+    assert sum(resized.series(now=START)) == 0
+
+
+def test_percentile_interpolates_within_its_bucket():
+    counts = [0] * len(DURATION_BOUNDS)
+    # Ten durations up to 5 minutes and ten between 5 and 15 minutes
+    counts[0] = 10
+    counts[1] = 10
+
+    assert histogram_percentile(counts, 0.5) == 300
+    assert histogram_percentile(counts, 0.75) == 600
+    assert histogram_percentile(counts, 0.25) == 150
+
+
+def test_percentile_of_the_open_bucket_is_its_lower_bound():
+    counts = [0] * len(DURATION_BOUNDS)
+    counts[-1] = 3
+
+    assert histogram_percentile(counts, 0.9) == DURATION_BOUNDS[-2]
+
+
+def test_percentile_of_an_empty_histogram_is_zero():
+    assert histogram_percentile([0] * len(DURATION_BOUNDS), 0.5) == 0.0
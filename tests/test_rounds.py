@@ -0,0 +1,50 @@
+from datetime import datetime
+import pytest
+from data_manager import DataManager, STATUS_PENDING, STATUS_ACCEPTED
+
+TEAM_ID = "team_media"
+
+
+def save_application(data_manager, user_id):
+    data_manager.save_application({
+        'user_info': {'user_id': user_id, 'first_name': f"User {user_id}", 'last_name': "", 'username': ""},
+        'selected_team': TEAM_ID,
+        'team_name': TEAM_ID,
+        'reason': f"reason {user_id}",
+        'experience': f"experience {user_id}",
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+def applications(data_manager):
+    return {
+        application['user_info']['user_id']: (application['status'], application['reason'])
+        for application in data_manager.get_team_applications(TEAM_ID)
+    }
+
+
+@pytest.mark.parametrize("archived", [False, True])
+def test_clear_then_restore_round_trips(tmp_path, monkeypatch, archived):
+    monkeypatch.chdir(tmp_path)
+    data_manager = DataManager()
+    for user_id in (1, 2, 3):
+        save_application(data_manager, user_id)
+    data_manager.set_application_status(2, TEAM_ID, STATUS_PENDING, STATUS_ACCEPTED)
+    before = applications(data_manager)
+
+    assert data_manager.clear_applications([TEAM_ID]) == {TEAM_ID: 2}
+    assert applications(data_manager) == {}
+    assert not data_manager.has_user_applied(1, TEAM_ID)
+    if archived:
+        while data_manager.purge_retired_round():
+            pass
+
+    assert data_manager.restore_round(TEAM_ID, 1) == 3
+
+    assert applications(data_manager) == before
+    assert data_manager.has_user_applied(1, TEAM_ID)
+    assert data_manager.get_pending_counts([TEAM_ID]) == {TEAM_ID: 2}
+    # The restored round is the current one, also after a restart
+    assert data_manager.get_epoch(TEAM_ID) == 3
+    assert applications(DataManager()) == before
+    assert data_manager.restore_round(TEAM_ID, 1) == 0
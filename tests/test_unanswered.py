@@ -0,0 +1,54 @@
+from unanswered import UnansweredQueue
+
+
+def test_oldest_applications_come_first_across_teams():
+    queue = UnansweredQueue()
+    queue.add("team_media", 1, 300.0)
+    queue.add("team_media", 2, 100.0)
+    queue.add("team_exams", 3, 200.0)
+
+    assert queue.oldest(["team_media", "team_exams"], 2) == [(100.0, "team_media", 2), (200.0, "team_exams", 3)]
+    assert queue.oldest(["team_exams"], 5) == [(200.0, "team_exams", 3)]
+    # Looking doesn't take anything out
+    assert len(queue.oldest(["team_media", "team_exams"], 5)) == 3
+
+
+def test_answered_applications_are_skipped():
+    queue = UnansweredQueue()
+    queue.add("team_media", 1, 100.0)
+    queue.add("team_media", 2, 200.0)
+
+    assert queue.discard("team_media", 1) == 100.0
+    assert queue.discard("team_media", 1) is None
+    assert queue.discard("team_exams", 5) is None
+    assert queue.oldest(["team_media"], 5) == [(200.0, "team_media", 2)]
+
+
+def test_resubmitted_application_waits_from_its_new_time():
+    queue = UnansweredQueue()
+    queue.add("team_media", 1, 100.0)
+    queue.add("team_media", 1, 500.0)
+    queue.add("team_media", 2, 200.0)
+
+    assert queue.oldest(["team_media"], 5) == [(200.0, "team_media", 2), (500.0, "team_media", 1)]
+
+
+def test_heap_is_compacted_after_many_answers():
+    queue = UnansweredQueue()
+    for user_id in range(200):
+        queue.add("team_media", user_id, float(user_id))
+    for user_id in range(190):
+        queue.discard("team_media", user_id)
+
+    assert len(queue.heaps["team_media"]) < 100
+    assert [user_id for _, _, user_id in queue.oldest(["team_media"], 3)] == [190, 191, 192]
+
+
+def test_removed_team_has_nothing_waiting():
+    queue = UnansweredQueue()
+    queue.add("team_media", 1, 100.0)
+    queue.add("team_exams", 2, 200.0)
+
+    queue.remove_team("team_media")
+
+    assert queue.oldest(["team_media", "team_exams"], 5) == [(200.0, "team_exams", 2)]
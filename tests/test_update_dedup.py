@@ -0,0 +1,55 @@
+from update_dedup import UpdateWindow
+
+
+def test_added_ids_are_seen():
+    window = UpdateWindow(size=10)
+    window.add(100)
+
+    assert window.seen(100)
+    assert not window.seen(101)
+
+
+def test_ids_below_the_window_count_as_seen():
+    window = UpdateWindow(size=10)
+    window.add(100)
+
+    assert window.seen(90)
+    assert not window.seen(91)
+
+
+def test_window_is_pruned_but_keeps_recent_ids():
+    window = UpdateWindow(size=10)
+    for update_id in range(1, 100, 2):
+        window.add(update_id)
+
+    assert len(window.ids) <= 20
+    assert window.seen(97)
+    assert not window.seen(96)
+    assert window.seen(85)
+
+
+def test_window_round_trips_through_its_dict():
+    window = UpdateWindow(size=10)
+    for update_id in (5, 50, 52):
+        window.add(update_id)
+
+    restored = UpdateWindow(size=10, data=window.to_dict())
+
+    assert restored.to_dict() == window.to_dict()
+    assert restored.to_dict()['ids'] == [50, 52]
+    assert restored.seen(40) and restored.seen(52)
+    assert not restored.seen(51)
+
+
+def test_much_lower_id_is_taken_as_a_counter_reset():
+    window = UpdateWindow(size=10)
+    window.add(1_000_000)
+
+    assert not window.seen(5000)
+    window.add(5000)
+
+    assert window.max_id == 5000
+    assert window.seen(5000)
+    assert not window.seen(5001)
+    assert not window.seen(1_000_000)
+
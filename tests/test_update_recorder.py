@@ -0,0 +1,90 @@
+from callback_codec import CallbackCodec, callback_codec, OP_ACCEPT, TOKEN_PREFIX
+import update_recorder
+from update_recorder import scrub, pseudonymize
+
+SALT = "test"
+
+
+def test_names_are_blanked_and_ids_pseudonymized():
+    update = {
+        'update_id': 7,
+        'message': {
+            'from': {'id': 123, 'first_name': "Ali", 'username': "ali", 'is_bot': False},
+            'chat': {'id': 123, 'type': "private"},
+            'contact': {'phone_number': "+20100", 'user_id': 123}
+        }
+    }
+
+    scrubbed = scrub(update, SALT, CallbackCodec(table_size=10))
+
+    user = scrubbed['message']['from']
+    assert user['first_name'] == "xxx" and user['username'] == "xxx"
+    assert user['id'] == scrubbed['message']['chat']['id'] == scrubbed['message']['contact']['user_id']
+    assert user['id'] != 123
+    assert user['is_bot'] is False
+    assert scrubbed['message']['contact']['phone_number'] == "xxxxxx"
+    assert scrubbed['update_id'] == 7
+
+
+def test_group_chats_keep_their_ids():
+    assert pseudonymize(-100123, SALT) == -100123
+    assert pseudonymize(123, SALT) == pseudonymize(123, SALT) != pseudonymize(123, "other")
+
+
+def test_text_keeps_its_length_and_commands():
+    codec = CallbackCodec(table_size=10)
+    scrubbed = scrub({'text': "/start team_media", 'caption': "secret"}, SALT, codec)
+
+    command, argument = scrubbed['text'].split(" ")
+    assert command == "/start" and len(argument) == len("team_media") != argument
+    assert len(scrubbed['caption']) == len("secret") and scrubbed['caption'] != "secret"
+    assert len(scrub({'text': "ok 👍"}, SALT, codec)['text']) == len("ok ") + 2
+    assert scrub({'text': "/stats"}, SALT, codec) == {'text': "/stats"}
+
+
+def test_same_words_map_to_the_same_pseudo_words():
+    codec = CallbackCodec(table_size=10)
+    first = scrub({'text': "I love media and I love design"}, SALT, codec)['text'].split(" ")
+    other = scrub({'text': "Something else entirely"}, SALT, codec)['text']
+
+    assert first[0] == first[4] and first[1] == first[5]
+    assert first[1] != first[2]
+    assert other != scrub({'text': "Something else entirely"}, "other", codec)['text']
+
+
+def test_user_ids_in_callback_data_match_the_pseudonyms():
+    codec = CallbackCodec(table_size=10)
+    data = callback_codec.encode(OP_ACCEPT, 123, "team_media")
+    update = {
+        'callback_query': {
+            'from': {'id': 456},
+            'data': data,
+            'message': {'reply_markup': {'inline_keyboard': [[{'text': "ok", 'callback_data': data}]]}}
+        }
+    }
+
+    scrubbed = scrub(update, SALT, codec)
+
+    expected = (OP_ACCEPT, (pseudonymize(123, SALT), "team_media"))
+    assert codec.decode(scrubbed['callback_query']['data']) == expected
+    button = scrubbed['callback_query']['message']['reply_markup']['inline_keyboard'][0][0]
+    assert codec.decode(button['callback_data']) == expected
+
+
+def test_long_callback_data_goes_into_the_recording_table(monkeypatch):
+    live = CallbackCodec(table_size=10)
+    codec = CallbackCodec(table_size=10)
+    team = "team_" + "m" * 80
+    data = live.encode(OP_ACCEPT, 123, team)
+    assert data.startswith(TOKEN_PREFIX)
+
+    monkeypatch.setattr(update_recorder, 'callback_codec', live)
+    scrubbed = scrub({'data': data}, SALT, codec)['data']
+
+    assert codec.decode(scrubbed) == (OP_ACCEPT, (pseudonymize(123, SALT), team))
+    assert len(live._table) == 1
+
+
+def test_unknown_callback_data_is_kept():
+    codec = CallbackCodec(table_size=10)
+    assert scrub({'data': "something_else"}, SALT, codec) == {'data': "something_else"}
@@ -0,0 +1,140 @@
+from datetime import datetime
+from telegram import Update
+from config import ADMIN_GROUP_ID
+from callback_codec import CallbackCodec, callback_codec, OP_ACCEPT, OP_TEAM
+from data_manager import DataManager
+from workers import WorkerPool, route_update, worker_for_user, merge_counts, merge_digests, merge_near_duplicates
+
+COUNT = 4
+USER_ID = 123456
+
+
+def message_update(chat_id, text, user_id=USER_ID):
+    return Update.de_json({
+        'update_id': 1,
+        'message': {
+            'message_id': 1,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': "private" if chat_id > 0 else "supergroup"},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': "A"},
+            'text': text
+        }
+    }, None)
+
+
+def callback_update(chat_id, data, user_id=USER_ID):
+    return Update.de_json({
+        'update_id': 1,
+        'callback_query': {
+            'id': "1",
+            'chat_instance': "1",
+            'from': {'id': user_id, 'is_bot': False, 'first_name': "A"},
+            'data': data,
+            'message': {'message_id': 1, 'date': 0, 'chat': {'id': chat_id, 'type': "supergroup"}}
+        }
+    }, None)
+
+
+def test_applicant_updates_go_to_the_worker_owning_the_user():
+    worker = worker_for_user(USER_ID, COUNT)
+
+    assert route_update(message_update(USER_ID, "hello"), COUNT) == worker
+    assert route_update(callback_update(USER_ID, callback_codec.encode(OP_TEAM, "team_media")), COUNT) == worker
+
+
+def test_decision_buttons_go_to_the_worker_of_the_applicant():
+    data = callback_codec.encode(OP_ACCEPT, 777, "team_media")
+
+    assert route_update(callback_update(ADMIN_GROUP_ID, data), COUNT) == worker_for_user(777, COUNT)
+
+
+def test_table_tokens_go_to_the_worker_that_issued_them():
+    assert route_update(callback_update(ADMIN_GROUP_ID, "~2.1a"), COUNT) == 2
+
+
+def test_admin_group_commands_go_to_one_worker_and_replies_to_all():
+    assert route_update(message_update(ADMIN_GROUP_ID, "/menu"), COUNT) == 0
+    assert route_update(message_update(ADMIN_GROUP_ID, "a reply"), COUNT) is None
+
+
+def test_merge_counts_adds_dicts_and_lists():
+    merged = merge_counts([
+        {'total': 2, 'teams': {'team_media': 1}, 'hourly': [1, 2]},
+        {'total': 3, 'teams': {'team_media': 1, 'team_exams': 4}, 'hourly': [0, 1, 5]}
+    ])
+
+    assert merged == {'total': 5, 'teams': {'team_media': 2, 'team_exams': 4}, 'hourly': [1, 3, 5]}
+
+
+def test_merge_digests_weights_average_response_by_decisions():
+    merged = merge_digests([
+        {'team_media': {'submitted': 2, 'decided': 1, 'average_response': 100.0, 'oldest_unanswered': 50.0}},
+        {'team_media': {'submitted': 1, 'decided': 3, 'average_response': 200.0, 'oldest_unanswered': 80.0}},
+        {'team_media': {'submitted': 0, 'decided': 0, 'average_response': 0.0, 'oldest_unanswered': 0.0}}
+    ])
+
+    assert merged == {'team_media': {
+        'submitted': 3,
+        'decided': 4,
+        'average_response': 175.0,
+        'oldest_unanswered': 80.0
+    }}
+
+
+def test_merge_near_duplicates_sorts_matches_of_all_workers():
+    merged = merge_near_duplicates([
+        [{'application': "a", 'similarity': 0.8}],
+        [],
+        [{'application': "b", 'similarity': 0.9}, {'application': "c", 'similarity': 0.7}]
+    ])
+
+    assert [match['application'] for match in merged] == ["b", "a", "c"]
+
+
+def save_application(data_manager, user_id, team_id):
+    data_manager.save_application({
+        'user_info': {'user_id': user_id, 'first_name': f"User {user_id}", 'last_name': "", 'username': ""},
+        'selected_team': team_id,
+        'team_name': team_id,
+        'reason': f"reason {user_id}",
+        'experience': f"experience {user_id}",
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+def test_export_partitions_splits_applicants_between_directories(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_manager = DataManager()
+    for user_id in range(1, 7):
+        save_application(data_manager, user_id, "team_media")
+    data_manager.clear_applications(["team_media"])
+    while data_manager.purge_retired_round():
+        pass
+    for user_id in (1, 2):
+        save_application(data_manager, user_id, "team_media")
+
+    directories = [str(tmp_path / "worker_0"), str(tmp_path / "worker_1")]
+    data_manager.export_partitions(directories, lambda user_id: user_id % 2)
+
+    for index, directory in enumerate(directories):
+        monkeypatch.chdir(directory)
+        partition = DataManager()
+        current = {application['user_info']['user_id'] for application in partition.shards['team_media'].applications}
+        archived = partition.archive.user_ids(["team_media"])
+        assert current == {user_id for user_id in (1, 2) if user_id % 2 == index}
+        assert archived == {user_id for user_id in range(1, 7) if user_id % 2 == index}
+        assert set(partition.users) == {str(user_id) for user_id in range(1, 7) if user_id % 2 == index}
+        assert partition.get_epoch("team_media") == 2
+
+
+def test_workers_decode_buttons_sent_before_the_split(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    long_team_id = "team_" + "x" * 64
+    data = CallbackCodec(filename="callback_table.json").encode(OP_TEAM, long_team_id)
+
+    pool = WorkerPool(2, "workers")
+    assert pool.prepare(DataManager())
+
+    for index in range(2):
+        worker_codec = CallbackCodec(filename=str(tmp_path / "workers" / f"worker_{index}" / "callback_table.json"))
+        assert worker_codec.decode(data) == (OP_TEAM, (long_team_id,))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Summarize the slowest traces in a trace file written by tracing.py.
+
+Usage: python trace_summary.py [trace_file] [--top N] [--user USER_ID]
+Rotated files (trace_file.1, trace_file.2, ...) are read too.
+"""
+
+import argparse
+import glob
+import json
+from typing import Any, Dict, List
+
+
+def _attribute_values(span: Dict[str, Any]) -> Dict[str, Any]:
+    values = {}
+    for attribute in span.get('attributes', []):
+        value = attribute['value']
+        values[attribute['key']] = next(iter(value.values())) if value else None
+    return values
+
+
+def load_traces(filename: str) -> List[List[Dict[str, Any]]]:
+    """Read every trace as its list of spans, oldest file first."""
+    traces = []
+    filenames = sorted(glob.glob(f"{glob.escape(filename)}.*"), reverse=True) + [filename]
+    for name in filenames:
+        try:
+            with open(name, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        resource_spans = json.loads(line)['resourceSpans']
+                    except (ValueError, KeyError):
+                        continue
+                    for resource in resource_spans:
+                        for scope in resource['scopeSpans']:
+                            traces.append(scope['spans'])
+        except OSError:
+            continue
+    return traces
+
+
+def duration_ms(span: Dict[str, Any]) -> float:
+    return (int(span['endTimeUnixNano']) - int(span['startTimeUnixNano'])) / 1e6
+
+
+def print_trace(spans: List[Dict[str, Any]]) -> None:
+    """Print a trace as an indented span tree."""
+    children: Dict[str, List[Dict[str, Any]]] = {}
+    for span in spans:
+        children.setdefault(span.get('parentSpanId'), []).append(span)
+
+    def walk(parent_id, depth: int) -> None:
+        for span in sorted(children.get(parent_id, []), key=lambda item: int(item['startTimeUnixNano'])):
+            status = " ERROR" if span.get('status', {}).get('code') == 'STATUS_CODE_ERROR' else ""
+            attributes = _attribute_values(span)
+            details = f" {attributes['file']}" if 'file' in attributes else ""
+            print(f"    {'  ' * depth}{span['name']}{details}: {duration_ms(span):.1f} ms{status}")
+            walk(span['spanId'], depth + 1)
+
+    walk(None, 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('trace_file', nargs='?', default='traces.jsonl')
+    parser.add_argument('--top', type=int, default=10, help="number of traces to show")
+    parser.add_argument('--user', type=int, help="only traces of updates from this user id")
+    args = parser.parse_args()
+
+    summaries = []
+    for spans in load_traces(args.trace_file):
+        root = next((span for span in spans if 'parentSpanId' not in span), None)
+        if root is None:
+            continue
+        attributes = _attribute_values(root)
+        if args.user is not None and str(attributes.get('user.id')) != str(args.user):
+            continue
+        summaries.append((duration_ms(root), attributes, spans))
+
+    summaries.sort(key=lambda summary: summary[0], reverse=True)
+    print(f"{len(summaries)} traces, slowest {min(args.top, len(summaries))}:")
+    for total, attributes, spans in summaries[:args.top]:
+        print(f"{total:8.1f} ms  trace {spans[0]['traceId']}  update {attributes.get('update.id')}  "
+              f"user {attributes.get('user.id')}")
+        print_trace(spans)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from telegram.request import HTTPXRequest
+from config import TRACE_FILE, TRACE_MAX_BYTES, TRACE_BACKUPS
+from structured_logging import DroppingQueueHandler
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "ourgoal-bot"
+
+
+class Trace:
+    """Spans recorded while handling one update."""
+
+    __slots__ = ('trace_id', 'spans', 'root')
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Dict[str, Any]] = []
+        self.root: Optional[Dict[str, Any]] = None
+
+
+# Trace and innermost open span of the running task
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+def _attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Convert attributes to the OTLP JSON key/value layout."""
+    converted = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            converted.append({'key': key, 'value': {'boolValue': value}})
+        elif isinstance(value, int):
+            converted.append({'key': key, 'value': {'intValue': str(value)}})
+        elif isinstance(value, float):
+            converted.append({'key': key, 'value': {'doubleValue': value}})
+        else:
+            converted.append({'key': key, 'value': {'stringValue': str(value)}})
+    return converted
+
+
+class Tracer:
+    """Per-update spans written as OTLP JSON lines to a rotating file.
+
+    Every update gets a trace id that doubles as the correlation id in log
+    records. Spans are buffered per trace and the whole trace is written
+    once the update is handled, by a background thread. Without a trace
+    file all calls are no-ops.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, backups: int):
+        self.enabled = bool(filename)
+        self._writer = logging.getLogger("tracing.spans")
+        self._writer.propagate = False
+        if not self.enabled:
+            return
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backups, encoding='utf-8'
+        )
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        queue_handler = DroppingQueueHandler(queue.Queue(maxsize=1000))
+        self._writer.addHandler(queue_handler)
+        self._writer.setLevel(logging.INFO)
+        self._listener = logging.handlers.QueueListener(queue_handler.queue, file_handler)
+        self._listener.start()
+        atexit.register(self._listener.stop)
+
+    def _open_span(self, trace: Trace, name: str, attributes: Dict[str, Any]) -> Dict[str, Any]:
+        parent = _current_span.get()
+        span = {
+            'traceId': trace.trace_id,
+            'spanId': os.urandom(8).hex(),
+            'name': name,
+            'startTimeUnixNano': str(time.time_ns()),
+            'attributes': attributes
+        }
+        if parent is not None:
+            span['parentSpanId'] = parent['spanId']
+        return span
+
+    def _close_span(self, trace: Trace, span: Dict[str, Any], error: Optional[BaseException]) -> None:
+        span['endTimeUnixNano'] = str(time.time_ns())
+        span['attributes'] = _attributes(span['attributes'])
+        if error is not None:
+            span['status'] = {'code': 'STATUS_CODE_ERROR', 'message': repr(error)}
+        trace.spans.append(span)
+
+    def start_trace(self, name: str, **attributes: Any) -> None:
+        """Open the root span of the update handled by the running task."""
+        if not self.enabled:
+            return
+        trace = Trace()
+        _current_span.set(None)
+        trace.root = self._open_span(trace, name, attributes)
+        _current_trace.set(trace)
+        _current_span.set(trace.root)
+
+    def end_trace(self, **attributes: Any) -> None:
+        """Close the root span and hand the trace to the writer thread."""
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        trace.root['attributes'].update(attributes)
+        self._close_span(trace, trace.root, None)
+        _current_trace.set(None)
+        _current_span.set(None)
+        self._writer.info(json.dumps({
+            'resourceSpans': [{
+                'resource': {'attributes': _attributes({'service.name': SERVICE_NAME})},
+                'scopeSpans': [{'scope': {'name': __name__}, 'spans': trace.spans}]
+            }]
+        }, ensure_ascii=False))
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any):
+        """Time a block as a child of the current span; does nothing outside a trace."""
+        trace = _current_trace.get()
+        if trace is None:
+            yield
+            return
+        span = self._open_span(trace, name, attributes)
+        token = _current_span.set(span)
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current_span.reset(token)
+            self._close_span(trace, span, error)
+
+    def traced(self, name: str):
+        """Decorate a function or coroutine function to run inside a span."""
+        def decorator(function):
+            if inspect.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name):
+                        return await function(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+class TraceContextFilter(logging.Filter):
+    """Attach the trace id of the update being handled to log records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace_id = current_trace_id()
+        if trace_id is not None:
+            record.trace_id = trace_id
+        return True
+
+
+class TracedRequest(HTTPXRequest):
+    """Bot API request that records every call as a span."""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        with tracer.span(f"bot_api.{url.rsplit('/', 1)[-1]}", **{'http.method': method}):
+            return await super().do_request(url, method, *args, **kwargs)
+
+
+tracer = Tracer(TRACE_FILE, TRACE_MAX_BYTES, TRACE_BACKUPS)
+
+
+async def begin_update_trace(update, context) -> None:
+    """Handler: open the trace of an update."""
+    tracer.start_trace("update", **{'update.id': update.update_id})
+
+
+async def end_update_trace(update, context, outcome: str = "handled") -> None:
+    """Handler: write the trace of an update once it is handled or stopped early."""
+    attributes = {'update.outcome': outcome}
+    if update.effective_user is not None:
+        attributes['user.id'] = update.effective_user.id
+    tracer.end_trace(**attributes)
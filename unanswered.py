@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+# Stale heap entries tolerated per waiting application before a team's heap is rebuilt
+_COMPACT_FACTOR = 2
+
+
+class UnansweredQueue:
+    """Applications still waiting for a first answer from the admins, oldest first.
+
+    Every team has a min-heap of ``(submitted, user_id)``. Answering only
+    forgets the application in ``waiting``; its heap entry is dropped once
+    it reaches the top, so answering is O(1) and the oldest N applications
+    come out in O(N log n) without looking at the rest.
+    """
+
+    def __init__(self):
+        self.heaps: Dict[str, List[Tuple[float, int]]] = {}
+        self.waiting: Dict[str, Dict[int, float]] = {}
+
+    def add(self, team_id: str, user_id: int, submitted: float) -> None:
+        """Start waiting for an answer to an application submitted at a timestamp."""
+        self.waiting.setdefault(team_id, {})[user_id] = submitted
+        heapq.heappush(self.heaps.setdefault(team_id, []), (submitted, user_id))
+
+    def discard(self, team_id: str, user_id: int) -> Optional[float]:
+        """Stop waiting for an application; returns when it was submitted, or None if it wasn't waiting."""
+        team_waiting = self.waiting.get(team_id, {})
+        submitted = team_waiting.pop(user_id, None)
+        heap = self.heaps.get(team_id)
+        if submitted is not None and len(heap) > _COMPACT_FACTOR * len(team_waiting) + 64:
+            self.heaps[team_id] = [(timestamp, waiting_user) for waiting_user, timestamp in team_waiting.items()]
+            heapq.heapify(self.heaps[team_id])
+        return submitted
+
+    def remove_team(self, team_id: str) -> None:
+        """Stop waiting for every application of a team."""
+        self.heaps.pop(team_id, None)
+        self.waiting.pop(team_id, None)
+
+    def _is_waiting(self, team_id: str, entry: Tuple[float, int]) -> bool:
+        return self.waiting.get(team_id, {}).get(entry[1]) == entry[0]
+
+    def oldest(self, team_ids: List[str], limit: int) -> List[Tuple[float, str, int]]:
+        """Get the oldest waiting applications of some teams as ``(submitted, team_id, user_id)``."""
+        oldest = []
+        for team_id in team_ids:
+            heap = self.heaps.get(team_id)
+            if not heap:
+                continue
+            # Pop the team's oldest entries, dropping stale ones for good, and put the rest back
+            taken = []
+            while heap and len(taken) < limit:
+                entry = heapq.heappop(heap)
+                if self._is_waiting(team_id, entry):
+                    taken.append(entry)
+            for entry in taken:
+                heapq.heappush(heap, entry)
+            oldest.extend((submitted, team_id, user_id) for submitted, user_id in taken)
+        return heapq.nsmallest(limit, oldest)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateWindow:
+    """Sliding window of processed Telegram update ids.
+
+    Update ids only grow, so everything at or below ``max_id - size`` counts
+    as processed and only the ids inside the window are kept explicitly.
+    The exception is Telegram restarting ids at a random value after a week
+    without updates: an id more than a window below the floor is taken as
+    such a reset, and the window starts over from it.
+    """
+
+    def __init__(self, size: int, data: Optional[Dict[str, Any]] = None):
+        self.size = size
+        self.max_id = 0
+        self.ids = set()
+        # When the last update was added, 0 if unknown
+        self.updated = 0.0
+        if data:
+            self.max_id = data.get('max_id', 0)
+            self.ids = set(data.get('ids', ()))
+            self.updated = data.get('updated', 0.0)
+
+    def _is_reset(self, update_id: int) -> bool:
+        return update_id <= self.max_id - 2 * self.size
+
+    def seen(self, update_id: int) -> bool:
+        """Check whether an update was already processed."""
+        if self._is_reset(update_id):
+            return False
+        return update_id <= self.max_id - self.size or update_id in self.ids
+
+    def add(self, update_id: int) -> None:
+        """Record a processed update."""
+        if self._is_reset(update_id):
+            logger.warning(f"Update ids restarted at {update_id} after {self.max_id}, resetting the window")
+            self.ids = set()
+            self.max_id = update_id
+        self.ids.add(update_id)
+        self.updated = time.time()
+        if update_id > self.max_id:
+            self.max_id = update_id
+        # Prune lazily so each add stays O(1) amortized
+        if len(self.ids) > 2 * self.size:
+            floor = self.max_id - self.size
+            self.ids = {known_id for known_id in self.ids if known_id > floor}
+
+    def to_dict(self) -> Dict[str, Any]:
+        floor = self.max_id - self.size
+        return {
+            'max_id': self.max_id,
+            'ids': sorted(known_id for known_id in self.ids if known_id > floor),
+            'updated': self.updated
+        }
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import time
+from typing import Any
+from config import RECORD_UPDATES_FILE, RECORD_UPDATES_SALT, RECORD_CALLBACK_TABLE_SUFFIX
+from structured_logging import DroppingQueueHandler
+from callback_codec import CallbackCodec, callback_codec
+
+logger = logging.getLogger(__name__)
+
+# Fields holding names and contact details, replaced entirely
+PII_FIELDS = {'first_name', 'last_name', 'username', 'phone_number', 'email', 'bio', 'vcard'}
+# Fields holding ids of users (and their private chats), replaced by stable pseudonyms
+ID_FIELDS = {'id', 'user_id', 'chat_id'}
+# Free text; commands are kept so replays take the same paths, and every word
+# becomes a pseudo-word so copied answers still look alike
+TEXT_FIELDS = {'text', 'caption'}
+# Callback data of pressed buttons and of the keyboards they came with; the
+# user ids packed into decision buttons are pseudonymized
+CALLBACK_DATA_FIELDS = {'data', 'callback_data'}
+
+
+def pseudonymize(user_id: int, salt: str) -> int:
+    """Map a user id to a stable fake id; group chats (negative ids) are kept."""
+    if user_id <= 0:
+        return user_id
+    digest = hashlib.sha256(f"{salt}:{user_id}".encode('utf-8')).digest()
+    return 1_000_000_000 + int.from_bytes(digest[:4], 'big') % 1_000_000_000
+
+
+def _pseudo_word(word: str, salt: str) -> str:
+    """Letters derived from a word, as long as the word in UTF-16 code units."""
+    length = len(word.encode('utf-16-le')) // 2
+    digest = hashlib.sha256(f"{salt}:{word}".encode('utf-8')).digest()
+    while len(digest) < length:
+        digest += hashlib.sha256(digest).digest()
+    return "".join(chr(ord('a') + byte % 26) for byte in digest[:length])
+
+
+def scrub_text(text: str, salt: str) -> str:
+    """Replace every word by a salted pseudo-word of the same length."""
+    return re.sub(r"\S+", lambda match: _pseudo_word(match.group(0), salt), text)
+
+
+def scrub_callback_data(data: str, salt: str, codec: CallbackCodec) -> str:
+    """Pseudonymize the user ids in callback data, so buttons match the scrubbed applications.
+
+    Data is decoded with the bot's table and encoded again with ``codec``,
+    the recording's own table. Data the bot doesn't understand is kept as it is.
+    """
+    decoded = callback_codec.decode(data)
+    if decoded is None:
+        return data
+    op, args = decoded
+    return codec.encode(op, *(
+        pseudonymize(arg, salt) if isinstance(arg, int) else arg for arg in args
+    ))
+
+
+def scrub(data: Any, salt: str, codec: CallbackCodec) -> Any:
+    """Remove personal data from an update dict while keeping its shape.
+
+    Text keeps its length (so message entities stay valid) and commands,
+    and the same user always maps to the same pseudonym within a recording,
+    including in the callback data of decision buttons.
+    """
+    if isinstance(data, list):
+        return [scrub(item, salt, codec) for item in data]
+    if not isinstance(data, dict):
+        return data
+
+    scrubbed = {}
+    for key, value in data.items():
+        if key in PII_FIELDS and isinstance(value, str):
+            scrubbed[key] = "x" * len(value)
+        elif key in ID_FIELDS and isinstance(value, int) and not isinstance(value, bool):
+            scrubbed[key] = pseudonymize(value, salt)
+        elif key in TEXT_FIELDS and isinstance(value, str):
+            if value.startswith("/"):
+                command, _, rest = value.partition(" ")
+                scrubbed[key] = f"{command} {scrub_text(rest, salt)}" if rest else command
+            else:
+                scrubbed[key] = scrub_text(value, salt)
+        elif key in CALLBACK_DATA_FIELDS and isinstance(value, str):
+            scrubbed[key] = scrub_callback_data(value, salt, codec)
+        else:
+            scrubbed[key] = scrub(value, salt, codec)
+    return scrubbed
+
+
+class UpdateRecorder:
+    """Append incoming updates as scrubbed JSON lines from a background thread.
+
+    Callback data tokens of the recording go into their own table next to
+    it, which replay_updates.py loads, instead of into the bot's table.
+    """
+
+    def __init__(self, filename: str, salt: str):
+        self.enabled = bool(filename)
+        self.salt = salt
+        self.codec = CallbackCodec(filename=filename + RECORD_CALLBACK_TABLE_SUFFIX if filename else None)
+        self._writer = logging.getLogger("update_recorder.updates")
+        self._writer.propagate = False
+        if not self.enabled:
+            return
+
+        file_handler = logging.FileHandler(filename, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        queue_handler = DroppingQueueHandler(queue.Queue(maxsize=10000))
+        self._writer.addHandler(queue_handler)
+        self._writer.setLevel(logging.INFO)
+        self._listener = logging.handlers.QueueListener(queue_handler.queue, file_handler)
+        self._listener.start()
+        atexit.register(self._listener.stop)
+
+    def record(self, update_data: dict) -> None:
+        self._writer.info(json.dumps(
+            {'time': time.time(), 'update': scrub(update_data, self.salt, self.codec)},
+            ensure_ascii=False
+        ))
+
+
+update_recorder = UpdateRecorder(RECORD_UPDATES_FILE, RECORD_UPDATES_SALT)
+
+
+async def record_update(update, context) -> None:
+    """Handler: record an update before anything else sees it."""
+    if update_recorder.enabled:
+        update_recorder.record(update.to_dict())
@@ -0,0 +1,761 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Multi-process mode: a receiver process hands updates to worker processes.
+
+Every applicant belongs to one worker, chosen by a hash of their user id,
+and each worker is a full bot with its own data files in its own directory.
+The receiver polls Telegram, routes updates over a socket pair per worker
+(one JSON object per line) and answers /stats, /pending, /funnel, /search,
+/duplicates, /sla and the digest by asking all workers and combining their
+answers. Workers in turn ask the receiver to search every worker for
+near-duplicates of a new application, since alternate accounts of one
+person usually belong to different workers. Commands that change data (/clear, /restore, /archive, /bulk,
+/broadcast) are run by every worker on its own applicants and answered once
+by the receiver, which also sends the bulk decision messages and broadcasts
+itself so they stay within one Bot API rate limit.
+
+Run by the receiver as ``python workers.py <index> <count> <socket fd>``.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import zlib
+from datetime import datetime, timedelta
+from itertools import zip_longest
+from typing import Any, Dict, List, Optional
+from telegram import Update
+from telegram.ext import CallbackContext
+from config import (
+    BOT_TOKEN,
+    ADMIN_CHAT_IDS,
+    CONTENT_FILE,
+    CALLBACK_TABLE_FILE,
+    SEARCH_RESULTS_LIMIT,
+    NEAR_DUPLICATE_THRESHOLD,
+    WORKER_PROCESSES,
+    WORKER_DATA_DIR
+)
+import content
+from callback_codec import callback_codec, OP_ACCEPT, OP_REJECT, OP_END_CHAT
+from routing import get_chat_teams, is_admin_chat
+from near_duplicates import NearDuplicateIndex, encode_signature, decode_signature
+from handlers import (
+    data_manager,
+    purge_retired_rounds,
+    reply_clear_report,
+    parse_restore,
+    reply_restore_usage,
+    reply_restore_report,
+    parse_archive,
+    reply_archive_report,
+    parse_bulk,
+    decision_status,
+    admin_display_name,
+    start_bulk_notifications,
+    parse_broadcast,
+    start_broadcast,
+    collect_stats,
+    format_stats,
+    format_pending,
+    format_funnel,
+    format_search,
+    format_duplicates,
+    format_sla,
+    sla_limit,
+    format_digest
+)
+
+logger = logging.getLogger(__name__)
+
+# Longest line accepted on a worker connection
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+# Seconds the receiver waits for query answers, and before restarting a worker that exited
+QUERY_TIMEOUT = 10
+RESTART_DELAY = 5
+
+# Written once the data is split, with the number of workers it was split for
+LAYOUT_FILE = "workers.json"
+
+
+def search(text: str, team_ids: List[str]) -> Dict[str, Any]:
+    """Number of a worker's matches for /search and the first ones of them."""
+    matches = data_manager.search_applications(text, team_ids)
+    return {'total': len(matches), 'shown': matches[:SEARCH_RESULTS_LIMIT]}
+
+
+def signatures() -> List[list]:
+    """A worker's indexed signatures as ``[team_id, user_id, signature]`` for /duplicates."""
+    return [
+        [team_id, user_id, encode_signature(values)]
+        for (team_id, user_id), values in data_manager.duplicates.signatures.items()
+    ]
+
+
+def applications(keys: List[list]) -> List[Dict[str, Any]]:
+    """The current applications of a worker among ``[team_id, user_id]`` keys."""
+    found = []
+    for team_id, user_id in keys:
+        shard = data_manager.shards.get(team_id)
+        application = shard.applicants.get(user_id) if shard is not None else None
+        if application is not None:
+            found.append(data_manager.get_full_application(application))
+    return found
+
+
+def sla(team_ids: List[str], limit: int) -> Dict[str, Any]:
+    """A worker's first answer histograms and its oldest unanswered applications for /sla."""
+    return {
+        'histograms': data_manager.get_first_response_histograms(team_ids),
+        'oldest': data_manager.get_oldest_unanswered(team_ids, limit)
+    }
+
+
+def epochs(team_ids: List[str]) -> Dict[str, int]:
+    """Current round of each of the teams on a worker."""
+    return {team_id: data_manager.get_epoch(team_id) for team_id in team_ids}
+
+
+def archive(days: int, team_ids: List[str], label: str) -> int:
+    """Archive a worker's decided applications older than ``days`` for /archive."""
+    return data_manager.archive_applications(datetime.now() - timedelta(days=days), team_ids, label)
+
+
+def decide(team_id: str, status: str, user_ids: Optional[List[int]], decided_by: str) -> List[int]:
+    """Decide a worker's pending applications of a team for /bulk; the receiver notifies the applicants."""
+    decided = data_manager.decide_applications(team_id, status, user_ids, decided_by=decided_by)
+    return [application['user_info']['user_id'] for application in decided]
+
+
+def clear(application, team_ids: List[str]) -> Dict[str, int]:
+    """Start a new round of the teams on a worker for /clear."""
+    epochs = data_manager.clear_applications(team_ids)
+    if epochs:
+        application.job_queue.run_once(purge_retired_rounds, when=0)
+    return epochs
+
+
+def restore(application, team_id: str, epoch: int) -> int:
+    """Restore a round of a team on a worker for /restore.
+
+    A worker without applicants from that round still finishes its current
+    round, so round numbers stay the same on every worker.
+    """
+    count = data_manager.restore_round(team_id, epoch)
+    if count or data_manager.clear_applications([team_id]):
+        application.job_queue.run_once(purge_retired_rounds, when=0)
+    return count
+
+
+# Questions the receiver can ask every worker, answered from its own data
+WORKER_QUERIES = {
+    'stats': collect_stats,
+    'pending': data_manager.get_pending_counts,
+    'funnel': data_manager.get_funnel_statistics,
+    'search': search,
+    'signatures': signatures,
+    'applications': applications,
+    'near_duplicates': data_manager.find_near_duplicates,
+    'sla': sla,
+    'digest': data_manager.get_digest,
+    'epochs': epochs,
+    'archive': archive,
+    'decide': decide,
+    'recipients': data_manager.get_team_user_ids
+}
+
+# Queries that also schedule jobs on the worker, called with its application first
+WORKER_ACTIONS = {
+    'clear': clear,
+    'restore': restore
+}
+
+
+def worker_for_user(user_id: int, count: int) -> int:
+    """Index of the worker owning a user; stable across restarts."""
+    return zlib.crc32(str(user_id).encode('utf-8')) % count
+
+
+def route_update(update: Update, count: int) -> Optional[int]:
+    """Index of the worker that handles an update, or None if every worker gets it.
+
+    Decision and end-chat buttons belong to the applicant they name. Other
+    updates from admin groups go to every worker: only the worker that sent
+    the message an admin replies to knows whom to relay the reply to, and
+    the others ignore it. Commands from admin groups that the receiver
+    doesn't answer itself go to the first worker, so they get one reply.
+    """
+    if update.callback_query is not None:
+        data = update.callback_query.data
+        namespace = callback_codec.token_namespace(data)
+        if namespace is not None and namespace.isdigit() and int(namespace) < count:
+            return int(namespace)
+        decoded = callback_codec.decode(data)
+        if decoded is not None and decoded[0] in (OP_ACCEPT, OP_REJECT, OP_END_CHAT):
+            return worker_for_user(decoded[1][0], count)
+
+    if update.effective_chat is not None and is_admin_chat(update.effective_chat.id):
+        message = update.effective_message
+        if message is not None and message.text and message.text.startswith("/"):
+            return 0
+        return None
+    if update.effective_user is None:
+        return 0
+    return worker_for_user(update.effective_user.id, count)
+
+
+def merge_counts(results: List[Any]) -> Any:
+    """Add up the answers of all workers: dicts by key, lists element by element."""
+    first = results[0]
+    if isinstance(first, dict):
+        keys = dict.fromkeys(key for result in results for key in result)
+        return {key: merge_counts([result[key] for result in results if key in result]) for key in keys}
+    if isinstance(first, list):
+        return [merge_counts(list(values)) for values in zip_longest(*results, fillvalue=0)]
+    return sum(results)
+
+
+def merge_digests(digests: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Add up digests of all workers, weighting average response times by decisions."""
+    oldest_unanswered: Dict[str, float] = {}
+    for digest in digests:
+        for team_id, team_digest in digest.items():
+            team_digest['average_response'] *= team_digest['decided']
+            oldest = team_digest.pop('oldest_unanswered')
+            oldest_unanswered[team_id] = max(oldest_unanswered.get(team_id, 0.0), oldest)
+    merged = merge_counts(digests)
+    for team_id, team_digest in merged.items():
+        decided = team_digest['decided']
+        team_digest['average_response'] = team_digest['average_response'] / decided if decided else 0.0
+        team_digest['oldest_unanswered'] = oldest_unanswered[team_id]
+    return merged
+
+
+def merge_near_duplicates(results: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Near-duplicates found by all workers, most similar first."""
+    matches = [match for result in results for match in result]
+    matches.sort(key=lambda match: match['similarity'], reverse=True)
+    return matches
+
+
+# Requests workers can make, answered by asking every worker and merging the answers
+WORKER_REQUESTS = {
+    'near_duplicates': merge_near_duplicates
+}
+
+
+def merge_epochs(results: List[Dict[str, int]]) -> Dict[str, int]:
+    """Latest round of each team over the answers of all workers."""
+    merged: Dict[str, int] = {}
+    for result in results:
+        for team_id, epoch in result.items():
+            merged[team_id] = max(merged.get(team_id, 0), epoch)
+    return merged
+
+
+class WorkerFilter(logging.Filter):
+    """Tag log records with the index of the worker process that wrote them."""
+
+    def __init__(self, index: int):
+        super().__init__()
+        self.index = index
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.worker = self.index
+        return True
+
+
+class WorkerPool:
+    """Worker processes started and fed by the receiver.
+
+    Workers inherit the receiver's environment, except that the content
+    file is passed as an absolute path since they run in their own data
+    directory. A worker that exits is started again after a short delay;
+    updates routed to it in the meantime are dropped and logged.
+    """
+
+    def __init__(self, count: int, directory: str):
+        self.count = count
+        self.directory = directory
+        self.processes: List[Optional[asyncio.subprocess.Process]] = [None] * count
+        self.writers: List[Optional[asyncio.StreamWriter]] = [None] * count
+        self._readers: List[Optional[asyncio.Task]] = [None] * count
+        self._queries: Dict[int, asyncio.Future] = {}
+        self._requests = set()
+        self._next_query = 0
+        self._stopping = False
+
+    def worker_directory(self, index: int) -> str:
+        return os.path.join(self.directory, f"worker_{index}")
+
+    def split_count(self) -> Optional[int]:
+        """Number of workers the data was split for, or None if it hasn't been split."""
+        layout_file = os.path.join(self.directory, LAYOUT_FILE)
+        if not os.path.exists(layout_file):
+            return None
+        with open(layout_file, 'r', encoding='utf-8') as file:
+            return json.load(file)['count']
+
+    def prepare(self, data_manager) -> bool:
+        """Create the workers' data directories, splitting the data on first start."""
+        count = self.split_count()
+        if count is not None:
+            if count != self.count:
+                logger.error(f"Data in {self.directory} is split for {count} workers, not {self.count}; "
+                             f"set WORKER_PROCESSES={count}")
+                return False
+            return True
+
+        data_manager.export_partitions(
+            [self.worker_directory(index) for index in range(self.count)],
+            lambda user_id: worker_for_user(user_id, self.count)
+        )
+        # Buttons sent before the split carry tokens of this table, and whichever
+        # worker an update goes to has to decode them
+        if os.path.exists(CALLBACK_TABLE_FILE):
+            for index in range(self.count):
+                shutil.copyfile(CALLBACK_TABLE_FILE, os.path.join(self.worker_directory(index), CALLBACK_TABLE_FILE))
+        with open(os.path.join(self.directory, LAYOUT_FILE), 'w', encoding='utf-8') as file:
+            json.dump({'count': self.count}, file)
+        return True
+
+    async def start(self) -> None:
+        await asyncio.gather(*(self._launch(index) for index in range(self.count)))
+
+    async def _launch(self, index: int) -> None:
+        receiver_socket, worker_socket = socket.socketpair()
+        environment = dict(os.environ, CONTENT_FILE=os.path.abspath(CONTENT_FILE))
+        self.processes[index] = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__),
+            str(index), str(self.count), str(worker_socket.fileno()),
+            cwd=self.worker_directory(index),
+            env=environment,
+            pass_fds=(worker_socket.fileno(),)
+        )
+        worker_socket.close()
+        reader, self.writers[index] = await asyncio.open_connection(sock=receiver_socket, limit=MAX_MESSAGE_SIZE)
+        self._readers[index] = asyncio.create_task(self._read(index, reader))
+        logger.info(f"Started worker {index} (pid {self.processes[index].pid})")
+
+    async def _read(self, index: int, reader: asyncio.StreamReader) -> None:
+        """Resolve query answers and take requests from a worker; restart it once its connection closes."""
+        while True:
+            try:
+                line = await reader.readline()
+            except (ConnectionError, ValueError) as e:
+                logger.error(f"Lost connection to worker {index}: {e}")
+                line = b""
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+                if 'query' in message:
+                    merge = WORKER_REQUESTS[message['query']]
+                    task = asyncio.create_task(self._answer(index, message['id'], message['query'], message['args'], merge))
+                    self._requests.add(task)
+                    task.add_done_callback(self._requests.discard)
+                    continue
+                future = self._queries.pop(message['id'], None)
+            except (ValueError, KeyError, TypeError) as e:
+                # The query it answers times out instead
+                logger.error(f"Ignoring malformed message from worker {index}: {e}")
+                continue
+            if future is not None and not future.done():
+                future.set_result(message.get('result'))
+
+        self.writers[index] = None
+        returncode = await self.processes[index].wait()
+        if self._stopping:
+            return
+        logger.error(f"Worker {index} exited with code {returncode}, restarting in {RESTART_DELAY}s")
+        await asyncio.sleep(RESTART_DELAY)
+        await self._launch(index)
+
+    async def _answer(self, index: int, request_id: int, name: str, args: list, merge) -> None:
+        """Answer a worker's request by asking every worker, the requesting one included."""
+        results = await self.query(name, *args)
+        await self._send(index, {'id': request_id, 'result': merge(results)})
+
+    async def _send(self, index: int, message: dict) -> bool:
+        writer = self.writers[index]
+        if writer is None:
+            return False
+        try:
+            writer.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b"\n")
+            await writer.drain()
+            return True
+        except ConnectionError as e:
+            logger.error(f"Failed to send to worker {index}: {e}")
+            return False
+
+    async def dispatch(self, update: Update) -> None:
+        """Hand an update to the worker owning it, or to every worker."""
+        index = route_update(update, self.count)
+        message = {'update': update.to_dict()}
+        for target in (range(self.count) if index is None else (index,)):
+            if not await self._send(target, message):
+                logger.error(f"Dropping update {update.update_id} for worker {target}, which is not running")
+
+    async def query(self, name: str, *args) -> List[Any]:
+        """Ask every worker a question from WORKER_QUERIES or WORKER_ACTIONS; workers that don't answer are left out."""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for index in range(self.count):
+            self._next_query += 1
+            future = loop.create_future()
+            self._queries[self._next_query] = future
+            if await self._send(index, {'id': self._next_query, 'query': name, 'args': list(args)}):
+                futures.append((index, self._next_query, future))
+            else:
+                del self._queries[self._next_query]
+
+        results = []
+        for index, query_id, future in futures:
+            try:
+                result = await asyncio.wait_for(future, QUERY_TIMEOUT)
+            except asyncio.TimeoutError:
+                self._queries.pop(query_id, None)
+                result = None
+            if result is None:
+                logger.error(f"Worker {index} did not answer {name}")
+                continue
+            results.append(result)
+        return results
+
+    async def stop(self) -> None:
+        """Close the connections, which makes the workers shut down, and wait for them."""
+        self._stopping = True
+        for writer in self.writers:
+            if writer is not None:
+                writer.close()
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            try:
+                await asyncio.wait_for(process.wait(), 30)
+            except asyncio.TimeoutError:
+                logger.error(f"Worker {index} did not shut down, killing it")
+                process.kill()
+
+
+worker_pool = WorkerPool(WORKER_PROCESSES, WORKER_DATA_DIR)
+
+
+async def dispatch_update(update: Update, context: CallbackContext) -> None:
+    """Handler: pass an update on to the worker processes."""
+    await worker_pool.dispatch(update)
+
+
+async def stats_command(update: Update, context: CallbackContext) -> None:
+    """Handle /stats command with the statistics of all workers (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+
+    team_ids = get_chat_teams(update.effective_chat.id)
+    results = await worker_pool.query('stats', team_ids)
+    if not results:
+        await update.message.reply_text(content.NO_APPLICATIONS_YET)
+        return
+    collected = merge_counts(results)
+    if collected['statistics']['total_applications'] == 0:
+        await update.message.reply_text(content.NO_APPLICATIONS_YET)
+        return
+
+    await update.message.reply_text(format_stats(collected, team_ids))
+
+
+async def pending_command(update: Update, context: CallbackContext) -> None:
+    """Handle /pending command with the pending applications of all workers (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+
+    team_ids = get_chat_teams(update.effective_chat.id)
+    results = await worker_pool.query('pending', team_ids)
+    pending_counts = merge_counts(results) if results else {}
+    if sum(pending_counts.values()) == 0:
+        await update.message.reply_text(content.NO_PENDING_APPLICATIONS)
+        return
+
+    await update.message.reply_text(format_pending(pending_counts, team_ids))
+
+
+async def funnel_command(update: Update, context: CallbackContext) -> None:
+    """Handle /funnel command with the funnel counts of all workers (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+
+    team_ids = get_chat_teams(update.effective_chat.id)
+    results = await worker_pool.query('funnel', team_ids)
+    if not results:
+        return
+    await update.message.reply_text(format_funnel(merge_counts(results), team_ids), parse_mode='HTML')
+
+
+async def search_command(update: Update, context: CallbackContext) -> None:
+    """Handle /search command over the applications of all workers (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+
+    text = " ".join(context.args or [])
+    if not text:
+        await update.message.reply_text(content.SEARCH_USAGE, parse_mode='HTML')
+        return
+
+    results = await worker_pool.query('search', text, get_chat_teams(update.effective_chat.id))
+    total = sum(result['total'] for result in results)
+    if total == 0:
+        await update.message.reply_text(content.NO_SEARCH_RESULTS)
+        return
+    shown = [application for result in results for application in result['shown']][:SEARCH_RESULTS_LIMIT]
+    await update.message.reply_text(format_search(shown, total))
+
+
+async def duplicates_command(update: Update, context: CallbackContext) -> None:
+    """Handle /duplicates command with the near-duplicate groups of all workers (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+
+    # Copies between applicants of different workers are found by grouping all signatures here
+    index = NearDuplicateIndex(NEAR_DUPLICATE_THRESHOLD)
+    for result in await worker_pool.query('signatures'):
+        for team_id, user_id, encoded in result:
+            index.add((team_id, user_id), decode_signature(encoded))
+    groups = index.groups(get_chat_teams(update.effective_chat.id))
+    if not groups:
+        await update.message.reply_text(content.NO_DUPLICATES)
+        return
+
+    shown = groups[:SEARCH_RESULTS_LIMIT]
+    found = {}
+    for result in await worker_pool.query('applications', [key for group in shown for key in group]):
+        for application in result:
+            found[(application['selected_team'], application['user_info']['user_id'])] = application
+    shown = [[found[key] for key in group if key in found] for group in shown]
+    await update.message.reply_text(format_duplicates(shown, len(groups)), parse_mode='HTML')
+
+
+async def sla_command(update: Update, context: CallbackContext) -> None:
+    """Handle /sla command with the answer times and oldest applications of all workers (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+
+    team_ids = get_chat_teams(update.effective_chat.id)
+    limit = sla_limit(context.args or [])
+    results = await worker_pool.query('sla', team_ids, limit)
+    if not results:
+        return
+    histograms = merge_counts([result['histograms'] for result in results])
+    oldest = sorted(
+        (waiting for result in results for waiting in result['oldest']),
+        key=lambda waiting: waiting['waiting'],
+        reverse=True
+    )[:limit]
+    await update.message.reply_text(format_sla(histograms, oldest, team_ids), parse_mode='HTML')
+
+
+async def clear_command(update: Update, context: CallbackContext) -> None:
+    """Handle /clear command by starting a new round on every worker (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text("⚠️ هذا الأمر مخصص للإدارة فقط")
+        return
+
+    results = await worker_pool.query('clear', get_chat_teams(update.effective_chat.id))
+    await reply_clear_report(update, merge_epochs(results))
+
+
+async def restore_command(update: Update, context: CallbackContext) -> None:
+    """Handle /restore command by restoring a round on every worker (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+
+    epochs = merge_epochs(await worker_pool.query('epochs', get_chat_teams(update.effective_chat.id)))
+    team_id, epoch = parse_restore(context.args or [], epochs)
+    if team_id is None:
+        await reply_restore_usage(update, epochs)
+        return
+
+    results = await worker_pool.query('restore', team_id, epoch)
+    await reply_restore_report(update, team_id, epoch, sum(results))
+
+
+async def archive_command(update: Update, context: CallbackContext) -> None:
+    """Handle /archive command by archiving on every worker (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+
+    days, label = parse_archive(context.args or [])
+    if days is None:
+        await update.message.reply_text(content.ARCHIVE_USAGE, parse_mode='HTML')
+        return
+
+    results = await worker_pool.query('archive', days, get_chat_teams(update.effective_chat.id), label)
+    await reply_archive_report(update, days, sum(results))
+
+
+async def bulk_decision_command(update: Update, context: CallbackContext) -> None:
+    """Handle /bulk command: every worker decides its applications, the receiver notifies them (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+
+    team_ids = get_chat_teams(update.effective_chat.id)
+    decision, team_id, user_ids = parse_bulk(context.args or [], team_ids)
+    if decision is None:
+        await update.message.reply_text(
+            content.BULK_USAGE.format(team_ids=", ".join(team_ids)),
+            parse_mode='HTML'
+        )
+        return
+
+    admin_name = admin_display_name(update.effective_user)
+    results = await worker_pool.query('decide', team_id, decision_status(decision), user_ids, admin_name)
+    decided = [user_id for result in results for user_id in result]
+    await start_bulk_notifications(update, context, decision, team_id, decided, admin_name)
+
+
+async def broadcast_command(update: Update, context: CallbackContext) -> None:
+    """Handle /broadcast command to the applicants of all workers, sent by the receiver (admin only)."""
+    if not is_admin_chat(update.effective_chat.id):
+        await update.message.reply_text(content.NO_STATS_PERMISSION)
+        return
+
+    team_ids = get_chat_teams(update.effective_chat.id)
+    team_id, text = parse_broadcast(update, team_ids)
+    if team_id is None:
+        await update.message.reply_text(
+            content.BROADCAST_USAGE.format(team_ids=", ".join(team_ids)),
+            parse_mode='HTML'
+        )
+        return
+
+    results = await worker_pool.query('recipients', team_id)
+    await start_broadcast(update, context, team_id, text, [user_id for result in results for user_id in result])
+
+
+async def send_digest(context: CallbackContext) -> None:
+    """Job: post the digest of all workers to every admin group."""
+    days = context.job.data
+    for chat_id in ADMIN_CHAT_IDS:
+        if not chat_id:
+            continue
+        team_ids = get_chat_teams(chat_id)
+        results = await worker_pool.query('digest', team_ids, days)
+        if not results:
+            continue
+        digest_text = format_digest(merge_digests(results), team_ids, days)
+        try:
+            await context.bot.send_message(chat_id=chat_id, text=digest_text, parse_mode='HTML')
+        except Exception as e:
+            logger.error(f"Failed to send digest to {chat_id}: {e}")
+
+
+async def serve(index: int, count: int, connection: socket.socket) -> None:
+    """Run a worker: handle the updates and answer the queries sent by the receiver."""
+    # Imported here so the worker builds the same application as single-process mode
+    from main import create_application, log_handler
+    import handlers
+    log_handler.addFilter(WorkerFilter(index))
+
+    # Buttons with data in the server-side table name the worker that can decode them
+    callback_codec.namespace = str(index)
+
+    application = create_application(BOT_TOKEN, worker=True)
+    reader, writer = await asyncio.open_connection(sock=connection, limit=MAX_MESSAGE_SIZE)
+
+    # Requests to the receiver from WORKER_REQUESTS, answered on the same connection
+    requests: Dict[int, asyncio.Future] = {}
+    next_request = 0
+
+    async def ask_receiver(name: str, *args) -> Any:
+        nonlocal next_request
+        next_request += 1
+        request_id = next_request
+        future = requests[request_id] = asyncio.get_running_loop().create_future()
+        try:
+            writer.write(json.dumps({'id': request_id, 'query': name, 'args': list(args)}, ensure_ascii=False)
+                         .encode('utf-8') + b"\n")
+            await writer.drain()
+            # The receiver waits for every worker in turn
+            return await asyncio.wait_for(future, 2 * QUERY_TIMEOUT)
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            logger.error(f"Receiver did not answer {name}: {e!r}")
+            return None
+        finally:
+            requests.pop(request_id, None)
+
+    async def lookup_near_duplicates(application_data: dict) -> list:
+        matches = await ask_receiver('near_duplicates', application_data)
+        return matches if matches is not None else data_manager.find_near_duplicates(application_data)
+
+    handlers.lookup_near_duplicates = lookup_near_duplicates
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    logger.info(f"Worker {index} of {count} ready")
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+                if 'update' in message:
+                    await application.update_queue.put(Update.de_json(message['update'], application.bot))
+                    continue
+                query_id = message['id']
+                if 'query' not in message:
+                    # Answer to one of this worker's requests
+                    future = requests.get(query_id)
+                    if future is not None and not future.done():
+                        future.set_result(message.get('result'))
+                    continue
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"Ignoring malformed message from the receiver: {e}")
+                continue
+
+            try:
+                if message['query'] in WORKER_ACTIONS:
+                    result = WORKER_ACTIONS[message['query']](application, *message['args'])
+                else:
+                    result = WORKER_QUERIES[message['query']](*message['args'])
+            except Exception as e:
+                logger.error(f"Failed to answer {message.get('query')}: {e}")
+                result = None
+            writer.write(json.dumps({'id': query_id, 'result': result}, ensure_ascii=False).encode('utf-8') + b"\n")
+            await writer.drain()
+    finally:
+        logger.info(f"Worker {index} shutting down")
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def main() -> None:
+    index, count, fd = (int(arg) for arg in sys.argv[1:4])
+    # The receiver shuts workers down by closing their connection
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(serve(index, count, socket.socket(fileno=fd)))
+
+
+if __name__ == "__main__":
+    main()